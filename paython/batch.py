@@ -0,0 +1,155 @@
+"""batch.py - run lots of gateway operations concurrently"""
+
+import sys
+import Queue
+import threading
+import collections
+
+class BatchResult(object):
+    """
+    Outcome of one operation: `response` is the parsed gateway response, `error` the
+    exception it raised (if any), `index` its position in the submitted operations
+    """
+    def __init__(self, index, gateway, method, args, kwargs, response=None, error=None):
+        self.index = index
+        self.gateway = gateway
+        self.method = method
+        self.args = args
+        self.kwargs = kwargs
+        self.response = response
+        self.error = error
+
+    @property
+    def ok(self):
+        return self.error is None
+
+    def __repr__(self):
+        return '<BatchResult -- #{0.index} {1}.{0.method}, {2}>'.format(
+            self, self.gateway.__class__.__name__, 'ok' if self.ok else repr(self.error))
+
+class BatchExecutor(object):
+    """
+    Runs operations on a bounded pool of worker threads.
+
+    - workers: number of worker threads
+    - per_gateway: most operations in flight against any one gateway instance
+
+    An operation for a gateway that is at its cap is set aside (not waited on), so the
+    worker moves on to the next one. It runs once one of that gateway's operations finishes.
+    """
+    def __init__(self, workers=10, per_gateway=4):
+        self.workers = workers
+        self.per_gateway = per_gateway
+        self._slots = {} # id(gateway) -> [operations running, deque of operations set aside]
+        self._slots_lock = threading.Lock()
+
+    def _claim(self, result, results):
+        """
+        True when `result`'s gateway has a free slot (now taken), otherwise it gets set
+        aside along with the `results` queue of the run it belongs to
+        """
+        with self._slots_lock:
+            slot = self._slots.get(id(result.gateway))
+            if slot is None:
+                slot = self._slots[id(result.gateway)] = [0, collections.deque()]
+            if slot[0] >= self.per_gateway:
+                slot[1].append((result, results))
+                return False
+            slot[0] += 1
+            return True
+
+    def _release(self, gateway):
+        """
+        Hands the gateway's slot to its next operation set aside, returning its
+        (result, results queue), or frees the slot & returns (None, None)
+        """
+        with self._slots_lock:
+            slot = self._slots[id(gateway)]
+            if slot[1]:
+                return slot[1].popleft()
+            slot[0] -= 1
+            if not slot[0]:
+                del self._slots[id(gateway)]
+            return None, None
+
+    def call(self, gateway, method, args, kwargs):
+        """
+        Runs a single operation. Every transaction builds its own request,
+        so one gateway instance is safely shared by all the workers.
+        """
+        return getattr(gateway, method)(*args, **kwargs)
+
+    def _work(self, tasks, results):
+        while True:
+            task = tasks.get()
+            if task is None:
+                return
+
+            result = BatchResult(*task)
+            if not self._claim(result, results):
+                continue # set aside, whoever frees the gateway's slot runs it
+
+            queue = results
+            while result is not None:
+                try:
+                    result.response = self.call(result.gateway, result.method, result.args, result.kwargs)
+                except Exception:
+                    result.error = sys.exc_info()[1]
+                queue.put(result)
+                result, queue = self._release(result.gateway)
+
+    def run(self, operations, ordered=True):
+        """
+        Runs the (gateway, method, args) or (gateway, method, args, kwargs) operations and
+        yields a `BatchResult` for each one, in submission order or as they finish.
+        Operations are pulled from the iterable lazily, so it may be a generator.
+        """
+        tasks, results = Queue.Queue(), Queue.Queue()
+        threads = [threading.Thread(target=self._work, args=(tasks, results)) for i in range(self.workers)]
+        for thread in threads:
+            thread.daemon = True
+            thread.start()
+
+        window = self.workers * 2 # operations submitted but not yielded yet
+        operations = enumerate(operations)
+        outstanding = 0
+        finished = {}
+        next_index = 0
+        exhausted = False
+
+        try:
+            while True:
+                while not exhausted and outstanding < window:
+                    try:
+                        index, operation = operations.next()
+                    except StopIteration:
+                        exhausted = True
+                        break
+                    gateway, method, args = operation[:3]
+                    kwargs = operation[3] if len(operation) > 3 else {}
+                    tasks.put((index, gateway, method, tuple(args), kwargs))
+                    outstanding += 1
+
+                if not outstanding:
+                    return
+
+                result = results.get()
+                if not ordered:
+                    outstanding -= 1
+                    yield result
+                    continue
+
+                finished[result.index] = result
+                while next_index in finished:
+                    outstanding -= 1
+                    yield finished.pop(next_index)
+                    next_index += 1
+        finally:
+            for thread in threads:
+                tasks.put(None)
+
+def run_batch(operations, workers=10, per_gateway=4, ordered=True):
+    """
+    Shortcut for BatchExecutor(workers, per_gateway).run(operations, ordered)
+    """
+    return BatchExecutor(workers, per_gateway).run(operations, ordered)
@@ -1,7 +1,7 @@
 from django import forms
 from django.contrib.localflavor.us.forms import USStateField, USZipCodeField, USStateSelect
 
-from paython.lib.utils import is_valid_cc, is_valid_cvv, is_valid_exp
+from paython.lib.utils import is_valid_cc, is_valid_cvv, is_valid_exp, get_card_type
 
 class CustomerInformation(forms.Form):
     """
@@ -36,6 +36,11 @@ class CreditCardForm(forms.Form):
         if not is_valid_cc(number):
             raise forms.ValidationError("Invalid credit card number")
 
+        card_type = get_card_type(number)
+        if not card_type:
+            raise forms.ValidationError("Unsupported credit card type")
+        cleaned_data['card_type'] = card_type
+
         if not is_valid_cvv(security_code):
             raise forms.ValidationError("Invalid security code")
 
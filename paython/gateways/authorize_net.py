@@ -1,10 +1,11 @@
 import time
-import logging
 
 from paython.exceptions import MissingDataError
+from paython.gateways.core import transactional
 from paython.lib.api import PostGateway
+from paython.lib.log import DebugLog, lazy, masked
 
-logger = logging.getLogger(__name__)
+log = DebugLog(__name__)
 
 class AuthorizeNet(PostGateway):
     """TODO needs docstring"""
@@ -137,12 +138,12 @@ class AuthorizeNet(PostGateway):
         For further details please see:
         http://developer.authorize.net/guides/AIM/wwhelp/wwhimpl/common/html/wwhelp.htm#context=AIM&file=5_TestTrans.html
         """
-        super(AuthorizeNet, self).set('x_login', username)
-        super(AuthorizeNet, self).set('x_tran_key', password)
-
         # passing fields to bubble up to Base Class
         super(AuthorizeNet, self).__init__(translations=self.REQUEST_FIELDS, debug=debug)
 
+        self.set_static('x_login', username)
+        self.set_static('x_tran_key', password, secret=True)
+
         if debug:
             self.debug = True
 
@@ -152,25 +153,26 @@ class AuthorizeNet(PostGateway):
                 test_string = 'regular'
             else:
                 test_string = 'live'
-                super(AuthorizeNet, self).set('x_test_request', 'TRUE')
-            debug_string = " paython.gateways.authorize_net.__init__() -- You're in %s test mode (& debug, obviously) " % test_string
-            logger.debug(debug_string.center(80, '='))
+                self.set_static('x_test_request', 'TRUE')
+            log.banner(" paython.gateways.authorize_net.__init__() -- You're in %s test mode (& debug, obviously) ", test_string)
         else:
             self.test = False
 
         if delim:
             self.DELIMITER = delim
 
+        # the same on every request, so encoded once with the credentials
+        self.set_static('x_delim_data', 'TRUE')
+        self.set_static('x_delim_char', self.DELIMITER)
+        self.set_static('x_version', self.VERSION)
+
     def charge_setup(self):
         """
-        standard setup, used for charges
+        standard setup, used for charges (the delimiter & version are static fields, see __init__)
         """
-        super(AuthorizeNet, self).set('x_delim_data', 'TRUE')
-        super(AuthorizeNet, self).set('x_delim_char', self.DELIMITER)
-        super(AuthorizeNet, self).set('x_version', self.VERSION)
-        debug_string = " paython.gateways.authorize_net.charge_setup() Just set up for a charge "
-        logger.debug(debug_string.center(80, '='))
+        log.banner(" paython.gateways.authorize_net.charge_setup() Just set up for a charge ")
 
+    @transactional
     def auth(self, amount, credit_card=None, billing_info=None, shipping_info=None, is_partial=False, split_id=None, invoice_num=None):
         """
         Sends charge for authorization based on amount
@@ -191,8 +193,7 @@ class AuthorizeNet(PostGateway):
 
         # validating or building up request
         if not credit_card:
-            debug_string = "paython.gateways.authorize_net.auth()  -- No CreditCard object present. You passed in %s " % (credit_card)
-            logger.debug(debug_string)
+            log.debug("paython.gateways.authorize_net.auth()  -- No CreditCard object present. You passed in %s ", credit_card)
 
             raise MissingDataError('You did not pass a CreditCard object into the auth method')
         else:
@@ -205,9 +206,9 @@ class AuthorizeNet(PostGateway):
             super(AuthorizeNet, self).set_shipping_info(**shipping_info)
 
         # send transaction to gateway!
-        response, response_time = self.request()
-        return self.parse(response, response_time)
+        return self.process()
 
+    @transactional
     def settle(self, amount, trans_id, split_id=None):
         """
         Sends prior authorization to be settled based on amount & trans_id PRIOR_AUTH_CAPTURE
@@ -225,9 +226,9 @@ class AuthorizeNet(PostGateway):
             super(AuthorizeNet, self).unset(self.REQUEST_FIELDS['trans_id'])
 
         # send transaction to gateway!
-        response, response_time = self.request()
-        return self.parse(response, response_time)
+        return self.process()
 
+    @transactional
     def capture(self, amount, credit_card=None, billing_info=None, shipping_info=None):
         """
         Sends transaction for capture (same day settlement) based on amount.
@@ -241,8 +242,7 @@ class AuthorizeNet(PostGateway):
 
         # validating or building up request
         if not credit_card:
-            debug_string = "paython.gateways.authorize_net.capture()  -- No CreditCard object present. You passed in %s " % (credit_card)
-            logger.debug(debug_string)
+            log.debug("paython.gateways.authorize_net.capture()  -- No CreditCard object present. You passed in %s ", credit_card)
 
             raise MissingDataError('You did not pass a CreditCard object into the auth method')
         else:
@@ -255,9 +255,9 @@ class AuthorizeNet(PostGateway):
             super(AuthorizeNet, self).set_shipping_info(**shipping_info)
 
         # send transaction to gateway!
-        response, response_time = self.request()
-        return self.parse(response, response_time)
+        return self.process()
 
+    @transactional
     def void(self, trans_id, split_id=None):
         """
         Sends a transaction to be voided (in full)
@@ -274,9 +274,9 @@ class AuthorizeNet(PostGateway):
             super(AuthorizeNet, self).unset(self.REQUEST_FIELDS['trans_id'])
 
         # send transaction to gateway!
-        response, response_time = self.request()
-        return self.parse(response, response_time)
+        return self.process()
 
+    @transactional
     def credit(self, amount, trans_id, credit_card, split_id=None):
         """
         Sends a transaction to be refunded (partially or fully)
@@ -297,24 +297,26 @@ class AuthorizeNet(PostGateway):
             super(AuthorizeNet, self).unset(self.REQUEST_FIELDS['trans_id'])
 
         # send transaction to gateway!
-        response, response_time = self.request()
-        return self.parse(response, response_time)
+        return self.process()
 
-    def request(self):
+    def request_uri(self):
         """
-        Makes a request using lib.api.GetGateway.make_request() & move some debugging away from other methods.
+        decide which url to use (test|live)
         """
-        # decide which url to use (test|live)
         if self.test == self.LIVE_TEST or not self.test:
-            url = self.API_URI['live']
+            return self.API_URI['live']
         else:
-            url = self.API_URI['test'] # here just in case we want to granularly change endpoint
+            return self.API_URI['test'] # here just in case we want to granularly change endpoint
+
+    def request(self):
+        """
+        Makes a request using lib.api.GetGateway.make_request() & move some debugging away from other methods.
+        """
+        url = self.request_uri()
 
-        debug_string = " paython.gateways.authorize_net.request() -- Attempting request to: "
-        logger.debug(debug_string.center(80, '='))
-        debug_string = "%s with params: %s" % (url, super(AuthorizeNet, self).params())
-        logger.debug(debug_string)
-        logger.debug('as dict: %s' % self.REQUEST_DICT)
+        log.banner(" paython.gateways.authorize_net.request() -- Attempting request to: ")
+        log.debug("%s with params: %s", url, lazy(self.params))
+        log.debug('as dict: %s', lazy(self.logged_fields))
 
         # make the request
         start = time.time() # timing it
@@ -322,8 +324,7 @@ class AuthorizeNet(PostGateway):
         end = time.time() # done timing it
         response_time = '%0.2f' % (end - start)
 
-        debug_string = " paython.gateways.authorize_net.request()  -- Request completed in %ss " % response_time
-        logger.debug(debug_string.center(80, '='))
+        log.banner(" paython.gateways.authorize_net.request()  -- Request completed in %ss ", response_time)
 
         return response, response_time
 
@@ -331,16 +332,14 @@ class AuthorizeNet(PostGateway):
         """
         On Specific Gateway due differences in response from gateway
         """
-        debug_string = " paython.gateways.authorize_net.parse() -- Raw response: "
-        logger.debug(debug_string.center(80, '='))
-        logger.debug("\n %s" % response)
+        log.banner(" paython.gateways.authorize_net.parse() -- Raw response: ")
+        log.debug("\n %s", masked(response, self.raw_logging))
 
         #splitting up response into a list so we can map it to Paython generic response
         response = response.split(self.DELIMITER)
         approved = True if response[0] == '1' else False
 
-        debug_string = " paython.gateways.authorize_net.parse() -- Response as list: "
-        logger.debug(debug_string.center(80, '='))
-        logger.debug('\n%s' % response)
+        log.banner(" paython.gateways.authorize_net.parse() -- Response as list: ")
+        log.debug('\n%s', masked(response, self.raw_logging))
 
         return super(AuthorizeNet, self).standardize(response, self.RESPONSE_KEYS, response_time, approved)
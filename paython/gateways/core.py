@@ -1,133 +1,414 @@
 """core.py - Paython's core libraries"""
 
-import logging
+import functools
+import threading
+import contextlib
 
-from paython.exceptions import DataValidationError, MissingTranslationError
-from paython.lib.utils import is_valid_email
+from paython.exceptions import RequestError
+from paython.lib.aio import default_calls, default_transport
+from paython.lib.translate import Translator
+from paython.lib.log import DebugLog, mask_cards, masked
+from paython.lib.metrics import default_registry, outcome
+from paython.lib.timing import monotonic, timing_fields
+from paython.lib.tracing import NOOP_SPAN, noop_tracer
 
-logger = logging.getLogger(__name__)
+log = DebugLog(__name__)
+
+# compiled translators per gateway class, see Gateway.translator()
+_translators = {}
+
+# set while a call is being built for the async transport, see Gateway.call_async()
+_preparing = threading.local()
+
+def preparing():
+    """
+    True while the current thread builds a call for the async transport
+    """
+    return getattr(_preparing, 'active', False)
+
+def profiled(method):
+    """
+    Profiles a sample of the calls to a gateway operation with the gateway's
+    `profiler` (see paython.lib.profiling), when it has one
+    """
+    name = method.__name__
+
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+        profiler = self.profiler
+        if profiler is None:
+            return method(self, *args, **kwargs)
+
+        profile = profiler.start(self.__class__.__name__, name)
+        try:
+            return method(self, *args, **kwargs)
+        finally:
+            if profile is not None:
+                # the operation went through, a profile that can't be dumped mustn't make it look failed
+                try:
+                    profile.stop()
+                except Exception:
+                    log.exception('Could not dump the %s profile to %s', name, profile.path)
+    return wrapper
+
+def transactional(method):
+    """
+    Runs a gateway operation (auth, capture, ...) against its own fresh request, so nothing
+    leaks from one transaction into the next & one gateway instance can be shared by threads.
+    Every call is recorded in the gateway's metrics registry (async ones once they complete),
+    traced as a span named after the operation & sampled by the gateway's profiler.
+    """
+    name = method.__name__
+
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+        start = monotonic()
+        with self.span(name, operation=name) as span:
+            try:
+                with self.transaction(operation=name):
+                    response = method(self, *args, **kwargs)
+            except Exception:
+                self.metrics.record(self.__class__.__name__, name, monotonic() - start, 'error')
+                raise
+
+            if preparing():
+                response.operation = name # recorded by call_async
+                span.set('prepared', True)
+            else:
+                status = outcome(response)
+                self.metrics.record(self.__class__.__name__, name, monotonic() - start, status)
+                span.set('status', status)
+        return response
+    return profiled(wrapper)
 
 class Gateway(object):
     """base gateway class"""
     REQUEST_FIELDS = {}
-    RESPONSE_FIELDS = {}
     debug = False
 
+    # log requests as sent, card numbers & credentials included (debugging against a test account only)
+    raw_logging = False
+
+    # non-blocking transport used by the `*_async` methods
+    async_transport = default_transport
+
+    # worker threads the `*_async` methods of gateways that can't prepare requests run on
+    blocking_calls = default_calls
+
+    # where operations get counted & timed, see paython.lib.metrics
+    metrics = default_registry
+
+    # spans around building, signing, sending & parsing, see paython.lib.tracing
+    tracer = noop_tracer
+
+    # profiles a sample of the operations when set, see paython.lib.profiling.Profiler
+    profiler = None
+
+    # records what gets sent & received when set, see paython.lib.recording.Recorder
+    recorder = None
+
     def __init__(self, set_method, translations, debug):
         """core gateway class"""
         self.set = set_method
         self.REQUEST_FIELDS = translations
         self.debug = debug
+        self._local = threading.local()
 
-    def use_credit_card(self, credit_card):
+    def new_request(self):
         """
-        Set up credit card info use (if necessary for transaction)
+        Returns the request state a single transaction gets built into,
+        gateways that build their own requests override this
         """
-        if hasattr(credit_card, '_exp_yr_style'): # here for gateways that like 2 digit expiration years
-            credit_card.exp_year = credit_card.exp_year[-2:]
+        return None
 
-        for key, value in credit_card.__dict__.items():
-            if not key.startswith('_'):
-                try:
-                    self.set(self.REQUEST_FIELDS[key], value)
-                except KeyError:
-                    pass # it is okay to fail (on exp_month & exp_year)
+    @contextlib.contextmanager
+    def transaction(self, request=None, operation=None):
+        """
+        Makes `request` (or a fresh one) the request the current thread builds into,
+        fresh requests are closed (if they can be) when the transaction ends.
+        Every transaction times its phases afresh, see current_timing.
+        """
+        local = self._local
+        previous = getattr(local, 'request', None), getattr(local, 'timing', None), getattr(local, 'operation', None)
+        fresh = request is None
+        local.request = self.new_request() if fresh else request
+        local.timing = {}
+        local.operation = operation
+        try:
+            yield local.request
+        finally:
+            if fresh and hasattr(local.request, 'close'):
+                local.request.close()
+            local.request, local.timing, local.operation = previous
 
-    def set_billing_info(self, address=None, address2=None, city=None, state=None, zipcode=None, country=None, phone=None, email=None, ip=None, first_name=None, last_name=None):
+    def current_request(self):
         """
-        Set billing info, as necessary, no required keys. Validates email as well formed.
+        Returns the request the current thread is building
         """
-        if address:
-            self.set(self.REQUEST_FIELDS['address'], address)
+        request = getattr(self._local, 'request', None)
+        if request is None:
+            raise RequestError('Requests can only be built inside a gateway operation (auth, capture, ...)')
+        return request
 
-        if address2:
-            self.set(self.REQUEST_FIELDS['address2'], address2)
+    def current_operation(self):
+        """
+        Name of the operation (auth, capture, ...) the current thread is running, None if unknown
+        """
+        return getattr(self._local, 'operation', None)
 
-        if city:
-            self.set(self.REQUEST_FIELDS['city'], city)
+    def current_timing(self):
+        """
+        Returns the seconds spent per phase (paython.lib.timing.PHASES) of the transaction
+        the current thread is running, None outside a transaction
+        """
+        return getattr(self._local, 'timing', None)
 
-        if state:
-            self.set(self.REQUEST_FIELDS['state'], state)
+    def add_timing(self, phase, seconds):
+        """
+        Adds `seconds` to `phase` of the current transaction's timing
+        """
+        timing = self.current_timing()
+        if timing is not None:
+            timing[phase] = timing.get(phase, 0.0) + seconds
 
-        if zipcode:
-            self.set(self.REQUEST_FIELDS['zipcode'], zipcode)
+    def record_timing(self, phases):
+        """
+        Adds the per phase timing a transport measured (paython.lib.transport.Response.timing)
+        """
+        for phase, seconds in phases.items():
+            self.add_timing(phase, seconds)
 
-        if country:
-            self.set(self.REQUEST_FIELDS['country'], country)
+    def span(self, name, **attributes):
+        """
+        Opens a tracing span for a stage of the current operation, see paython.lib.tracing
+        """
+        if not self.tracer.enabled:
+            return NOOP_SPAN
+        return self.tracer.span(name, gateway=self.__class__.__name__, **attributes)
 
-        if phone:
-            self.set(self.REQUEST_FIELDS['phone'], phone)
+    def traced_prepare(self, uri):
+        """
+        self.prepare_request(uri) in an 'encode' span
+        """
+        with self.span('encode') as span:
+            prepared = self.prepare_request(uri)
+            span.set('bytes_sent', len(prepared.body or ''))
+        return prepared
 
-        if ip:
-            self.set(self.REQUEST_FIELDS['ip'], ip)
+    def traced_send(self, prepared):
+        """
+        self.send(prepared) in a 'network' span
+        """
+        with self.span('network', bytes_sent=len(prepared.body or '')) as span:
+            response = self.send(prepared)
+            span.set('status', response.status)
+            span.set('bytes_received', len(response.body))
+        return response
 
-        if first_name:
-            self.set(self.REQUEST_FIELDS['first_name'], first_name)
+    def recorded_body(self, prepared):
+        """
+        The body of `prepared` as it gets recorded, card numbers starred out.
+        Gateways that know where their card data & credentials go mask those too.
+        """
+        return mask_cards(prepared.body or '')
 
-        if last_name:
-            self.set(self.REQUEST_FIELDS['last_name'], last_name)
+    def record_exchange(self, prepared, response):
+        """
+        Hands a request that went out & the paython.lib.transport.Response it got to the recorder, if any.
+        The transaction went through already, so a recorder failing only gets logged.
+        """
+        if self.recorder is not None:
+            try:
+                self.recorder.record(self, prepared, response)
+            except Exception:
+                log.exception('Could not record the %s exchange with %s', self.__class__.__name__, prepared.url)
 
-        if email:
-            if is_valid_email(email):
-                self.set(self.REQUEST_FIELDS['email'], email)
-            else:
-                raise DataValidationError('The email submitted does not pass regex validation')
+    def parse_response(self, response):
+        """
+        Parses a paython.lib.transport.Response the way the blocking call would, used
+        to replay recorded traffic (see paython.lib.recording.replay)
+        """
+        return self.parse(self.read_response(response), '%0.2f' % (response.elapsed or 0))
 
-    def set_shipping_info(self, ship_first_name, ship_last_name, ship_address, ship_city, ship_state, ship_zipcode, ship_country=None, ship_to_co=None, ship_phone=None, ship_email=None):
+    def timed_parse(self, *args):
         """
-        Adds shipping info, is standard on all gateways. Does not always use same all provided fields.
+        self.parse(*args) in a 'parse' span, attaching the current transaction's timing
+        to the parsed response as its numeric `timing` field (see paython.lib.timing.timing_fields)
+        """
+        start = monotonic()
+        with self.span('parse'):
+            response = self.parse(*args)
+        timing = self.current_timing()
+        if timing is not None and isinstance(response, dict):
+            self.add_timing('parse', monotonic() - start - timing.get('standardize', 0.0))
+            response['timing'] = timing_fields(timing)
+        return response
+
+    def __getattr__(self, name):
+        """
+        gateway.auth_async(...) is short for gateway.call_async(gateway.auth, ...), same for
+        capture_async, settle_async & every other operation
+        """
+        if name.endswith('_async') and not name.startswith('_'):
+            return functools.partial(self.call_async, getattr(self, name[:-len('_async')]))
+        raise AttributeError(name)
+
+    def process(self):
+        """
+        Sends the transaction built up via `set` and parses the gateway response.
+        While a call is being built for the async transport, the prepared request is handed back instead.
+        """
+        if preparing():
+            prepared = self.prepare_request(self.request_uri())
+            prepared.state = self.current_request()
+            return prepared
+
+        response, response_time = self.request()
+        return self.timed_parse(response, response_time)
+
+    def complete(self, prepared, response, response_time):
+        """
+        Parses a paython.lib.transport.Response that came back for `prepared` over another transport
         """
-        # setting all shipping variables
-        self.set(self.REQUEST_FIELDS['ship_first_name'], ship_first_name)
-        self.set(self.REQUEST_FIELDS['ship_last_name'], ship_last_name)
-        self.set(self.REQUEST_FIELDS['ship_address'], ship_address)
-        self.set(self.REQUEST_FIELDS['ship_city'], ship_city)
-        self.set(self.REQUEST_FIELDS['ship_state'], ship_state)
-        self.set(self.REQUEST_FIELDS['ship_zipcode'], ship_zipcode)
+        self.record_exchange(prepared, response)
+        with self.transaction(prepared.state, getattr(prepared, 'operation', None)):
+            return self.timed_parse(self.read_response(response), response_time)
 
-        # now optional ones
-        optionals = ['ship_to_co', 'ship_phone', 'ship_email', 'ship_country'] # using list of strings for reasons spec'd below
+    def prepare(self, operation, *args, **kwargs):
+        """
+        Builds the `operation` (auth, capture, ...) request exactly like the blocking call does,
+        but hands back the paython.lib.transport.PreparedRequest instead of sending it
+        """
+        if not hasattr(self, 'prepare_request'):
+            raise NotImplementedError('%s does not support prepared requests' % self.__class__.__name__)
+
+        _preparing.active = True
+        try:
+            return operation(*args, **kwargs)
+        finally:
+            _preparing.active = False
+
+    def call_async(self, operation, *args, **kwargs):
+        """
+        Sends the prepared `operation` over `self.async_transport`. Returns a
+        paython.lib.aio.Future resolving to the usual parsed response.
+
+        Gateways that can't prepare requests (their SDK does the networking) run
+        the blocking call on `self.blocking_calls` instead.
+        """
+        if not hasattr(self, 'prepare_request'):
+            return self.blocking_calls.submit(operation, *args, **kwargs)
+
+        start = monotonic()
+        prepared = self.prepare(operation, *args, **kwargs)
+        future = self.async_transport.submit(prepared, lambda response: self.complete(prepared, response, '%0.2f' % response.elapsed))
 
-        #in line comments on this one
-        for optional_var in optionals:
-            exec '%s = %s' % (optional_var, optional_var) # re-assign each option param to itself
-            if eval(optional_var): # see if it was passed into the method
-                if optional_var not in self.REQUEST_FIELDS: # make sure we have a translation in the request fields dictionary
-                    # & keep the string so we have a meaningful exception
-                    raise MissingTranslationError('Gateway doesn\'t support the \"%s\" field for shipping' % optional_var)
+        name = getattr(prepared, 'operation', None)
+        if name:
+            def record(future):
+                error = future.exception()
+                self.metrics.record(self.__class__.__name__, name, monotonic() - start,
+                                    outcome(None if error else future.result(), error))
+            future.add_done_callback(record)
+        return future
 
-                # set it on the gateway level if we are able to get this far
-                self.set(self.REQUEST_FIELDS['ship_to_co'], ship_to_co)
+    @classmethod
+    def translator(cls):
+        """
+        Returns the paython.lib.translate.Translator compiled from this gateway's REQUEST_FIELDS
+        """
+        try:
+            return _translators[cls]
+        except KeyError:
+            return _translators.setdefault(cls, Translator(cls.REQUEST_FIELDS))
+
+    def set_fields(self, pairs):
+        """
+        Sets translated (gateway field, value) pairs on the request
+        """
+        for field, value in pairs:
+            self.set(field, value)
+
+    def use_credit_card(self, credit_card):
+        """
+        Set up credit card info use (if necessary for transaction)
+        """
+        if hasattr(credit_card, '_exp_yr_style'): # here for gateways that like 2 digit expiration years
+            credit_card.exp_year = credit_card.exp_year[-2:]
+
+        with self.span('build.card'):
+            self.set_fields(self.translator().card(credit_card))
+
+    def set_billing_info(self, address=None, address2=None, city=None, state=None, zipcode=None, country=None, phone=None, email=None, ip=None, first_name=None, last_name=None):
+        """
+        Set billing info, as necessary, no required keys. Validates email as well formed.
+        """
+        with self.span('build.billing'):
+            self.set_fields(self.translator().billing({
+                'address': address,
+                'address2': address2,
+                'city': city,
+                'state': state,
+                'zipcode': zipcode,
+                'country': country,
+                'phone': phone,
+                'email': email,
+                'ip': ip,
+                'first_name': first_name,
+                'last_name': last_name,
+            }))
+
+    def set_shipping_info(self, ship_first_name, ship_last_name, ship_address, ship_city, ship_state, ship_zipcode, ship_country=None, ship_to_co=None, ship_phone=None, ship_email=None):
+        """
+        Adds shipping info, is standard on all gateways. Does not always use same all provided fields.
+        """
+        with self.span('build.shipping'):
+            self.set_fields(self.translator().shipping({
+                'ship_first_name': ship_first_name,
+                'ship_last_name': ship_last_name,
+                'ship_address': ship_address,
+                'ship_city': ship_city,
+                'ship_state': ship_state,
+                'ship_zipcode': ship_zipcode,
+                'ship_country': ship_country,
+                'ship_to_co': ship_to_co,
+                'ship_phone': ship_phone,
+                'ship_email': ship_email,
+            }))
 
     def standardize(self, spec_response, field_mapping, response_time, approved):
         """
         Translates gateway specific response into Paython generic response.
         Expects list or dictionary for spec_repsonse & dictionary for field_mapping.
         """
-        # manual settings
-        self.RESPONSE_FIELDS['response_time'] = response_time
-        self.RESPONSE_FIELDS['approved'] = approved
-
-        if isinstance(spec_response, list): # list settings
-            i = 0
-            debug_string = 'paython.gateways.core.standardize() -- spec_response: '
-            logger.debug(debug_string.center(80, '='))
-            logger.debug('\n%s' % spec_response)
-            debug_string = 'paython.gateways.core.standardize() -- field_mapping: '
-            logger.debug(debug_string.center(80, '='))
-            logger.debug('\n%s' % field_mapping)
-
-            for item in spec_response:
-                iteration_key = str(i) #stringifying because the field_mapping keys are strings
-                if iteration_key in field_mapping:
-                    self.RESPONSE_FIELDS[field_mapping[iteration_key]] = item
-                i += 1
-        else: # dict settings
-            for key, value in spec_response.items():
-                try:
-                    self.RESPONSE_FIELDS[field_mapping[key]] = value
-                except KeyError:
-                    pass #its okay to fail if we dont have a translation
+        start = monotonic()
+        with self.span('standardize'):
+            # manual settings
+            response_fields = {
+                'response_time': response_time,
+                'approved': approved,
+            }
+
+            if isinstance(spec_response, list): # list settings
+                i = 0
+                log.banner('paython.gateways.core.standardize() -- spec_response: ')
+                log.debug('\n%s', masked(spec_response, self.raw_logging))
+                log.banner('paython.gateways.core.standardize() -- field_mapping: ')
+                log.debug('\n%s', field_mapping)
+
+                for item in spec_response:
+                    iteration_key = str(i) #stringifying because the field_mapping keys are strings
+                    if iteration_key in field_mapping:
+                        response_fields[field_mapping[iteration_key]] = item
+                    i += 1
+            else: # dict settings
+                for key, value in spec_response.items():
+                    try:
+                        response_fields[field_mapping[key]] = value
+                    except KeyError:
+                        pass #its okay to fail if we dont have a translation
+
+        self.add_timing('standardize', monotonic() - start)
 
         #send it back!
-        return self.RESPONSE_FIELDS
+        return response_fields
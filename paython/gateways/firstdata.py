@@ -3,14 +3,23 @@ import hmac
 import json
 import base64
 import decimal
-import requests
 import datetime
 import urlparse
-import logging
+import collections
 from hashlib import sha1
-from time import gmtime, strftime
+from time import gmtime, strftime, sleep
 
+from paython.gateways.core import preparing, transactional
 from paython.lib.api import PostGateway
+from paython.lib.log import DebugLog, lazy, mask_cards, mask_value, masked
+from paython.lib.retry import NO_RETRY, RetryPolicy
+from paython.lib.timing import monotonic
+from paython.lib.transport import PreparedRequest
+
+try:
+    import ujson
+except ImportError:
+    ujson = None # only needed for fast_json
 
 
 
@@ -20,15 +29,52 @@ def JSONHandler(obj):
     elif isinstance(obj, datetime.datetime):
         return str(obj)
 
+def encode_json(fields):
+    return json.dumps(fields, default=JSONHandler)
+
+def encode_json_fast(fields):
+    """
+    encode_json with ujson, which has no default hook: Decimals & datetimes get converted up front
+    """
+    return ujson.dumps(dict((key, JSONHandler(value) if isinstance(value, (decimal.Decimal, datetime.datetime)) else value)
+                            for key, value in fields.items()))
+
 class FirstDataUnauthorizedRequest(Exception):
     pass
 
-logger = logging.getLogger(__name__)
+# what First Data answers, quite often for no reason at all, instead of processing the transaction
+UNAUTHORIZED_REQUEST = "Unauthorized Request. Bad or missing credentials."
+
+# the shapes First Data answers in, see response_format()
+JSON, FORM, TEXT = 'json', 'form', 'text'
+
+# what parse() hands back for string errors, copied & filled in per error
+ERROR_TEMPLATE = {"transaction_approved":0,"bank_message":None,"amount":0,"fraud_suspected":None,"success":False,"reference_3":None,"cvd_presence_ind":0,"bank_resp_code":None,"partial_redemption":0,"card_cost":None,"exact_message":None,"logon_message":None,"secure_auth_result":None,"payer_id":None,"transaction_type":None,"cc_verification_str2":None,"ecommerce_flag":None,"reference_no":None,"cavv":None,"previous_balance":None,"error_description":None,"tax2_number":None,"exact_resp_code":None,"secure_auth_required":None,"amount_requested":None,"client_email":None,"cc_verification_str1":None,"language":None}
+
+def response_format(headers, body):
+    """
+    JSON, FORM or TEXT: what a First Data answer looks like from its first (non blank)
+    character & Content-Type, so parse() tries a single decoder instead of failing through them
+    """
+    first = body[:1]
+    if first.isspace():
+        first = body.lstrip()[:1]
+    if first == '{' or first == '[':
+        return JSON
+    if 'x-www-form-urlencoded' in (headers or {}).get('content-type', '') or '=' in body:
+        return FORM
+    return TEXT
+
+log = DebugLog(__name__)
 
 class FirstData(PostGateway):
     """
     FirstData JSON API version 14 support
     https://firstdata.zendesk.com/entries/407571-first-data-global-gateway-e4sm-web-service-api-reference-guide
+
+    Transactions go over the pooled keep-alive connections (see PostGateway.pool),
+    pass fast_json=True to encode them with ujson. Spurious "Unauthorized Request"
+    answers get the transaction sent again as `retry_policy` says (blocking calls only).
     """
     GATEWAY_TEST = "api.demo.globalgatewaye4.firstdata.com"
     GATEWAY_LIVE = "api.globalgatewaye4.firstdata.com"
@@ -36,7 +82,8 @@ class FirstData(PostGateway):
                 False : GATEWAY_LIVE,
                 True :  GATEWAY_TEST
               }
-    RESPONSE_FIELDS = {}
+    _retry_on_bmc = 1
+    retry_policy = RetryPolicy(attempts=3, backoff=0.25, deadline=10.0, bodies=[UNAUTHORIZED_REQUEST])
     TRANSACTION_TYPES = {
         'purchase': '00',
         'pre_authorization': '01',
@@ -98,6 +145,10 @@ class FirstData(PostGateway):
         self.gateway = str(gateway)
         debug = kwargs.get('debug')
         self.url = self.API_URI.get(debug)
+        if kwargs.get('fast_json') and ujson is None:
+            raise Exception('ujson not found, please install ujson to use fast_json')
+        self.encode_json = encode_json_fast if kwargs.get('fast_json') else encode_json
+        self._signer = None
         super(FirstData, self).__init__(self.REQUEST_FIELDS, debug)
 
     def use_credit_card(self, credit_card):
@@ -107,40 +158,36 @@ class FirstData(PostGateway):
         if hasattr(credit_card, '_exp_yr_style'): # here for gateways that like 2 digit expiration years
             credit_card.exp_year = credit_card.exp_year[-2:]
 
-        for key, value in credit_card.__dict__.items():
-            if not key.startswith('_'):
-                try:
-                    self.set(self.REQUEST_FIELDS[key], value)
-                except KeyError:
-                    pass # it is okay to fail (on exp_month & exp_year)
+        with self.span('build.card'):
+            self.set_fields(self.translator().card(credit_card))
 
-        #setting credit card correctly
-        if len(credit_card.exp_month) < 2:
-            credit_card.exp_month = "0%s" % credit_card.exp_month
-        expire_date = '%s%s' % (credit_card.exp_month, credit_card.exp_year[2:])
-        #expire date
-        self.set('cc_expiry', expire_date)
-        del self.REQUEST_DICT[None]
+            #setting credit card correctly
+            if len(credit_card.exp_month) < 2:
+                credit_card.exp_month = "0%s" % credit_card.exp_month
+            expire_date = '%s%s' % (credit_card.exp_month, credit_card.exp_year[2:])
+            #expire date
+            self.set('cc_expiry', expire_date)
 
 
+    @transactional
     def purchase(self, amount, cc_obj):
         self.set('gateway_id', self.gateway)
         self.set('password', self.password)
         self.set(self.REQUEST_FIELDS['trans_type'], self.TRANSACTION_TYPES['purchase'])
         self.set(self.REQUEST_FIELDS['amount'], amount)
         self.use_credit_card(cc_obj)
-        r = self.request()
-        return r
+        return self.process()
 
+    @transactional
     def auth(self, amount, cc_obj):
         self.set('gateway_id', self.gateway)
         self.set('password', self.password)
         self.set(self.REQUEST_FIELDS['trans_type'], self.TRANSACTION_TYPES['pre_authorization'])
         self.set(self.REQUEST_FIELDS['amount'], amount)
         self.use_credit_card(cc_obj)
-        r = self.request()
-        return r
+        return self.process()
 
+    @transactional
     def auth_completion(self, amount, cc_obj, auth_num):
         self.set('gateway_id', self.gateway)
         self.set('password', self.password)
@@ -148,11 +195,11 @@ class FirstData(PostGateway):
         self.set('authorization_num', auth_num)
         self.set(self.REQUEST_FIELDS['amount'], amount)
         self.use_credit_card(cc_obj)
-        r = self.request()
-        return r
+        return self.process()
 
         self.set('authorization_num', auth_num)
 
+    @transactional
     def void(self, amount, cc_obj, auth_num):
         self.set('gateway_id', self.gateway)
         self.set('password', self.password)
@@ -160,19 +207,19 @@ class FirstData(PostGateway):
         self.set('authorization_num', auth_num)
         self.set(self.REQUEST_FIELDS['amount'], amount)
         self.use_credit_card(cc_obj)
-        r = self.request()
-        return r
+        return self.process()
 
+    @transactional
     def refund(self, amount, cc_obj):
         self.set('gateway_id', self.gateway)
         self.set('password', self.password)
         self.set(self.REQUEST_FIELDS['trans_type'], self.TRANSACTION_TYPES['refund'])
         self.set(self.REQUEST_FIELDS['amount'], amount)
         self.use_credit_card(cc_obj)
-        r = self.request()
-        return r
+        return self.process()
 
     #tagged methods
+    @transactional
     def tagged_refund(self, amount, transaction_tag, auth_num):
         self.set('gateway_id', self.gateway)
         self.set('password', self.password)
@@ -180,9 +227,9 @@ class FirstData(PostGateway):
         self.set(self.REQUEST_FIELDS['amount'], amount)
         self.set('transaction_tag', transaction_tag)
         self.set('authorization_num', auth_num)
-        r = self.request()
-        return r
+        return self.process()
 
+    @transactional
     def tagged_void(self, amount, transaction_tag, auth_num):
         self.set('gateway_id', self.gateway)
         self.set('password', self.password)
@@ -190,9 +237,9 @@ class FirstData(PostGateway):
         self.set(self.REQUEST_FIELDS['amount'], amount)
         self.set('transaction_tag', transaction_tag)
         self.set('authorization_num', auth_num)
-        r = self.request()
-        return r
+        return self.process()
 
+    @transactional
     def tagged_pre_authorization_completion(self, amount, transaction_tag, auth_num):
         self.set('gateway_id', self.gateway)
         self.set('password', self.password)
@@ -200,66 +247,148 @@ class FirstData(PostGateway):
         self.set(self.REQUEST_FIELDS['amount'], amount)
         self.set('transaction_tag', transaction_tag)
         self.set('authorization_num', auth_num)
-        r = self.request()
-        return r
+        return self.process()
+
+    def request_uri(self):
+        return "https://" + self.url + "/transaction/v14"
+
+    def signer(self):
+        """
+        A fresh HMAC-SHA1 keyed with the secret: the key is set up once (again if the
+        secret changes) & copied for every signature
+        """
+        signer = self._signer
+        if signer is None or signer[0] != self.secret:
+            signer = self._signer = (self.secret, hmac.new(self.secret, digestmod=sha1))
+        return signer[1].copy()
+
+    def prepare_request(self, uri):
+        """Signs the JSON transaction with the X-GGe4 headers
+        """
+        gge4_date = strftime("%Y-%m-%dT%H:%M:%S", gmtime()) + 'Z'
+        transaction_body = self.encode_json(self.REQUEST_DICT)
+        with self.span('sign'):
+            content_digest = sha1(transaction_body).hexdigest()
+            signature = self.signer()
+            signature.update("POST\napplication/json\n"+content_digest+"\n"+gge4_date+"\n/transaction/v14")
+            headers = {'Content-Type': "application/json",
+                       'Accept': "application/json",
+                       'X-GGe4-Content-SHA1': content_digest,
+                       'X-GGe4-Date': gge4_date,
+                       'Authorization': 'GGE4_API ' + self.key + ':' + base64.b64encode(signature.digest())}
+
+        return PreparedRequest('POST', uri, transaction_body, headers, verify=not self.debug)
 
-    def request(self, retry_on_bmc=1):
-        """Send the transaction out to First Data
+    def redacted_fields(self):
+        secrets = super(FirstData, self).redacted_fields()
+        secrets['password'] = 0
+        return secrets
+
+    def recorded_body(self, prepared):
+        """
+        The JSON sent, in the order sent, with the redacted_fields starred out
+        """
+        fields = json.loads(prepared.body, object_pairs_hook=collections.OrderedDict)
+        for key, keep in self.redacted_fields().items():
+            if fields.get(key):
+                fields[key] = mask_value(fields[key], keep)
+        return mask_cards(json.dumps(fields, default=JSONHandler))
+
+    def process(self):
+        """request() parses the response already
+        """
+        if preparing():
+            prepared = self.prepare_request(self.request_uri())
+            prepared.state = self.current_request()
+            return prepared
+        return self.request()
+
+    def complete(self, prepared, response, response_time):
+        self.record_exchange(prepared, response)
+        with self.transaction(prepared.state, getattr(prepared, 'operation', None)):
+            self.record_timing(response.timing)
+            return self.timed_parse(response)
+
+    def parse_response(self, response):
+        return self.parse(response)
+
+    @staticmethod
+    def handles_bmc(retry_on_bmc):
+        """
+        True when "Unauthorized Request" answers get retried & raised as FirstDataUnauthorizedRequest,
+        retry_on_bmc=0 (or anything but 1-3) hands them back as an error response on the first one
+        """
+        return type(retry_on_bmc) is int and 0 < retry_on_bmc < 4
+
+    def request(self, retry_on_bmc=None):
+        """Send the transaction out to First Data, retry_on_bmc defaults to _retry_on_bmc (see handles_bmc)
         """
+        if retry_on_bmc is None:
+            retry_on_bmc = self._retry_on_bmc
 
-        self._retry_on_bmc = retry_on_bmc
         assert type(self.debug) is bool, "Invalid test value, must be type boolean"
 
-        gge4_date = strftime("%Y-%m-%dT%H:%M:%S", gmtime()) + 'Z'
-        transaction_body = json.dumps(self.REQUEST_DICT, default=JSONHandler)
-        content_digest = sha1(transaction_body).hexdigest()
-        headers = {'Content-Type': "application/json",
-                   'Accept': "application/json",
-                   'X-GGe4-Content-SHA1': content_digest,
-                   'X-GGe4-Date': gge4_date,
-                   'Authorization': 'GGE4_API ' + self.key + ':' + base64.b64encode(hmac.new(self.secret, "POST\napplication/json\n"+content_digest+"\n"+gge4_date+"\n/transaction/v14", sha1).digest())}
-
-        r = requests.post(("https://" + self.url + "/transaction/v14"),
-                            timeout=20,
-                            verify=not self.debug,
-                            data=transaction_body,
-                            headers=headers)
-        if self.debug:
-            debug_str = "response code: %s" % r.status_code
-            logger.debug(debug_str.center(80, '='))
-        return self.parse(r)
-
-    def parse(self, response):
-        response = response.text
-        if self.debug:
-            logger.debug(response)
-        if type(self._retry_on_bmc) is int and 0 < self._retry_on_bmc < 4 and response == "Unauthorized Request. Bad or missing credentials.":
+        policy = self.retry_policy if self.handles_bmc(retry_on_bmc) else NO_RETRY
+        start = monotonic()
+        attempt = 1
+        while True:
+            # signed again for every attempt, a stale X-GGe4-Date may be what got it refused
+            prepared = self.traced_prepare(self.request_uri())
+            response = self.traced_send(prepared) # keep-alive, 20s socket timeout
+            self.record_exchange(prepared, response)
+            self.record_timing(response.timing)
+
+            wait = policy.wait(attempt, monotonic() - start, response.status, response.body)
+            if wait is None:
+                break
+            log.debug('%s', lazy(json.dumps, dict(attempt=attempt, wait=wait, status=response.status, source="First Data retry")))
+            self.metrics.record_retry(self.__class__.__name__, self.current_operation())
+            sleep(wait)
+            attempt += 1
+
+        log.banner('response code: %s', response.status)
+        return self.timed_parse(response, retry_on_bmc)
+
+    def parse(self, response, retry_on_bmc=None):
+        if retry_on_bmc is None:
+            retry_on_bmc = self._retry_on_bmc
+        body = response.text
+        log.debug('%s', masked(body, self.raw_logging))
+        # compared like RetryPolicy.retryable does, so whatever got retried gets raised once it gives up
+        if self.handles_bmc(retry_on_bmc) and (body or '').strip() == UNAUTHORIZED_REQUEST:
             """When FDs servers return "Unauthorized Request. Bad or missing credentials."
-            which happend quite often for ABSOLUTLY no reason. We will try the request again.
-            3 attempts will be made if this error occurs.
+            which happend quite often for ABSOLUTLY no reason. request() sends it again
+            as retry_policy says (3 attempts by default), this is raised once it gives up.
             I have contacted their support about this issue...sometime ago.
             """
-            if self.debug:
-                logger.debug(json.dumps(dict(attempt=self._retry_on_bmc, source="First Data Unauthorized Request")))
+            log.debug('%s', lazy(json.dumps, dict(attempt=retry_on_bmc, source="First Data Unauthorized Request")))
 
             raise FirstDataUnauthorizedRequest()
 
-        else:
+        body_format = response_format(getattr(response, 'headers', None), body)
+        if body_format == JSON:
             try:
-                json_response = json.loads(response)
-                return json_response
-            except:
-                """FirstData sometimes sends back a http-args not a json argument...ugh.
-                """
-                try:
-                    urlargs = dict(urlparse.parse_qsl(response))
-                    if len(urlargs)==0:
-                        raise ValueError("Move to text...")
-                    else:
-                        return urlargs
-                except:
-                    """FirstData also sends back string errors.
-                    """
-                    # make my own FirstData Error
-                    error = {"transaction_approved":0,"bank_message":response,"amount":self.REQUEST_DICT.get('amount',0),"fraud_suspected":None,"success":False,"reference_3":None,"cvd_presence_ind":0,"bank_resp_code":None,"partial_redemption":0,"card_cost":None,"exact_message":response,"logon_message":None,"secure_auth_result":None,"payer_id":None,"transaction_type":self.REQUEST_DICT.get('transaction_type'),"cc_verification_str2":None,"ecommerce_flag":None,"reference_no":self.REQUEST_DICT.get('reference_no'),"cavv":None,"previous_balance":None,"error_description":None,"tax2_number":None,"exact_resp_code":None,"secure_auth_required":None,"amount_requested":None,"client_email":None,"cc_verification_str1":None,"language":None}
-                    return error
+                return json.loads(body)
+            except ValueError:
+                body_format = FORM # not JSON after all, see what's left
+        if body_format == FORM:
+            """FirstData sometimes sends back a http-args not a json argument...ugh.
+            """
+            urlargs = dict(urlparse.parse_qsl(body))
+            if urlargs:
+                return urlargs
+        """FirstData also sends back string errors.
+        """
+        return self.error_response(body)
+
+    def error_response(self, message):
+        """
+        Makes my own FirstData Error out of a string error
+        """
+        request = self.REQUEST_DICT
+        error = dict(ERROR_TEMPLATE)
+        error['bank_message'] = error['exact_message'] = message
+        error['amount'] = request.get('amount', 0)
+        error['transaction_type'] = request.get('transaction_type')
+        error['reference_no'] = request.get('reference_no')
+        return error
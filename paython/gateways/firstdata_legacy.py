@@ -1,12 +1,13 @@
 import re
 import time
 import urlparse
-import logging
 
 from paython.exceptions import DataValidationError, MissingDataError
+from paython.gateways.core import transactional
 from paython.lib.api import XMLGateway
+from paython.lib.log import DebugLog, lazy, masked
 
-logger = logging.getLogger(__name__)
+log = DebugLog(__name__)
 
 class FirstDataLegacy(XMLGateway):
     """First data legacy support"""
@@ -83,7 +84,6 @@ class FirstDataLegacy(XMLGateway):
 
     debug = False
     test = False
-    cvv_present = False
 
     def __init__(self, username='Test123', key_file='../keys/yourkey.pem', cert_file='../keys/yourkey.pem', debug=False, test=False):
         """
@@ -97,21 +97,20 @@ class FirstDataLegacy(XMLGateway):
         super(FirstDataLegacy, self).__init__(url, translations=self.REQUEST_FIELDS, debug=debug, special_params=ssl_config)
 
         #setting some creds
-        super(FirstDataLegacy, self).set('order/merchantinfo/configfile', username)
+        self.set_static('order/merchantinfo/configfile', username)
 
         if debug:
             self.debug = True
 
         if test:
             self.test = True
-            debug_string = " paython.gateways.firstdata_legacy.__init__() -- You're in test mode (& debug, obviously) "
-            logger.debug(debug_string.center(80, '='))
+            log.banner(" paython.gateways.firstdata_legacy.__init__() -- You're in test mode (& debug, obviously) ")
 
-    def charge_setup(self):
+    def charge_setup(self, cvv_present=False):
         """
         standard setup, used for charges
         """
-        if self.cvv_present:
+        if cvv_present:
             super(FirstDataLegacy, self).set('order/creditcard/cvmindicator', 'provided')
         
         if self.test: # will almost always return nice
@@ -119,17 +118,15 @@ class FirstDataLegacy(XMLGateway):
         else:
             super(FirstDataLegacy, self).set('order/orderoptions/result', 'Live')
         
-        debug_string = " paython.gateways.firstdata_legacy.charge_setup() Just set up for a charge "
-        logger.debug(debug_string.center(80, '='))
+        log.banner(" paython.gateways.firstdata_legacy.charge_setup() Just set up for a charge ")
 
+    @transactional
     def auth(self, amount, credit_card=None, billing_info=None, shipping_info=None):
         """
         Sends charge for authorization based on amount
         """
-        #check for cvv
-        self.cvv_present = True if credit_card.verification_value else False
-        #set up transaction
-        self.charge_setup() # considering turning this into a decorator?
+        #set up transaction, checking for cvv
+        self.charge_setup(bool(credit_card.verification_value)) # considering turning this into a decorator?
 
         #setting transaction data
         super(FirstDataLegacy, self).set(self.REQUEST_FIELDS['amount'], amount)
@@ -147,8 +144,7 @@ class FirstDataLegacy(XMLGateway):
 
         # validating or building up request
         if not credit_card:
-            debug_string = "paython.gateways.firstdata_legacy.auth()  -- No CreditCard object present. You passed in %s " % (credit_card)
-            logger.debug(debug_string)
+            log.debug("paython.gateways.firstdata_legacy.auth()  -- No CreditCard object present. You passed in %s ", credit_card)
 
             raise MissingDataError('You did not pass a CreditCard object into the auth method')
         else:
@@ -162,9 +158,9 @@ class FirstDataLegacy(XMLGateway):
             super(FirstDataLegacy, self).set_shipping_info(**shipping_info)
 
         # send transaction to gateway!
-        response, response_time = self.request()
-        return self.parse(response, response_time)
+        return self.process()
 
+    @transactional
     def settle(self, amount, trans_id):
         """
         Sends prior authorization to be settled based on amount & trans_id PRIOR_AUTH_CAPTURE
@@ -178,15 +174,15 @@ class FirstDataLegacy(XMLGateway):
         super(FirstDataLegacy, self).set(self.REQUEST_FIELDS['trans_id'], trans_id)
 
         # send transaction to gateway!
-        response, response_time = self.request()
-        return self.parse(response, response_time)
+        return self.process()
 
+    @transactional
     def capture(self, amount, credit_card=None, billing_info=None, shipping_info=None):
         """
         Sends transaction for capture (same day settlement) based on amount.
         """
-        #set up transaction
-        self.charge_setup() # considering turning this into a decorator?
+        #set up transaction, checking for cvv
+        self.charge_setup(bool(credit_card and credit_card.verification_value)) # considering turning this into a decorator?
 
         #setting transaction data
         super(FirstDataLegacy, self).set(self.REQUEST_FIELDS['amount'], amount)
@@ -201,7 +197,7 @@ class FirstDataLegacy(XMLGateway):
 
         # validating or building up request
         if not credit_card:
-            logger.debug("paython.gateways.firstdata_legacy.capture()  -- No CreditCard object present. You passed in %s " % (credit_card))
+            log.debug("paython.gateways.firstdata_legacy.capture()  -- No CreditCard object present. You passed in %s ", credit_card)
 
             raise MissingDataError('You did not pass a CreditCard object into the auth method')
         else:
@@ -215,9 +211,9 @@ class FirstDataLegacy(XMLGateway):
             super(FirstDataLegacy, self).set_shipping_info(**shipping_info)
 
         # send transaction to gateway!
-        response, response_time = self.request()
-        return self.parse(response, response_time)
+        return self.process()
 
+    @transactional
     def void(self, trans_id):
         """
         Send a SALE (only works for sales) transaction to be voided (in full) that was initially sent for capture the same day
@@ -231,9 +227,9 @@ class FirstDataLegacy(XMLGateway):
         super(FirstDataLegacy, self).set(self.REQUEST_FIELDS['trans_id'], trans_id)
 
         # send transaction to gateway!
-        response, response_time = self.request()
-        return self.parse(response, response_time)
+        return self.process()
 
+    @transactional
     def credit(self, amount, trans_id, credit_card):
         """
         Sends a transaction to be refunded (partially or fully)
@@ -250,21 +246,22 @@ class FirstDataLegacy(XMLGateway):
             super(FirstDataLegacy, self).set(self.REQUEST_FIELDS['amount'], amount)
 
         # send transaction to gateway!
-        response, response_time = self.request()
-        return self.parse(response, response_time)
+        return self.process()
+
+    def request_uri(self):
+        """
+        getting the uri to POST xml to
+        """
+        return urlparse.urlparse(self.API_URI['live']).path
 
     def request(self):
         """
         Makes a request using lib.api.XMLGateway.make_request() & move some debugging away from other methods.
         """
-        #getting the uri to POST xml to
-        uri = urlparse.urlparse(self.API_URI['live']).path
+        uri = self.request_uri()
 
-        debug_string = " paython.gateways.firstdata_legacy.request() -- Attempting request to: "
-        logger.debug(debug_string.center(80, '='))
-        logger.debug("\n %s with params: %s" %
-                     (self.API_URI['live'],
-                      super(FirstDataLegacy, self).request_xml()))
+        log.banner(" paython.gateways.firstdata_legacy.request() -- Attempting request to: ")
+        log.debug("\n %s with params: %s", self.API_URI['live'], lazy(self.logged_xml))
 
         # make the request
         start = time.time() # timing it
@@ -272,8 +269,7 @@ class FirstDataLegacy(XMLGateway):
         end = time.time() # done timing it
         response_time = '%0.2f' % (end-start)
 
-        debug_string = " paython.gateways.firstdata_legacy.request()  -- Request completed in %ss " % response_time
-        logger.debug(debug_string.center(80, '='))
+        log.banner(" paython.gateways.firstdata_legacy.request()  -- Request completed in %ss ", response_time)
 
         return response, response_time
 
@@ -281,15 +277,13 @@ class FirstDataLegacy(XMLGateway):
         """
         On Specific Gateway due differences in response from gateway
         """
-        debug_string = " paython.gateways.firstdata_legacy.parse() -- Raw response: "
-        logger.debug(debug_string.center(80, '='))
-        logger.debug("\n %s" % response)
+        log.banner(" paython.gateways.firstdata_legacy.parse() -- Raw response: ")
+        log.debug("\n %s", masked(response, self.raw_logging))
 
         response = response['response']
         approved = True if response['r_approved'] == 'APPROVED' else False
 
-        debug_string = " paython.gateways.firstdata_legacy.parse() -- Response as dict: "
-        logger.debug(debug_string.center(80, '='))
-        logger.debug('\n%s' % response)
+        log.banner(" paython.gateways.firstdata_legacy.parse() -- Response as dict: ")
+        log.debug('\n%s', masked(response, self.raw_logging))
 
         return super(FirstDataLegacy, self).standardize(response, self.RESPONSE_KEYS, response_time, approved)
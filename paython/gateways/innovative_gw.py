@@ -1,11 +1,12 @@
 import time
 import urlparse
-import logging
 
 from paython.exceptions import MissingDataError
+from paython.gateways.core import transactional
 from paython.lib.api import PostGateway
+from paython.lib.log import DebugLog, lazy, masked
 
-logger = logging.getLogger(__name__)
+log = DebugLog(__name__)
 
 class InnovativeGW(PostGateway):
     """TODO needs docstring"""
@@ -89,27 +90,28 @@ class InnovativeGW(PostGateway):
         """
         setting up object so we can run 3 different ways (live, debug, live+debug no test endpoint available)
         """
-        super(InnovativeGW, self).set('username', username)
-        super(InnovativeGW, self).set('pw', password)
-
         # passing fields to bubble up to Base Class
         super(InnovativeGW, self).__init__(translations=self.REQUEST_FIELDS, debug=debug)
 
+        self.set_static('username', username)
+        self.set_static('pw', password, secret=True)
+
+        # the same on every request, so encoded once with the credentials
+        self.set_static('target_app', self.VERSION)
+        self.set_static('response_mode', 'simple')
+        self.set_static('response_fmt', 'url_encoded')
+        self.set_static('upg_auth', 'zxcvlkjh')
+
         if debug:
             self.debug = True
 
     def charge_setup(self):
         """
-        standard setup, used for charges
+        standard setup, used for charges (the response format is set up as static fields, see __init__)
         """
-        super(InnovativeGW, self).set('target_app', self.VERSION)
-        super(InnovativeGW, self).set('response_mode', 'simple')
-        super(InnovativeGW, self).set('response_fmt', 'url_encoded')
-        super(InnovativeGW, self).set('upg_auth', 'zxcvlkjh')
-
-        debug_string = " paython.gateways.innovative_gw.charge_setup() Just set up for a charge "
-        logger.debug(debug_string.center(80, '='))
+        log.banner(" paython.gateways.innovative_gw.charge_setup() Just set up for a charge ")
 
+    @transactional
     def auth(self, amount, credit_card=None, billing_info=None, shipping_info=None):
         """
         Sends charge for authorization based on amount
@@ -123,7 +125,7 @@ class InnovativeGW(PostGateway):
 
         # validating or building up request
         if not credit_card:
-            logger.debug("paython.gateways.innovative_gw.auth()  -- No CreditCard object present. You passed in %s " % (credit_card))
+            log.debug("paython.gateways.innovative_gw.auth()  -- No CreditCard object present. You passed in %s ", credit_card)
 
             raise MissingDataError('You did not pass a CreditCard object into the auth method')
         else:
@@ -136,9 +138,9 @@ class InnovativeGW(PostGateway):
             super(InnovativeGW, self).set_shipping_info(**shipping_info)
 
         # send transaction to gateway!
-        response, response_time = self.request()
-        return self.parse(response, response_time)
+        return self.process()
 
+    @transactional
     def settle(self, amount, trans_id, ref):
         """
         Sends prior authorization to be settled based on amount & trans_id PRIOR_AUTH_CAPTURE
@@ -154,9 +156,9 @@ class InnovativeGW(PostGateway):
         super(InnovativeGW, self).set('authamount', amount) #hardcoded because of uniqueness to gateway
 
         # send transaction to gateway!
-        response, response_time = self.request()
-        return self.parse(response, response_time)
+        return self.process()
 
+    @transactional
     def capture(self, amount, credit_card=None, billing_info=None, shipping_info=None):
         """
         Sends transaction for capture (same day settlement) based on amount.
@@ -170,7 +172,7 @@ class InnovativeGW(PostGateway):
 
         # validating or building up request
         if not credit_card:
-            logger.debug("paython.gateways.innovative_gw.capture()  -- No CreditCard object present. You passed in %s " % (credit_card))
+            log.debug("paython.gateways.innovative_gw.capture()  -- No CreditCard object present. You passed in %s ", credit_card)
 
             raise MissingDataError('You did not pass a CreditCard object into the auth method')
         else:
@@ -183,9 +185,9 @@ class InnovativeGW(PostGateway):
             super(InnovativeGW, self).set_shipping_info(**shipping_info)
 
         # send transaction to gateway!
-        response, response_time = self.request()
-        return self.parse(response, response_time)
+        return self.process()
 
+    @transactional
     def void(self, trans_id, ref, ordernumber):
         """
         Sends a transaction to be voided (in full)
@@ -200,9 +202,9 @@ class InnovativeGW(PostGateway):
         super(InnovativeGW, self).set('ordernumber', ordernumber) #hardcoded because of uniqueness to gateway
 
         # send transaction to gateway!
-        response, response_time = self.request()
-        return self.parse(response, response_time)
+        return self.process()
 
+    @transactional
     def credit(self, amount, trans_id, ref, ordernumber):
         """
         Sends a transaction to be refunded (partially or fully)
@@ -220,20 +222,22 @@ class InnovativeGW(PostGateway):
             super(InnovativeGW, self).set(self.REQUEST_FIELDS['amount'], amount)
 
         # send transaction to gateway!
-        response, response_time = self.request()
-        return self.parse(response, response_time)
+        return self.process()
+
+    def request_uri(self):
+        """
+        there is only a live environment, with test credentials
+        """
+        return self.API_URI['live']
 
     def request(self):
         """
         Makes a request using lib.api.GetGateway.make_request() & move some debugging away from other methods.
         """
-        # there is only a live environment, with test credentials
-        url = self.API_URI['live']
+        url = self.request_uri()
 
-        debug_string = " paython.gateways.innovative_gw.request() -- Attempting request to: "
-        logger.debug(debug_string.center(80, '='))
-        logger.debug("\n %s with params: %s" %
-                     (url, super(InnovativeGW, self).params()))
+        log.banner(" paython.gateways.innovative_gw.request() -- Attempting request to: ")
+        log.debug("\n %s with params: %s", url, lazy(self.params))
 
         # make the request
         start = time.time() # timing it
@@ -241,8 +245,7 @@ class InnovativeGW(PostGateway):
         end = time.time() # done timing it
         response_time = '%0.2f' % (end - start)
 
-        debug_string = " paython.gateways.innovative_gw.request()  -- Request completed in %ss " % response_time
-        logger.debug(debug_string.center(80, '='))
+        log.banner(" paython.gateways.innovative_gw.request()  -- Request completed in %ss ", response_time)
 
         return response, response_time
 
@@ -250,9 +253,8 @@ class InnovativeGW(PostGateway):
         """
         On Specific Gateway due differences in response from gateway
         """
-        debug_string = " paython.gateways.innovative_gw.parse() -- Raw response: "
-        logger.debug(debug_string.center(80, '='))
-        logger.debug("\n %s" % response)
+        log.banner(" paython.gateways.innovative_gw.parse() -- Raw response: ")
+        log.debug("\n %s", masked(response, self.raw_logging))
 
         new_response = urlparse.parse_qsl(response)
         response = dict(new_response)
@@ -262,8 +264,7 @@ class InnovativeGW(PostGateway):
             approved = False
             response['approval'] = 'decline' # there because we have a translation key called "approval" - open to ideas here...
 
-        debug_string = " paython.gateways.innovative_gw.parse() -- Response as dict: "
-        logger.debug(debug_string.center(80, '='))
-        logger.debug('\n%s' % response)
+        log.banner(" paython.gateways.innovative_gw.parse() -- Response as dict: ")
+        log.debug('\n%s', masked(response, self.raw_logging))
 
         return super(InnovativeGW, self).standardize(response, self.RESPONSE_KEYS, response_time, approved)
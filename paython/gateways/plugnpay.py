@@ -1,11 +1,12 @@
 import time
 import urllib
-import logging
 
 from paython.exceptions import MissingDataError
+from paython.gateways.core import transactional
 from paython.lib.api import PostGateway
+from paython.lib.log import DebugLog, lazy, masked
 
-logger = logging.getLogger(__name__)
+log = DebugLog(__name__)
 
 
 class PlugnPay(PostGateway):
@@ -358,24 +359,27 @@ class PlugnPay(PostGateway):
 
     def __init__(self, username='pnpdemo', password='', email='', dontsndmail=True, debug=True):
 
+        # passing fields to bubble up to Base Class
+        super(PlugnPay, self).__init__(translations=self.REQUEST_FIELDS, debug=debug)
+
         # mandatory fields for every request
-        super(PlugnPay, self).set('publisher-name', username)
+        self.set_static('publisher-name', username)
         if password: # optional gateway password
-            super(PlugnPay, self).set('publisher-password', password)
+            self.set_static('publisher-password', password, secret=True)
 
         if email: # publisher email to send alerts/notifiation to
-            super(PlugnPay, self).set('publisher-email', email)
+            self.set_static('publisher-email', email)
 
         # don't send transaction confirmation email to customer
         if dontsndmail:
-            super(PlugnPay, self).set('dontsndmail', 'yes')
+            self.set_static('dontsndmail', 'yes')
 
         if debug:
             self.debug = True
 
-        debug_string = " paython.gateways.plugnpay.__init__() -- You're in debug mode"
-        logger.debug(debug_string.center(80, '='))
+        log.banner(" paython.gateways.plugnpay.__init__() -- You're in debug mode")
 
+    @transactional
     def auth(self, amount, credit_card=None, billing_info=None, shipping_info=None):
         """
         Sends charge for authorization only based on amount
@@ -387,8 +391,7 @@ class PlugnPay(PostGateway):
 
         # validating or building up request
         if not credit_card:
-            debug_string = "paython.gateways.plugnpay.auth()  -- No CreditCard object present. You passed in %s " % (credit_card)
-            logger.debug(debug_string)
+            log.debug("paython.gateways.plugnpay.auth()  -- No CreditCard object present. You passed in %s ", credit_card)
 
             raise MissingDataError('You did not pass a CreditCard object into the auth method')
         else:
@@ -400,9 +403,9 @@ class PlugnPay(PostGateway):
         if shipping_info:
             super(PlugnPay, self).set_shipping_info(**shipping_info)
 
-        response, response_time = self.request()
-        return self.parse(response, response_time)
+        return self.process()
 
+    @transactional
     def reauth(self, amount, trans_id):
         """
         Used to settle a transaction at a lower dollar amount.
@@ -412,9 +415,9 @@ class PlugnPay(PostGateway):
         super(PlugnPay, self).set(self.REQUEST_FIELDS['trans_id'], trans_id)
         super(PlugnPay, self).set(self.REQUEST_FIELDS['amount'], amount)
 
-        response, response_time = self.request()
-        return self.parse(response, response_time)
+        return self.process()
 
+    @transactional
     def capture(self, amount, credit_card=None, billing_info=None, shipping_info=None):
         """
         Sends transaction for auth + capture (same day settlement) based on amount.
@@ -426,8 +429,7 @@ class PlugnPay(PostGateway):
 
         # validating or building up request
         if not credit_card:
-            debug_string = "paython.gateways.plugnpay.capture()  -- No CreditCard object present. You passed in %s " % (credit_card)
-            logger.debug(debug_string)
+            log.debug("paython.gateways.plugnpay.capture()  -- No CreditCard object present. You passed in %s ", credit_card)
 
             raise MissingDataError('You did not pass a CreditCard object into the auth method')
         else:
@@ -439,9 +441,9 @@ class PlugnPay(PostGateway):
         if shipping_info:
             super(PlugnPay, self).set_shipping_info(**shipping_info)
 
-        response, response_time = self.request()
-        return self.parse(response, response_time)
+        return self.process()
 
+    @transactional
     def settle(self, amount, trans_id):
         """
         Sends prior authorization to be settled based on amount & trans_id
@@ -451,9 +453,9 @@ class PlugnPay(PostGateway):
         super(PlugnPay, self).set(self.REQUEST_FIELDS['trans_id'], trans_id)
         super(PlugnPay, self).set(self.REQUEST_FIELDS['amount'], amount)
 
-        response, response_time = self.request()
-        return self.parse(response, response_time)
+        return self.process()
 
+    @transactional
     def void(self, amount, trans_id):
         """
         Sends a transaction to be voided
@@ -464,9 +466,9 @@ class PlugnPay(PostGateway):
         super(PlugnPay, self).set(self.REQUEST_FIELDS['amount'], amount)
         super(PlugnPay, self).set('txn-type', 'auth')
 
-        response, response_time = self.request()
-        return self.parse(response, response_time)
+        return self.process()
 
+    @transactional
     def return_transaction(self, amount, trans_id):
         """
         Return funds back to a prior authorization.
@@ -482,9 +484,9 @@ class PlugnPay(PostGateway):
         super(PlugnPay, self).set(self.REQUEST_FIELDS['amount'], amount)
         super(PlugnPay, self).set('txn-type', 'auth')
 
-        response, response_time = self.request()
-        return self.parse(response, response_time)
+        return self.process()
 
+    @transactional
     def return_credit(self, amount, trans_id):
         """
         Credits funds, using card info file from a previous transaction.
@@ -500,9 +502,9 @@ class PlugnPay(PostGateway):
         super(PlugnPay, self).set(self.REQUEST_FIELDS['trans_id'], trans_id)
         super(PlugnPay, self).set(self.REQUEST_FIELDS['amount'], amount)
 
-        response, response_time = self.request()
-        return self.parse(response, response_time)
+        return self.process()
 
+    @transactional
     def credit(self, amount, credit_card, trans_id=None):
         """
         Credits funds to card info provided
@@ -522,9 +524,9 @@ class PlugnPay(PostGateway):
 
         super(PlugnPay, self).use_credit_card(credit_card)
 
-        response, response_time = self.request()
-        return self.parse(response, response_time)
+        return self.process()
 
+    @transactional
     def query(self, trans_id):
         """
         Ability to query system for credit card transaction information
@@ -533,27 +535,30 @@ class PlugnPay(PostGateway):
         super(PlugnPay, self).set(self.REQUEST_FIELDS['trans_mode'], 'query_trans')
         super(PlugnPay, self).set(self.REQUEST_FIELDS['trans_id'], trans_id)
 
-        response, response_time = self.request()
-        return self.parse(response, response_time)
+        return self.process()
+
+    def request_uri(self):
+        """
+        there is only one endpoint
+        """
+        return self.API_URI
 
     def request(self):
         """
         Makes a request using lib.api.GetGateway.make_request() & move some debugging away from other methods.
         """
+        url = self.request_uri()
 
-        debug_string = " paython.gateways.plugnpay.request() -- Attempting request to: "
-        logger.debug(debug_string.center(80, '='))
-        debug_string = "\n %s with params: %s" % (self.API_URI, super(PlugnPay, self).params())
-        logger.debug(debug_string)
+        log.banner(" paython.gateways.plugnpay.request() -- Attempting request to: ")
+        log.debug("\n %s with params: %s", url, lazy(self.params))
 
         # make the request
         start = time.time() # timing it
-        response = super(PlugnPay, self).make_request(self.API_URI)
+        response = super(PlugnPay, self).make_request(url)
         end = time.time() # done timing it
         response_time = '%0.2f' % (end - start)
 
-        debug_string = " paython.gateways.plugnpay.request()  -- Request completed in %ss " % response_time
-        logger.debug(debug_string.center(80, '='))
+        log.banner(" paython.gateways.plugnpay.request()  -- Request completed in %ss ", response_time)
 
         return response, response_time
 
@@ -567,10 +572,8 @@ class PlugnPay(PostGateway):
         `resp-code-msg` : Gateway Response Code Message
         """
 
-        debug_string = " paython.gateways.plugnpay.parse() -- Raw response: "
-        logger.debug(debug_string.center(80, '='))
-        debug_string = "\n %s" % raw_response
-        logger.debug(debug_string)
+        log.banner(" paython.gateways.plugnpay.parse() -- Raw response: ")
+        log.debug("\n %s", masked(raw_response, self.raw_logging))
 
         #splitting up response into a list so we can map it to Paython generic response
         raw_response = raw_response.split(self.DELIMITER)
@@ -608,10 +611,8 @@ class PlugnPay(PostGateway):
         # Unapproved values have an accompanying MErrMsg field saying why
         approved = response['FinalStatus'] == 'success'
 
-        debug_string = " paython.gateways.plugnpay.parse() -- Response as list: "
-        logger.debug(debug_string.center(80, '='))
-        debug_string = '\n%s' % response
-        logger.debug(debug_string)
+        log.banner(" paython.gateways.plugnpay.parse() -- Response as list: ")
+        log.debug('\n%s', masked(response, self.raw_logging))
 
         return super(PlugnPay, self).standardize(response, self.RESPONSE_KEYS, response_time, approved)
 
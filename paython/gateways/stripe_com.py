@@ -1,15 +1,31 @@
 import time
 import logging
+import functools
+from decimal import Decimal, ROUND_HALF_UP
 
 try:
     import stripe
 except ImportError:
     raise Exception('Stripe library not found, please install requirements.txt')
 
+from paython.batch import BatchExecutor
+from paython.lib.aio import default_calls
+from paython.gateways.core import profiled
+
 logger = logging.getLogger(__name__)
 
+def cents(amount):
+    """
+    Dollar amount ('10.15', 10.15, Decimal('10.15')...) in whole cents, the way stripe likes it.
+    Goes through Decimal since int(float('0.29') * 100) is 28
+    """
+    return int((Decimal(str(amount)) * 100).quantize(Decimal(1), rounding=ROUND_HALF_UP))
+
 class Stripe(object):
-    """TODO needs docstring"""
+    """
+    Stripe charges & refunds. Every call carries the instance's own api key, so
+    instances for different accounts can be used side by side (threads included).
+    """
     VERSION = 'v1'
 
     RESPONSE_KEYS = {
@@ -22,20 +38,38 @@ class Stripe(object):
     test = False
     stripe_api = stripe
 
+    # profiles a sample of the operations when set, see paython.lib.profiling.Profiler
+    profiler = None
+
+    # worker threads the stripe library calls of the `*_async` methods run on
+    blocking_calls = default_calls
+
     def __init__(self, username=None, api_key=None, debug=False):
         """
         setting up object so we can run 2 different ways (live & debug)
 
         we have username and api_key because other gateways use "username"
         and we want to make it simple to change out gateways ;)
+
+        the key is passed along with each request instead of set on the stripe module,
+        where the last instance created would win for all of them
         """
-        self.stripe_api.api_key = username or api_key
+        self.api_key = username or api_key
 
         if debug:
             self.debug = True
         debug_string = " paython.gateways.stripe.__init__() -- You're in debug mode"
         logger.debug(debug_string.center(80, '='))
 
+    def __getattr__(self, name):
+        """
+        stripe.capture_async(...) & stripe.credit_async(...) return a paython.lib.aio.Future
+        right away, like the other gateways' `*_async` methods
+        """
+        if name.endswith('_async') and not name.startswith('_'):
+            return functools.partial(self.blocking_calls.submit, getattr(self, name[:-len('_async')]))
+        raise AttributeError(name)
+
     def auth(self, amount, credit_card=None, billing_info=None, shipping_info=None):
         """
         Not implemented because stripe does not support authorizations:
@@ -50,15 +84,17 @@ class Stripe(object):
         """
         raise NotImplementedError('Stripe does not support auth or settlement. Try capture().')
 
+    @profiled
     def capture(self, amount, credit_card=None, billing_info=None, shipping_info=None):
         debug_string = " paython.gateways.stripe.parse() -- Sending charge "
         logger.debug(debug_string.center(80, '='))
 
-        amount = int(float(amount)*100) # then change the amount to how stripe likes it
+        amount = cents(amount) # then change the amount to how stripe likes it
 
         start = time.time() # timing it
         try:
             response = self.stripe_api.Charge.create(
+                api_key=self.api_key,
                 amount=amount,
                 currency="usd",
                 card={
@@ -93,14 +129,16 @@ class Stripe(object):
         """
         raise NotImplementedError('Stripe does not support transaction voiding. Try credit().')
 
+    @profiled
     def credit(self, amount, trans_id):
         debug_string = " paython.gateways.stripe.parse() -- Sending credit "
         logger.debug(debug_string.center(80, '='))
 
-        amount = int(float(amount) * 100)
+        amount = cents(amount)
         start = time.time() # timing it
         try:
-            ch = self.stripe_api.Charge.retrieve(trans_id)
+            # refunding straight off the id, retrieving the charge first would cost another round trip
+            ch = self.stripe_api.Charge.construct_from({'id': trans_id}, self.api_key)
             response = ch.refund(amount=amount)
         except Exception, e:
             response = {'failure_message':'Unable to refund: %s' % e}
@@ -112,6 +150,14 @@ class Stripe(object):
 
         return self.parse(response, response_time)
 
+    def credit_many(self, refunds, workers=10):
+        """
+        Refunds lots of charges concurrently, `refunds` being (amount, trans_id) pairs
+        (a generator is fine). Yields a paython.batch.BatchResult per refund, in order.
+        """
+        executor = BatchExecutor(workers=workers, per_gateway=workers)
+        return executor.run((self, 'credit', refund) for refund in refunds)
+
     def parse(self, response, response_time):
         """
         turn the response into a dict and attach these things:
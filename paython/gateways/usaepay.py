@@ -1,11 +1,12 @@
 import time
 import urlparse
-import logging
 
 from paython.exceptions import MissingDataError
+from paython.gateways.core import transactional
 from paython.lib.api import PostGateway
+from paython.lib.log import DebugLog, lazy, masked
 
-logger = logging.getLogger(__name__)
+log = DebugLog(__name__)
 
 class USAePay(PostGateway):
     """ usaepay.com Payment Gatway Interface
@@ -93,7 +94,7 @@ class USAePay(PostGateway):
         # passing fields to bubble up to Base Class
         super(USAePay, self).__init__(translations=self.REQUEST_FIELDS, debug=debug)
 
-        self.set('UMkey', username)
+        self.set_static('UMkey', username, secret=True)
         #self.set('UM', password)
 
         self.API_URI = {
@@ -103,11 +104,7 @@ class USAePay(PostGateway):
 
         self.test = test
         if test:
-            debug_string = self._get_debug_str_base() + ".__init__() -- You're in test mode (& debug, obviously) "
-            logger.debug(debug_string.center(80, '='))
-
-    def _get_debug_str_base(self):
-        return ' ' + __name__ + '.' + self.__class__.__name__
+            log.banner(" %s.%s.__init__() -- You're in test mode (& debug, obviously) ", __name__, self.__class__.__name__)
 
     def charge_setup(self):
         """
@@ -116,9 +113,9 @@ class USAePay(PostGateway):
         #self.set('x_delim_data', 'TRUE')
         #self.set('x_delim_char', self.DELIMITER)
         #self.set('x_version', self.VERSION)
-        debug_string = self._get_debug_str_base() + '.charge_setup() Just set up for a charge '
-        logger.debug(debug_string.center(80, '='))
+        log.banner(' %s.%s.charge_setup() Just set up for a charge ', __name__, self.__class__.__name__)
 
+    @transactional
     def auth(self, amount, credit_card=None, billing_info=None, shipping_info=None):
         """
         Sends charge for authorization based on amount
@@ -132,8 +129,7 @@ class USAePay(PostGateway):
 
         # validating or building up request
         if not credit_card:
-            debug_string = self._get_debug_str_base() + '.auth()  -- No CreditCard object present. You passed in %s ' % (credit_card)
-            logger.debug(debug_string)
+            log.debug(' %s.%s.auth()  -- No CreditCard object present. You passed in %s ', __name__, self.__class__.__name__, credit_card)
 
             raise MissingDataError('You did not pass a CreditCard object into the auth method')
         else:
@@ -146,9 +142,9 @@ class USAePay(PostGateway):
             self.set_shipping_info(**shipping_info)
 
         # send transaction to gateway!
-        response, response_time = self.request()
-        return self.parse(response, response_time)
+        return self.process()
 
+    @transactional
     def settle(self, amount, trans_id):
         """
         Sends prior authorization to be settled based on amount & trans_id
@@ -162,9 +158,9 @@ class USAePay(PostGateway):
         self.set(self.REQUEST_FIELDS['trans_id'], trans_id)
 
         # send transaction to gateway!
-        response, response_time = self.request()
-        return self.parse(response, response_time)
+        return self.process()
 
+    @transactional
     def adjust(self, amount, trans_id):
         """
         Adjust an existing (unsettled) sale.  Adjust the amount up or down, etc.
@@ -178,9 +174,9 @@ class USAePay(PostGateway):
         self.set(self.REQUEST_FIELDS['trans_id'], trans_id)
 
         # send transaction to gateway!
-        response, response_time = self.request()
-        return self.parse(response, response_time)
+        return self.process()
 
+    @transactional
     def capture(self, amount, credit_card=None, billing_info=None, shipping_info=None):
         """
         Sends transaction for capture (same day settlement) based on amount.
@@ -194,8 +190,7 @@ class USAePay(PostGateway):
 
         # validating or building up request
         if not credit_card:
-            debug_string = self._get_debug_str_base() + 'capture()  -- No CreditCard object present. You passed in ' + str(credit_card)
-            logger.debug(debug_string)
+            log.debug(' %s.%s.capture()  -- No CreditCard object present. You passed in %s ', __name__, self.__class__.__name__, credit_card)
 
             raise MissingDataError('You did not pass a CreditCard object into the auth method')
         else:
@@ -208,9 +203,9 @@ class USAePay(PostGateway):
             self.set_shipping_info(**shipping_info)
 
         # send transaction to gateway
-        response, response_time = self.request()
-        return self.parse(response, response_time)
+        return self.process()
 
+    @transactional
     def void(self, trans_id):
         """
         Sends a transaction to be voided (in full)
@@ -223,9 +218,9 @@ class USAePay(PostGateway):
         self.set(self.REQUEST_FIELDS['trans_id'], trans_id)
 
         # send transaction to gateway
-        response, response_time = self.request()
-        return self.parse(response, response_time)
+        return self.process()
 
+    @transactional
     def credit(self, amount, trans_id, credit_card):
         """
         Sends a transaction to be refunded (partially or fully)
@@ -242,9 +237,9 @@ class USAePay(PostGateway):
             self.set(self.REQUEST_FIELDS['amount'], amount)
 
         # send transaction to gateway
-        response, response_time = self.request()
-        return self.parse(response, response_time)
+        return self.process()
 
+    @transactional
     def open_credit(self, amount, credit_card):
         """
         Refund money to a credit card, not linked to a previous transaction
@@ -260,19 +255,22 @@ class USAePay(PostGateway):
             self.set(self.REQUEST_FIELDS['amount'], amount)
 
         # send transaction to gateway
-        response, response_time = self.request()
-        return self.parse(response, response_time)
+        return self.process()
+
+    def request_uri(self):
+        """
+        decide which url to use (test|live)
+        """
+        return self.API_URI[self.test]
 
     def request(self):
         """
         Makes a request using lib.api.GetGateway.make_request() & move some debugging away from other methods.
         """
-        # decide which url to use (test|live)
-        url = self.API_URI[self.test]
+        url = self.request_uri()
 
-        debug_string = self._get_debug_str_base() + '.request() -- Attempting request to: '
-        logger.debug(debug_string.center(80, '='))
-        logger.debug("\n %s with params: %s" % (url, self.params()))
+        log.banner(' %s.%s.request() -- Attempting request to: ', __name__, self.__class__.__name__)
+        log.debug("\n %s with params: %s", url, lazy(self.params))
 
         # make the request
         start = time.time() # timing it
@@ -280,8 +278,7 @@ class USAePay(PostGateway):
         end = time.time() # done timing it
         response_time = '%0.2f' % (end-start)
 
-        debug_string = self._get_debug_str_base() + '.request()  -- Request completed in ' + response_time + 's '
-        logger.debug(debug_string.center(80, '='))
+        log.banner(' %s.%s.request()  -- Request completed in %ss ', __name__, self.__class__.__name__, response_time)
 
         return response, response_time
 
@@ -289,17 +286,15 @@ class USAePay(PostGateway):
         """
         On Specific Gateway due differences in response from gateway
         """
-        debug_string = self._get_debug_str_base() + '.parse() -- Raw response: '
-        logger.debug(debug_string.center(80, '='))
-        logger.debug('\n ' + str(response))
+        log.banner(' %s.%s.parse() -- Raw response: ', __name__, self.__class__.__name__)
+        log.debug('\n %s', masked(response, self.raw_logging))
 
         #splitting up response into a list so we can map it to Paython generic response
         new_response = urlparse.parse_qsl(response)
         response = dict(new_response)
         approved = (response['UMresult'] == 'A')
 
-        debug_string = self._get_debug_str_base() + '.parse() -- Response as list: '
-        logger.debug(debug_string.center(80, '='))
-        logger.debug('\n' + str(response))
+        log.banner(' %s.%s.parse() -- Response as list: ', __name__, self.__class__.__name__)
+        log.debug('\n%s', masked(response, self.raw_logging))
 
         return self.standardize(response, self.RESPONSE_KEYS, response_time, approved)
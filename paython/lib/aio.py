@@ -0,0 +1,445 @@
+"""aio.py - non-blocking HTTP(S) transport, many gateway calls in flight on one thread"""
+
+import ssl
+import sys
+import time
+import Queue
+import errno
+import socket
+import select
+import httplib
+import threading
+import urlparse
+
+from StringIO import StringIO
+
+from paython.exceptions import GatewayError
+from paython.lib.timing import monotonic
+from paython.lib.transport import DEFAULT_PORTS, Response, ssl_context
+
+_WOULD_BLOCK = (errno.EAGAIN, errno.EWOULDBLOCK, errno.EINPROGRESS)
+
+class Future(object):
+    """
+    Result of a call handed to the `AsyncTransport` (or `BlockingCalls`). Calling `result()`
+    keeps the transport running until this call is done, so other calls progress meanwhile.
+    """
+    def __init__(self, transport):
+        self._transport = transport
+        self._done = False
+        self._result = None
+        self._exception = None
+        self._callbacks = []
+
+    def done(self):
+        return self._done
+
+    def result(self, timeout=None):
+        """
+        Returns the parsed gateway response, raising whatever the call raised
+        """
+        self._transport.run([self], timeout)
+        if not self._done:
+            raise GatewayError('Timed out waiting on the gateway')
+        if self._exception:
+            raise self._exception
+        return self._result
+
+    def exception(self, timeout=None):
+        self._transport.run([self], timeout)
+        return self._exception
+
+    def add_done_callback(self, fn):
+        """
+        Calls `fn(future)` once the call is done (right away if it already is)
+        """
+        if self._done:
+            fn(self)
+        else:
+            self._callbacks.append(fn)
+
+    def set_result(self, result):
+        self._result = result
+        self._finish()
+
+    def set_exception(self, exception):
+        self._exception = exception
+        self._finish()
+
+    def _finish(self):
+        self._done = True
+        callbacks, self._callbacks = self._callbacks, []
+        for fn in callbacks:
+            fn(self)
+
+class _FakeSocket(object):
+    """
+    Lets httplib.HTTPResponse parse a response we already read off the wire
+    """
+    def __init__(self, data):
+        self._data = data
+
+    def makefile(self, *args, **kwargs):
+        return StringIO(self._data)
+
+class _Exchange(object):
+    """
+    One request/response over its own non-blocking socket:
+    connect -> (TLS handshake) -> send -> read until the server closes
+    """
+    def __init__(self, prepared, future, then, timeout):
+        self.prepared = prepared
+        self.future = future
+        self.then = then
+        self.start = time.time()
+        self.deadline = self.start + timeout
+        self.want = 'write'
+        self.chunks = []
+
+        parsed = urlparse.urlparse(prepared.url)
+        self.scheme = parsed.scheme
+        self.host = parsed.hostname
+        self.port = parsed.port or DEFAULT_PORTS[parsed.scheme]
+        path = parsed.path or '/'
+        if parsed.query:
+            path = '%s?%s' % (path, parsed.query)
+
+        headers = {'Host': parsed.netloc, 'Accept-Encoding': 'identity'}
+        headers.update(prepared.headers)
+        headers['Content-Length'] = str(len(prepared.body or ''))
+        headers['Connection'] = 'close'
+
+        lines = ['%s %s HTTP/1.1' % (prepared.method, path)]
+        lines.extend('%s: %s' % (key, value) for key, value in headers.items())
+        self.outgoing = '\r\n'.join(lines) + '\r\n\r\n' + (prepared.body or '')
+
+        self.timing = {'tls': 0.0}
+        self.mark = monotonic()
+        family, socktype, proto, canonname, address = socket.getaddrinfo(self.host, self.port, 0, socket.SOCK_STREAM)[0]
+        self.lap('dns')
+        self.sock = socket.socket(family, socktype, proto)
+        self.sock.setblocking(0)
+        err = self.sock.connect_ex(address)
+        if err and err not in _WOULD_BLOCK:
+            raise socket.error(err, errno.errorcode.get(err, 'connect failed'))
+        self.state = 'connect'
+
+    def fileno(self):
+        return self.sock.fileno()
+
+    def lap(self, phase):
+        """
+        Notes the seconds since the last lap as `phase` (waiting on other exchanges included)
+        """
+        now = monotonic()
+        self.timing[phase], self.mark = now - self.mark, now
+
+    def step(self):
+        """
+        Moves the exchange along as far as it goes without blocking.
+        Returns True once the whole response is in.
+        """
+        if self.state == 'connect':
+            err = self.sock.getsockopt(socket.SOL_SOCKET, socket.SO_ERROR)
+            if err:
+                raise socket.error(err, errno.errorcode.get(err, 'connect failed'))
+            self.lap('connect')
+            if self.scheme == 'https':
+                self.sock = self.wrap(self.sock)
+                self.state = 'handshake'
+            else:
+                self.state = 'send'
+
+        if self.state == 'handshake':
+            if not self.ssl_call(self.sock.do_handshake):
+                return False
+            self.lap('tls')
+            self.state = 'send'
+
+        if self.state == 'send':
+            while self.outgoing:
+                sent = self.ssl_call(self.sock.send, self.outgoing)
+                if sent is None:
+                    return False
+                self.outgoing = self.outgoing[sent:]
+            self.lap('write')
+            self.state = 'recv'
+            self.want = 'read'
+
+        while True:
+            data = self.ssl_call(self.sock.recv, 65536)
+            if data is None:
+                return False
+            if not data:
+                self.lap('read')
+                return True
+            if not self.chunks:
+                self.lap('ttfb')
+            self.chunks.append(data)
+
+    def wrap(self, sock):
+        """
+        Starts TLS on the connected socket (the handshake runs in `step`)
+        """
+        prepared = self.prepared
+        if hasattr(ssl, 'SSLContext'):
+            context = ssl_context(prepared.key_file, prepared.cert_file, prepared.verify)
+            return context.wrap_socket(sock, server_hostname=self.host, do_handshake_on_connect=False)
+        return ssl.wrap_socket(sock, prepared.key_file, prepared.cert_file, do_handshake_on_connect=False)
+
+    def ssl_call(self, fn, *args):
+        """
+        Calls a socket method, returning None (and noting what to wait on) when it would block
+        """
+        try:
+            result = fn(*args)
+        except ssl.SSLError as e:
+            if e.args[0] == ssl.SSL_ERROR_WANT_READ:
+                self.want = 'read'
+            elif e.args[0] == ssl.SSL_ERROR_WANT_WRITE:
+                self.want = 'write'
+            elif self.state == 'recv' and self.chunks:
+                # plenty of servers drop the connection without a TLS close_notify, if the
+                # response came in short httplib raises when parsing it
+                return ''
+            else:
+                raise
+            return None
+        except socket.error as e:
+            if e.args[0] not in _WOULD_BLOCK:
+                raise
+            self.want = 'write' if self.state in ('connect', 'send') else 'read'
+            return None
+        return True if result is None else result
+
+    def response(self):
+        """
+        Parses what came back into a `Response`
+        """
+        raw = httplib.HTTPResponse(_FakeSocket(''.join(self.chunks)), method=self.prepared.method)
+        raw.begin()
+        body = raw.read()
+        return Response(raw.status, raw.reason, dict(raw.getheaders()), body, time.time() - self.start, self.timing)
+
+    def close(self):
+        try:
+            self.sock.close()
+        except socket.error:
+            pass
+
+class AsyncTransport(object):
+    """
+    select() driven HTTP(S) client. `submit` never blocks on the network (only on DNS),
+    so one thread can keep hundreds of gateway calls in flight; calling `run` or
+    `Future.result` drives them all.
+
+    A transport can be shared by threads, but only one of them drives it at a time &
+    the others wait their turn. `default_transport` gives every thread its own instead.
+    """
+    def __init__(self, timeout=20):
+        self.timeout = timeout
+        self._exchanges = []
+        # reentrant, `then` callbacks run while polling & may submit more calls
+        self._lock = threading.RLock()
+
+    def submit(self, prepared, then=None):
+        """
+        Starts sending a `PreparedRequest`. The returned `Future` resolves to the `Response`,
+        or to `then(response)` when given (that's where gateways parse).
+        """
+        future = Future(self)
+        try:
+            exchange = _Exchange(prepared, future, then, self.timeout)
+        except (socket.error, ssl.SSLError):
+            future.set_exception(GatewayError('Error making request to gateway'))
+        else:
+            with self._lock:
+                self._exchanges.append(exchange)
+        return future
+
+    def pending(self):
+        """
+        Number of calls still in flight
+        """
+        return len(self._exchanges)
+
+    def poll(self, timeout=None):
+        """
+        Waits up to `timeout` seconds for any socket to be ready & moves those calls along
+        """
+        with self._lock:
+            self._poll(timeout)
+
+    def _poll(self, timeout):
+        if not self._exchanges:
+            return
+
+        now = time.time()
+        wait = min(exchange.deadline for exchange in self._exchanges) - now
+        if timeout is not None:
+            wait = min(wait, timeout)
+
+        readers = [exchange for exchange in self._exchanges if exchange.want == 'read']
+        writers = [exchange for exchange in self._exchanges if exchange.want == 'write']
+        try:
+            readable, writable, failed = select.select(readers, writers, [], max(wait, 0))
+        except select.error as e:
+            if e.args[0] == errno.EINTR:
+                return
+            raise
+
+        for exchange in set(readable + writable):
+            self._step(exchange)
+
+        now = time.time()
+        for exchange in list(self._exchanges):
+            if exchange.deadline <= now:
+                self._finish(exchange, error=GatewayError('Timed out making request to gateway'))
+
+    def run(self, futures=None, timeout=None):
+        """
+        Runs until the given futures (or all calls in flight) are done, or `timeout` passes
+        """
+        deadline = time.time() + timeout if timeout is not None else None
+        while True:
+            with self._lock:
+                # another thread may have finished them while this one waited for the lock
+                if not self._exchanges or futures is not None and all(future.done() for future in futures):
+                    return
+                remaining = None
+                if deadline is not None:
+                    remaining = deadline - time.time()
+                    if remaining <= 0:
+                        return
+                self._poll(remaining)
+
+    def _step(self, exchange):
+        try:
+            finished = exchange.step()
+        except (socket.error, ssl.SSLError):
+            self._finish(exchange, error=GatewayError('Error making request to gateway'))
+        else:
+            if finished:
+                self._finish(exchange)
+
+    def _finish(self, exchange, error=None):
+        self._exchanges.remove(exchange)
+        exchange.close()
+        if error:
+            exchange.future.set_exception(error)
+            return
+
+        try:
+            result = exchange.response()
+        except httplib.HTTPException:
+            exchange.future.set_exception(GatewayError('Error reading gateway response'))
+            return
+
+        try:
+            if exchange.then:
+                result = exchange.then(result)
+        except Exception as e:
+            exchange.future.set_exception(e)
+        else:
+            exchange.future.set_result(result)
+
+class ThreadTransports(object):
+    """
+    Same interface as `AsyncTransport`, handing every thread an AsyncTransport of its own
+    so threads never wait on each other's calls. A `Future` stays with the transport of
+    the thread that made the call.
+    """
+    def __init__(self, timeout=20):
+        self.timeout = timeout
+        self._local = threading.local()
+
+    def transport(self):
+        """
+        The calling thread's AsyncTransport
+        """
+        transport = getattr(self._local, 'transport', None)
+        if transport is None:
+            transport = self._local.transport = AsyncTransport(self.timeout)
+        return transport
+
+    def submit(self, prepared, then=None):
+        return self.transport().submit(prepared, then)
+
+    def pending(self):
+        return self.transport().pending()
+
+    def poll(self, timeout=None):
+        return self.transport().poll(timeout)
+
+    def run(self, futures=None, timeout=None):
+        return self.transport().run(futures, timeout)
+
+class BlockingCalls(object):
+    """
+    Runs blocking calls on a pool of worker threads & hands back the same `Future` the
+    AsyncTransport does, for gateways whose SDK does the networking itself (Stripe, Samurai).
+    The workers start with the first call. Safe to share between threads.
+
+    - workers: number of worker threads
+    """
+    def __init__(self, workers=10):
+        self.workers = workers
+        self._tasks = Queue.Queue()
+        self._done = threading.Condition()
+        self._pending = 0
+        self._threads = []
+
+    def submit(self, fn, *args, **kwargs):
+        """
+        Starts `fn(*args, **kwargs)` on a worker, the returned `Future` resolves to what it returns
+        """
+        future = Future(self)
+        with self._done:
+            self._pending += 1
+            if len(self._threads) < min(self.workers, self._pending):
+                thread = threading.Thread(target=self._work)
+                thread.daemon = True
+                thread.start()
+                self._threads.append(thread)
+        self._tasks.put((future, fn, args, kwargs))
+        return future
+
+    def pending(self):
+        """
+        Number of calls not done yet
+        """
+        with self._done:
+            return self._pending
+
+    def _work(self):
+        while True:
+            future, fn, args, kwargs = self._tasks.get()
+            try:
+                result = fn(*args, **kwargs)
+            except Exception:
+                future.set_exception(sys.exc_info()[1])
+            else:
+                future.set_result(result)
+            with self._done:
+                self._pending -= 1
+                self._done.notify_all()
+
+    def run(self, futures=None, timeout=None):
+        """
+        Waits until the given futures (or all calls) are done, or `timeout` passes
+        """
+        deadline = time.time() + timeout if timeout is not None else None
+        with self._done:
+            while self._pending and not (futures is not None and all(future.done() for future in futures)):
+                remaining = None
+                if deadline is not None:
+                    remaining = deadline - time.time()
+                    if remaining <= 0:
+                        return
+                self._done.wait(remaining)
+
+# shared by every gateway unless they get their own, one AsyncTransport per thread
+default_transport = ThreadTransports()
+
+# runs the `*_async` calls of gateways that can't prepare requests
+default_calls = BlockingCalls()
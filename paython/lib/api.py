@@ -1,25 +1,36 @@
+import re
+import socket
 import httplib
 import urllib
+import urlparse
 import xml.dom.minidom
 
-from utils import parse_xml
+from log import mask_cards, mask_value
+from timing import monotonic
+from utils import parse_xml, parse_xml_response
+from transport import PreparedRequest, default_pool
 from paython.gateways.core import Gateway
 from paython.exceptions import RequestError, GatewayError, DataValidationError
 
-class XMLGateway(Gateway):
-    def __init__(self, host, translations, debug=False, special_params={}):
-        """ initalize API call session
+class XMLRequest(object):
+    """
+    The XML document a single XMLGateway transaction gets built into
+    """
+    def __init__(self, static_fields=()):
+        self.doc = xml.dom.minidom.Document()
+        self.nodes = {} # path ("order/billing") -> first element created there
+        for path, child, attribute in static_fields:
+            self.set(path, child, attribute)
 
-        host: hostname (apigateway.tld)
-        auth: accept a tuple with (username,password)
-        debug: True/False
+    def close(self):
         """
-        self.doc = xml.dom.minidom.Document()
-        self.api_host = host
-        self.debug = debug
-        self.parse_xml = parse_xml
-        self.special_ssl = special_params
-        super(XMLGateway, self).__init__(set_method=self.set, translations=translations, debug=debug)
+        Frees the document right away (minidom nodes reference each other, so
+        otherwise they wait on the garbage collector)
+        """
+        if self.doc is not None:
+            self.doc.unlink()
+            self.doc = None
+            self.nodes.clear()
 
     def set(self, path, child=False, attribute=False):
         """ Accepts a forward slash seperated path of XML elements to traverse and create if non existent.
@@ -37,17 +48,21 @@ class XMLGateway(Gateway):
             return # because if it's None, then don't worry
 
         xml_doc = self.doc
+        last = len(xml_path) - 1
+        element_path = None
 
         # traverse full XML element path string `path`
-        for element_name in xml_path:
-            # get existing XML element by `element_name`
-            element = self.doc.getElementsByTagName(element_name)
-            if element: element = element[0]
+        for i, element_name in enumerate(xml_path):
+            element_path = element_name if element_path is None else '%s/%s' % (element_path, element_name)
+
+            # get existing XML element at `element_path`, the target element is always created
+            element = self.nodes.get(element_path) if i < last else None
 
             # create element if non existing or target element
-            if not element or element_name == xml_path[-1:][0]:
+            if element is None:
                 element = self.doc.createElement(element_name)
                 xml_doc.appendChild(element)
+                self.nodes.setdefault(element_path, element)
 
             xml_doc = element
 
@@ -83,85 +98,280 @@ class XMLGateway(Gateway):
                 attribute = attribute.split(':')
                 xml_doc.setAttribute(attribute[0], attribute[1])
 
+class XMLGateway(Gateway):
+    # persistent client certificate connections, see paython.lib.transport.ConnectionPool
+    pool = default_pool
+
+    def __init__(self, host, translations, debug=False, special_params={}):
+        """ initalize API call session
+
+        host: hostname (apigateway.tld)
+        auth: accept a tuple with (username,password)
+        debug: True/False
+        """
+        self.static_fields = []
+        self.api_host = host
+        self.debug = debug
+        self.parse_xml = parse_xml
+        self.special_ssl = special_params
+        super(XMLGateway, self).__init__(set_method=self.set, translations=translations, debug=debug)
+
+    def set_static(self, path, child=False, attribute=False):
+        """
+        Like 'set' but for config (credentials, store numbers...) that goes into every request
+        """
+        self.static_fields.append((path, child, attribute))
+
+    def new_request(self):
+        return XMLRequest(self.static_fields)
+
+    def set(self, path, child=False, attribute=False):
+        """
+        Adds to the XML request of the transaction being built, see XMLRequest.set
+        """
+        with self.span('build.set', path=path):
+            self.current_request().set(path, child, attribute)
+
     def request_xml(self):
         """
         Stringifies request xml for debugging
         """
-        return self.doc.toprettyxml()
+        return self.current_request().doc.toprettyxml()
 
-    def make_request(self, api_uri):
-        """ 
-        Submits the API request as XML formated string via HTTP POST and parse gateway response.
-        This needs to be run after adding some data via 'set'
+    def logged_xml(self):
+        """
+        request_xml() as it should be logged, with the card number & cvv
+        starred out unless raw_logging is on
         """
-        request_body = self.doc.toxml('utf-8')
+        xml = self.request_xml()
+        if self.raw_logging:
+            return xml
+        return self.mask_xml(xml)
 
-        # checking to see if we have any special params
-        if self.special_ssl:
-            kwargs = self.special_ssl
-            api = httplib.HTTPSConnection(self.api_host, **kwargs)
-        else:
-            api = httplib.HTTPSConnection(self.api_host)
+    def mask_xml(self, xml):
+        """
+        Stars out the card number (but its last 4 digits) & cvv elements of `xml`
+        """
+        for key, keep in (('number', 4), ('verification_value', 0)):
+            path = self.REQUEST_FIELDS.get(key)
+            if path:
+                tag = re.escape(path.rsplit('/', 1)[-1])
+                xml = re.sub(r'(<%s>\s*)([^<\s]*)' % tag, lambda match: match.group(1) + mask_value(match.group(2), keep), xml)
+        return xml
+
+    def recorded_body(self, prepared):
+        """
+        The XML sent with the card number & cvv elements starred out
+        """
+        return mask_cards(self.mask_xml(prepared.body))
 
-        api.connect()
-        api.putrequest('POST', api_uri, skip_host=True)
-        api.putheader('Host', self.api_host)
-        api.putheader('Content-type', 'text/xml; charset="utf-8"')
-        api.putheader("Content-length", str(len(request_body)))
-        api.putheader('User-Agent', 'yourdomain.net')
-        api.endheaders()
-        api.send(request_body)
+    def prepare_request(self, api_uri):
+        """
+        Builds the XML request (added via 'set') to POST to `api_uri`
+        """
+        request_body = self.current_request().doc.toxml('utf-8')
 
-        resp = api.getresponse()
-        resp_data = resp.read()
+        # checking to see if we have any special params
+        ssl_params = dict(self.special_ssl)
+        port = ssl_params.pop('port', None)
+        url = 'https://%s%s%s' % (self.api_host, ':%s' % port if port else '', api_uri)
+
+        headers = {
+            'Host': self.api_host,
+            'Content-type': 'text/xml; charset="utf-8"',
+            'User-Agent': 'yourdomain.net',
+        }
+        return PreparedRequest('POST', url, request_body, headers, **ssl_params)
+
+    def read_response(self, resp):
+        """
+        Checks the gateway response status & parses the XML into a dict
+        """
+        self.record_timing(resp.timing)
+        resp_data = resp.body
 
         # parse API call response
         if not resp.status == 200:
             raise RequestError('Gateway returned %i status' % resp.status)
 
-        # parse XML response and return as dict
-        try:
-            resp_dict = self.parse_xml(resp_data)
-        except:
+        # parse XML response and return as dict, responses without a single root get wrapped in <response>
+        start = monotonic()
+        with self.span('parse.xml', bytes_received=len(resp_data)):
             try:
-                resp_dict = self.parse_xml('<?xml version="1.0"?><response>%s</response>' % resp_data)
+                resp_dict = parse_xml_response(resp_data)
             except:
                 raise RequestError('Could not parse XML into JSON')
+        self.add_timing('parse', monotonic() - start)
 
         return resp_dict
 
+    def make_request(self, api_uri):
+        """ 
+        Submits the API request as XML formated string via HTTP POST and parse gateway response.
+        This needs to be run after adding some data via 'set', the XML document is freed once sent.
+
+        Goes over a persistent connection kept per host & client certificate pair, so
+        the PEM files are only loaded once and the TLS handshake only runs on reconnect.
+        """
+        prepared = self.traced_prepare(api_uri)
+        self.current_request().close()
+        response = self.traced_send(prepared)
+        self.record_exchange(prepared, response)
+        return self.read_response(response)
+
+    def send(self, prepared):
+        """
+        Sends a prepared request over the connection pool
+        """
+        return self.pool.send(prepared)
+
 class SOAPGateway(object):
     pass
 
-class GetGateway(Gateway):
-    REQUEST_DICT = {}
+class FieldRequest(object):
+    """
+    The fields a single GetGateway/PostGateway transaction gets built into.
+
+    Only the per transaction fields are kept here, the gateway's static fields
+    come already encoded as `static_body` and are put in front of them.
+    """
+    def __init__(self, static_fields=None, static_body=''):
+        self.static_fields = static_fields or {}
+        self.static_body = static_body
+        self.fields = {}
+        self.removed = set() # static fields unset for this transaction
+
+    def set(self, key, value):
+        self.fields[key] = value
+        self.removed.discard(key)
+
+    def unset(self, key):
+        if key in self.fields:
+            del self.fields[key]
+            if key in self.static_fields:
+                self.removed.add(key)
+        elif key in self.static_fields and key not in self.removed:
+            self.removed.add(key)
+        else:
+            raise DataValidationError('The key being unset is non-existent in the request dictionary.')
+
+    def all_fields(self):
+        """
+        Every field that gets sent, static ones included
+        """
+        fields = dict(self.static_fields)
+        for key in self.removed:
+            del fields[key]
+        fields.update(self.fields)
+        return fields
+
+    def encode(self):
+        """
+        Form encodes the request, only the per transaction fields get encoded
+        unless one of them overrides (or unsets) a static field
+        """
+        static_fields = self.static_fields
+        if self.removed or any(key in static_fields for key in self.fields):
+            return urllib.urlencode(self.all_fields())
+
+        body = urllib.urlencode(self.fields)
+        if self.static_body and body:
+            return '%s&%s' % (self.static_body, body)
+        return self.static_body or body
+
+    def redacted(self, secrets):
+        """
+        all_fields() with the values of `secrets` (field -> characters left showing) starred out
+        """
+        fields = self.all_fields()
+        for key, keep in secrets.items():
+            if key in fields and fields[key]:
+                fields[key] = mask_value(fields[key], keep)
+        return fields
+
+class FieldGateway(Gateway):
+    """
+    Base of the gateways sending flat key=value fields (GetGateway & PostGateway):
+    static fields, the per transaction FieldRequest & what gets starred out when logged
+    """
     debug = False
 
     def __init__(self, translations, debug):
-        """core GETgateway class"""
-        super(GetGateway, self).__init__(set_method=self.set, translations=translations, debug=debug)
+        super(FieldGateway, self).__init__(set_method=self.set, translations=translations, debug=debug)
         self.debug = debug
+        self.static_fields = {}
+        self.static_secrets = set()
+        self._static_body = None
+
+    @property
+    def REQUEST_DICT(self):
+        """
+        fields of the transaction being built, static ones included
+        """
+        return self.current_request().all_fields()
+
+    def set_static(self, key, value, secret=False):
+        """
+        Sets config (credentials, test flags...) sent along with every request,
+        `secret` ones (passwords, keys) are starred out when logged
+        """
+        self.static_fields[key] = value
+        if secret:
+            self.static_secrets.add(key)
+        self._static_body = None
+
+    def static_body(self):
+        """
+        The static fields form encoded, worked out once & cached until the next set_static
+        """
+        if self._static_body is None:
+            self._static_body = urllib.urlencode(self.static_fields)
+        return self._static_body
+
+    def new_request(self):
+        return FieldRequest(self.static_fields, self.static_body())
+
+    def logged_fields(self):
+        """
+        fields of the transaction being built as they should be logged, with
+        the card number, cvv & secret static fields starred out unless raw_logging is on
+        """
+        request = self.current_request()
+        if self.raw_logging:
+            return request.all_fields()
+        return request.redacted(self.redacted_fields())
+
+    def redacted_fields(self):
+        """
+        Fields starred out when logged or recorded -> characters left showing: the card number
+        (its last 4 digits), the cvv & the secret static fields
+        """
+        secrets = dict.fromkeys(self.static_secrets, 0)
+        for key, keep in (('number', 4), ('verification_value', 0)):
+            if self.REQUEST_FIELDS.get(key):
+                secrets[self.REQUEST_FIELDS[key]] = keep
+        return secrets
 
     def set(self, key, value):
         """
-        Setups request dict for Get
+        Sets a field on the transaction being built
         """
-        self.REQUEST_DICT[key] = value
+        self.current_request().set(key, value)
 
     def unset(self, key):
         """
-        Sets up request dict for Get
+        Removes a field from the transaction being built
         """
-        try:
-            del self.REQUEST_DICT[key]
-        except KeyError:
-            raise DataValidationError('The key being unset is non-existent in the request dictionary.')
+        self.current_request().unset(key)
+
+class GetGateway(FieldGateway):
+    """core GETgateway class"""
 
     def query_string(self):
         """
         Build the query string to use later (in get)
         """
-        request_query = '?%s' % urllib.urlencode(self.REQUEST_DICT)
+        request_query = '?%s' % self.current_request().encode()
         return request_query
 
     def make_request(self, uri):
@@ -170,39 +380,75 @@ class GetGateway(Gateway):
         """
         try:
             params = self.query_string()
-            request = urllib.urlopen('%s%s' % (uri, params))
-
-            return request.read()
+            with self.span('network') as span:
+                start = monotonic()
+                request = urllib.urlopen('%s%s' % (uri, params))
+                opened = monotonic()
+                body = request.read()
+                span.set('status', request.getcode())
+                span.set('bytes_received', len(body))
+
+            # urllib connects, sends & waits on the headers in one go
+            self.record_timing({'ttfb': opened - start, 'read': monotonic() - opened})
+            return body
         except:
             raise GatewayError('Error making request to gateway')
 
-class PostGateway(Gateway):
-    REQUEST_DICT = {}
-    debug = False
+class PostGateway(FieldGateway):
+    """core POSTgateway class"""
+    HEADERS = {'Content-Type': 'application/x-www-form-urlencoded'}
 
-    def __init__(self, translations, debug):
-        """core POSTgateway class"""
-        super(PostGateway, self).__init__(set_method=self.set, translations=translations, debug=debug)
-        self.debug = debug
+    # keep-alive connections shared by every PostGateway, swap in your own
+    # paython.lib.transport.ConnectionPool to change the pool size or idle timeout
+    pool = default_pool
 
-    def set(self, key, value):
+    def recorded_body(self, prepared):
         """
-        Setups request dict for Post
+        The form body sent, in the order sent, with the redacted_fields starred out
         """
-        self.REQUEST_DICT[key] = value
+        secrets = self.redacted_fields()
+        pairs = []
+        for key, value in urlparse.parse_qsl(prepared.body or '', keep_blank_values=True):
+            if value and key in secrets:
+                value = mask_value(value, secrets[key])
+            pairs.append((key, value))
+        return mask_cards(urllib.urlencode(pairs).replace('%2A', '*'))
 
     def params(self):
         """
-        returns arguments that are going to be sent to the POST (here for debugging)
+        returns arguments that are going to be sent to the POST (here for debugging),
+        redacted unless raw_logging is on
         """
-        return urllib.urlencode(self.REQUEST_DICT)
+        return urllib.urlencode(self.logged_fields()).replace('%2A', '*') # keep the stars readable
 
-    def make_request(self, uri):
+    def prepare_request(self, uri):
+        """
+        Builds the POST of params (self.REQUEST_DICT) to `uri`, the static
+        fields are sent as the already encoded prefix
+        """
+        return PreparedRequest('POST', uri, self.current_request().encode(), self.HEADERS)
+
+    def read_response(self, response):
+        """
+        Gateways parse the raw response body themselves
         """
-        POSTs to url with params (self.REQUEST_DICT) - simple enough... string uri, dict params
+        self.record_timing(response.timing)
+        return response.body
+
+    def send(self, prepared):
+        """
+        Sends a prepared request over the connection pool
         """
         try:
-            request = urllib.urlopen(uri, self.params())
-            return request.read()
-        except:
+            return self.pool.send(prepared)
+        except (socket.error, httplib.HTTPException):
             raise GatewayError('Error making request to gateway')
+
+    def make_request(self, uri):
+        """
+        POSTs to url with params (self.REQUEST_DICT) over a pooled keep-alive connection
+        """
+        prepared = self.traced_prepare(uri)
+        response = self.traced_send(prepared)
+        self.record_exchange(prepared, response)
+        return self.read_response(response)
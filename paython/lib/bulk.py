@@ -0,0 +1,139 @@
+"""bulk.py - validating whole card files at once with NumPy"""
+
+from datetime import datetime
+
+try:
+    import numpy
+except ImportError:
+    raise Exception('NumPy not found, please install numpy to use bulk card validation')
+
+from paython.lib.utils import CARD_RANGES
+
+# longest prefixes first, the longest matching prefix decides the card type (like CARD_TRIE)
+CARD_RULES = sorted(CARD_RANGES, key=lambda card_range: -len(card_range[1]))
+
+class CardValidation(object):
+    """
+    Result of `validate_cards`, one entry per card in each array:
+
+    - luhn: number is all digits & passes the Luhn check
+    - expiry: expiration month is not over yet
+    - cvv: cvv is 3 or 4 digits (None when no cvvs were given)
+    - valid: all of the above
+    - types: card type ('visa', 'amex', ...) or None
+    """
+    def __init__(self, luhn, expiry, cvv, types):
+        self.luhn = luhn
+        self.expiry = expiry
+        self.cvv = cvv
+        self.types = types
+
+        self.valid = luhn & expiry
+        if cvv is not None:
+            self.valid &= cvv
+
+    def __len__(self):
+        return len(self.valid)
+
+def digit_matrix(values):
+    """
+    Turns a sequence of strings into a (rows, width) array of digits, left aligned.
+    Returns the digits, the string lengths & how many leading characters are digits.
+    """
+    values = numpy.asarray(values)
+    if values.dtype.kind != 'S':
+        values = values.astype('S')
+    width = max(values.dtype.itemsize, 1)
+
+    raw = numpy.frombuffer(values.tostring(), dtype=numpy.uint8).reshape(len(values), width)
+    is_digit = (raw >= 48) & (raw <= 57)
+    lengths = (raw != 0).sum(axis=1)
+
+    columns = numpy.arange(width)
+    leading = numpy.where(is_digit, width, columns).min(axis=1)
+
+    return raw.astype(numpy.int64) - 48, lengths, leading
+
+def to_ints(values):
+    """
+    Integer array of `values`, strings are parsed from their digits (-1 when they aren't all digits)
+    """
+    values = numpy.asarray(values)
+    if values.dtype.kind in 'iu':
+        return values.astype(numpy.int64)
+
+    digits, lengths, leading = digit_matrix(values)
+    width = digits.shape[1]
+    exponents = lengths[:, None] - 1 - numpy.arange(width)[None, :]
+    powers = numpy.where(exponents >= 0, 10 ** numpy.maximum(exponents, 0), 0) # no padding
+    return numpy.where((leading == lengths) & (lengths > 0), (digits * powers).sum(axis=1), -1)
+
+def luhn_mask(digits, lengths, leading):
+    """
+    Luhn check of every row, see paython.lib.utils.is_valid_cc
+    """
+    width = digits.shape[1]
+    from_right = lengths[:, None] - 1 - numpy.arange(width)[None, :]
+
+    doubled = digits * 2
+    doubled -= 9 * (doubled > 9)
+    terms = numpy.where(from_right % 2 == 1, doubled, digits)
+    terms[from_right < 0] = 0
+
+    return (leading == lengths) & (lengths > 0) & (terms.sum(axis=1) % 10 == 0)
+
+def expiry_mask(months, years, now=None):
+    """
+    True where the card expires this month or later, see paython.lib.utils.is_valid_exp
+    """
+    now = now or datetime.now()
+    months = to_ints(months)
+    years = to_ints(years)
+
+    in_range = (months >= 1) & (months <= 12)
+    return in_range & (years * 12 + months >= now.year * 12 + now.month)
+
+def cvv_mask(cvvs):
+    """
+    True where the cvv is 3 or 4 digits
+    """
+    cvvs = ['' if cvv is None else cvv for cvv in cvvs]
+    digits, lengths, leading = digit_matrix(cvvs)
+    return (leading == lengths) & (lengths >= 3) & (lengths <= 4)
+
+def card_types(digits, lengths, leading):
+    """
+    Card type of every row (None when its IIN or length matches none of the CARD_RANGES)
+    """
+    types = numpy.empty(len(lengths), dtype=object)
+    matched = numpy.zeros(len(lengths), dtype=bool)
+    all_digits = (leading == lengths)
+    prefixes = {}
+
+    for card_type, first, last, allowed in CARD_RULES:
+        k = len(first)
+        if k not in prefixes:
+            prefixes[k] = digits[:, :k].dot(10 ** numpy.arange(k - 1, -1, -1)) if k <= digits.shape[1] else None
+        if prefixes[k] is None:
+            continue
+
+        hit = (leading >= k) & (prefixes[k] >= int(first)) & (prefixes[k] <= int(last)) & ~matched
+        matched |= hit
+        types[hit & all_digits & numpy.in1d(lengths, allowed)] = card_type
+
+    return types
+
+def validate_cards(numbers, months, years, cvvs=None, now=None):
+    """
+    Validates many cards at once, the arguments are equal length sequences (or arrays)
+    of card numbers, expiration months & years and optionally cvvs.
+    Returns a `CardValidation` of boolean masks & card types.
+    """
+    digits, lengths, leading = digit_matrix(numbers)
+
+    return CardValidation(
+        luhn=luhn_mask(digits, lengths, leading),
+        expiry=expiry_mask(months, years, now),
+        cvv=cvv_mask(cvvs) if cvvs is not None else None,
+        types=card_types(digits, lengths, leading),
+    )
@@ -1,33 +1,122 @@
-from paython.exceptions import DataValidationError
+import hmac
+import hashlib
+
+from paython.exceptions import DataValidationError, MissingDataError
 
 from paython.lib.utils import get_card_type, get_card_exp, is_valid_exp, is_valid_cc, is_valid_cvv
 
 class CreditCard(object):
     """
     generic CreditCard object
+
+    Slotted so millions of cards fit in memory; card_type, exp_date, safe_num &
+    fingerprint are only worked out when first asked for and then cached.
     """
+    # fields a gateway can be sent, see fields()
+    FIELDS = ('full_name', 'first_name', 'last_name', 'number', 'exp_month', 'exp_year', 'exp_date', 'verification_value', 'card_type')
+
+    # secret of your own, fingerprints can't be worked out without it
+    # (a known key would let anyone brute force numbers from the BIN & last four digits)
+    FINGERPRINT_KEY = None
+
+    __slots__ = ('first_name', 'last_name', 'verification_value', 'strict', '_exp_yr_style',
+                 'exp_month', 'exp_year', '_full_name', '_number', '_expires',
+                 '_card_type', '_exp_date', '_safe_num', '_fingerprint')
+
     def __init__(self, number, exp_mo, exp_yr, first_name=None, last_name=None, full_name=None, cvv=None, cc_type=None, strict=False):
         """
         sets credit card info
         """
         if full_name:
-            self.full_name = full_name
+            self._full_name = full_name
         else:
             self.first_name = first_name
             self.last_name = last_name
-            self.full_name = "{0.first_name} {0.last_name}".format(self)
+            self._full_name = None # formatted from first & last name when needed
 
         #everything else
         self.number = number
         self.exp_month = exp_mo
         self.exp_year = exp_yr
-        self.exp_date = get_card_exp(self.exp_month, self.exp_year)
-        self.card_type = get_card_type(self.number)
+        # exp_date sticks to the expiration the card was created with, gateways
+        # cutting exp_year down to 2 digits (see _exp_yr_style) don't change it
+        self._expires = (exp_mo, exp_yr)
+        self._exp_date = None
 
         self.verification_value = cvv if cvv else None
 
         self.strict = strict
 
+    @property
+    def full_name(self):
+        if self._full_name is None:
+            self._full_name = "{0.first_name} {0.last_name}".format(self)
+        return self._full_name
+
+    @full_name.setter
+    def full_name(self, value):
+        self._full_name = value
+
+    @property
+    def number(self):
+        return self._number
+
+    @number.setter
+    def number(self, value):
+        self._number = value
+        self._card_type = self._safe_num = self._fingerprint = None
+
+    @property
+    def card_type(self):
+        if self._card_type is None:
+            self._card_type = get_card_type(self.number)
+        return self._card_type
+
+    @property
+    def exp_date(self):
+        if self._exp_date is None:
+            self._exp_date = get_card_exp(*self._expires)
+        return self._exp_date
+
+    @property
+    def safe_num(self):
+        """
+        outputs the card number with *'s, only exposing last four digits of card number
+        """
+        if self._safe_num is None:
+            card_length = len(self.number)
+            stars = '*' * (card_length - 4)
+            self._safe_num = '{0}{1}'.format(stars, self.number[-4:])
+        return self._safe_num
+
+    @property
+    def fingerprint(self):
+        """
+        stable HMAC-SHA256 of the card number (keyed with FINGERPRINT_KEY) to tell cards apart without keeping the number
+        """
+        if self._fingerprint is None:
+            if not self.FINGERPRINT_KEY:
+                raise MissingDataError('Set CreditCard.FINGERPRINT_KEY to a secret key before asking for fingerprints')
+            self._fingerprint = hmac.new(self.FINGERPRINT_KEY, self.number, hashlib.sha256).hexdigest()
+        return self._fingerprint
+
+    def fields(self, names=FIELDS):
+        """
+        yields (name, value) for each of `names` that is set on the card, derived
+        fields are only worked out when asked for
+        """
+        for name in names:
+            value = getattr(self, name, None)
+            if value is not None:
+                yield name, value
+
+    def __getstate__(self):
+        return dict((name, getattr(self, name)) for name in self.__slots__ if hasattr(self, name))
+
+    def __setstate__(self, state):
+        for name, value in state.items():
+            setattr(self, name, value)
+
     def __repr__(self):
         """
         string repr for debugging
@@ -37,15 +126,6 @@ class CreditCard(object):
         else:
             return u'<CreditCard -- {0.full_name}, {0.card_type}, {0.safe_num}, expires: {0.exp_date}>'.format(self)
 
-    @property
-    def safe_num(self):
-        """
-        outputs the card number with *'s, only exposing last four digits of card number
-        """
-        card_length = len(self.number)
-        stars = '*' * (card_length - 4)
-        return '{0}{1}'.format(stars, self.number[-4:])
-
     def is_valid(self):
         """
         boolean to see if a card is valid
@@ -0,0 +1,91 @@
+"""log.py - lazy debug logging, nothing gets formatted unless debug logging is on"""
+
+import re
+import logging
+
+from paython.lib.utils import is_valid_cc
+
+# 13-19 digit runs, the ones passing luhn are taken for card numbers
+CARD_NUMBER = re.compile(r'(?<!\d)\d{13,19}(?!\d)')
+
+def banner_text(text, args=()):
+    """
+    Formats `text` % `args` centered in ='s, the way Paython's debug banners look
+    """
+    if args:
+        text = text % args
+    return text.center(80, '=')
+
+def mask_value(value, keep=0):
+    """
+    Stars out `value` for logging, leaving its last `keep` characters
+    """
+    value = '%s' % value
+    if keep and len(value) > keep:
+        return '*' * (len(value) - keep) + value[-keep:]
+    return '*' * len(value)
+
+def mask_cards(text):
+    """
+    Stars out whatever looks like a card number in `text`, leaving its last four digits
+    """
+    def mask(match):
+        number = match.group(0)
+        return mask_value(number, 4) if is_valid_cc(number) else number
+    return CARD_NUMBER.sub(mask, text)
+
+class lazy(object):
+    """
+    A log argument worked out only when the message actually gets formatted,
+    e.g. log.debug('params: %s', lazy(self.params))
+    """
+    __slots__ = ('func', 'args')
+
+    def __init__(self, func, *args):
+        self.func = func
+        self.args = args
+
+    def __str__(self):
+        return '%s' % (self.func(*self.args),)
+
+class masked(object):
+    """
+    A log argument (raw response, parsed response...) with card numbers starred out
+    when it gets formatted, unless `raw`
+    """
+    __slots__ = ('value', 'raw')
+
+    def __init__(self, value, raw=False):
+        self.value = value
+        self.raw = raw
+
+    def __str__(self):
+        text = '%s' % (self.value,)
+        return text if self.raw else mask_cards(text)
+
+class DebugLog(object):
+    """
+    Wraps a module's logger so debug messages, banners & their arguments are only
+    formatted when the logger is enabled for DEBUG. The arguments stay on the
+    LogRecord (record.args) for handlers that want them as data.
+
+        log = DebugLog(__name__)
+        log.banner(' paython.gateways.x.request() -- Request completed in %ss ', response_time)
+        log.debug('%s with params: %s', url, lazy(self.params))
+    """
+    def __init__(self, name):
+        self.logger = logging.getLogger(name)
+
+    def debug(self, msg, *args):
+        if self.logger.isEnabledFor(logging.DEBUG):
+            self.logger.debug(msg, *args)
+
+    def banner(self, text, *args):
+        if self.logger.isEnabledFor(logging.DEBUG):
+            self.logger.debug(banner_text(text, args))
+
+    def exception(self, msg, *args):
+        """
+        Logs an error with the exception being handled, whatever the log level
+        """
+        self.logger.exception(msg, *args)
@@ -0,0 +1,161 @@
+"""metrics.py - in-process counters & latency histograms of gateway operations"""
+
+import bisect
+import threading
+
+# upper bounds (seconds) of the latency histogram buckets, +Inf is implied
+LATENCY_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 20.0)
+
+# how an operation ended: the response's approved flag, an exception, or a
+# response without an approved flag (gateways that don't standardize)
+OUTCOMES = ('approved', 'declined', 'error', 'unknown')
+
+def outcome(response=None, error=None):
+    """
+    The OUTCOMES entry for an operation that returned `response` or raised `error`
+    """
+    if error is not None:
+        return 'error'
+    if not isinstance(response, dict) or 'approved' not in response:
+        return 'unknown'
+    return 'approved' if response['approved'] else 'declined'
+
+class Series(object):
+    """
+    Counts & latency histogram of one (gateway, operation) pair
+    """
+    __slots__ = ('outcomes', 'buckets', 'sum', 'count', 'retries')
+
+    def __init__(self, buckets):
+        self.outcomes = dict.fromkeys(OUTCOMES, 0)
+        self.buckets = [0] * (len(buckets) + 1) # per bucket, not cumulative, last one is +Inf
+        self.sum = 0.0
+        self.count = 0
+        self.retries = 0 # requests sent again, see paython.lib.retry
+
+    def merge(self, other):
+        for key, value in other.outcomes.items():
+            self.outcomes[key] += value
+        for i, value in enumerate(other.buckets):
+            self.buckets[i] += value
+        self.sum += other.sum
+        self.count += other.count
+        self.retries += other.retries
+
+class Registry(object):
+    """
+    Aggregates every gateway operation by gateway class & operation name.
+
+    Each thread records into its own shard, so the hot path takes no lock;
+    snapshot() (and so prometheus_text) merges the shards when asked.
+    """
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = tuple(buckets)
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._shards = [] # (thread, shard) pairs
+        self._retired = {} # merged shards of threads that are gone
+
+    def _shard(self):
+        shard = getattr(self._local, 'shard', None)
+        if shard is None:
+            shard = self._local.shard = {}
+            with self._lock:
+                self._shards.append((threading.current_thread(), shard))
+        return shard
+
+    def _series(self, gateway, operation):
+        shard = self._shard()
+        series = shard.get((gateway, operation))
+        if series is None:
+            series = shard[(gateway, operation)] = Series(self.buckets)
+        return series
+
+    def record(self, gateway, operation, seconds, outcome):
+        """
+        Records one `operation` on `gateway` that took `seconds` & ended in `outcome` (see OUTCOMES)
+        """
+        series = self._series(gateway, operation)
+        series.outcomes[outcome] += 1
+        series.buckets[bisect.bisect_left(self.buckets, seconds)] += 1
+        series.sum += seconds
+        series.count += 1
+
+    def record_retry(self, gateway, operation):
+        """
+        Records that `operation` on `gateway` sent its request again
+        """
+        self._series(gateway, operation).retries += 1
+
+    def snapshot(self):
+        """
+        Returns a {(gateway, operation): Series} dict merged across threads
+        """
+        merged = {}
+        def add(shard):
+            for key, series in shard.items():
+                if key not in merged:
+                    merged[key] = Series(self.buckets)
+                merged[key].merge(series)
+
+        with self._lock:
+            live = []
+            for thread, shard in self._shards:
+                if thread.is_alive():
+                    live.append((thread, shard))
+                else:
+                    for key, series in shard.items():
+                        self._retired.setdefault(key, Series(self.buckets)).merge(series)
+            self._shards = live
+            add(self._retired)
+            for thread, shard in live:
+                add(shard)
+        return merged
+
+    def clear(self):
+        """
+        Forgets everything recorded so far
+        """
+        with self._lock:
+            for thread, shard in self._shards:
+                shard.clear()
+            self._retired = {}
+
+def _labels(**labels):
+    return ','.join('%s="%s"' % (key, str(value).replace('\\', '\\\\').replace('"', '\\"'))
+                    for key, value in sorted(labels.items()))
+
+def prometheus_text(registry=None):
+    """
+    Renders the registry in the Prometheus text exposition format (version 0.0.4),
+    serve it as text/plain from your app's /metrics
+    """
+    registry = registry or default_registry
+    snapshot = sorted(registry.snapshot().items())
+
+    lines = ['# HELP paython_operations_total Gateway operations by outcome',
+             '# TYPE paython_operations_total counter']
+    for (gateway, operation), series in snapshot:
+        for name in OUTCOMES:
+            lines.append('paython_operations_total{%s} %d' % (_labels(gateway=gateway, operation=operation, outcome=name), series.outcomes[name]))
+
+    lines.extend(['# HELP paython_retries_total Gateway requests sent again',
+                  '# TYPE paython_retries_total counter'])
+    for (gateway, operation), series in snapshot:
+        lines.append('paython_retries_total{%s} %d' % (_labels(gateway=gateway, operation=operation), series.retries))
+
+    lines.extend(['# HELP paython_operation_duration_seconds Gateway operation latency',
+                  '# TYPE paython_operation_duration_seconds histogram'])
+    for (gateway, operation), series in snapshot:
+        cumulative = 0
+        for bound, count in zip(registry.buckets + ('+Inf',), series.buckets):
+            cumulative += count
+            lines.append('paython_operation_duration_seconds_bucket{%s} %d' % (_labels(gateway=gateway, operation=operation, le=bound), cumulative))
+        labels = _labels(gateway=gateway, operation=operation)
+        lines.append('paython_operation_duration_seconds_sum{%s} %r' % (labels, series.sum))
+        lines.append('paython_operation_duration_seconds_count{%s} %d' % (labels, series.count))
+
+    return '\n'.join(lines) + '\n'
+
+# shared by every gateway unless they get their own
+default_registry = Registry()
@@ -0,0 +1,98 @@
+"""profiling.py - cProfile / tracemalloc profiles of a sample of gateway operations"""
+
+import os
+import time
+import random
+import cProfile
+import itertools
+import threading
+
+try:
+    import tracemalloc
+except ImportError:
+    tracemalloc = None # python 3.4+ (or pytracemalloc)
+
+MODES = ('cprofile', 'tracemalloc')
+
+# tracemalloc traces the whole process, so only one sampled operation at a time uses it
+_tracemalloc_lock = threading.Lock()
+
+class Profile(object):
+    """
+    One running profile, `stop` dumps it & returns the path it was dumped to
+    """
+    def __init__(self, profiler, path):
+        self.profiler = profiler
+        self.path = path
+        if profiler.mode == 'cprofile':
+            self._profile = cProfile.Profile()
+            self._profile.enable()
+        else:
+            try:
+                tracemalloc.start(profiler.frames)
+            except:
+                # Profiler.start took the lock, nothing would give it back
+                _tracemalloc_lock.release()
+                profiler._local.active = False
+                raise
+
+    def stop(self):
+        try:
+            if self.profiler.mode == 'cprofile':
+                self._profile.disable()
+                self._profile.dump_stats(self.path)
+            else:
+                try:
+                    snapshot = tracemalloc.take_snapshot()
+                finally:
+                    tracemalloc.stop()
+                    _tracemalloc_lock.release()
+                snapshot.dump(self.path)
+        finally:
+            self.profiler._local.active = False
+        return self.path
+
+class Profiler(object):
+    """
+    Profiles 1 in `sample` gateway operations (picked at random) and dumps every
+    profile to `directory` as <gateway>.<operation>.<time>.<pid>-<n>.prof, read
+    them with pstats. With mode='tracemalloc' the allocations get traced instead
+    and dumped as .tracemalloc snapshots (load them with tracemalloc.Snapshot.load).
+
+        api.profiler = Profiler('/tmp/paython-profiles', sample=1000)
+    """
+    def __init__(self, directory, sample=1000, mode='cprofile', frames=10):
+        if mode not in MODES:
+            raise ValueError('mode must be one of %s' % ', '.join(MODES))
+        if mode == 'tracemalloc' and tracemalloc is None:
+            raise Exception('tracemalloc not found, please use python 3.4+ (or install pytracemalloc) to trace allocations')
+
+        self.directory = directory
+        self.sample = sample
+        self.mode = mode
+        self.frames = frames
+        self._random = random.Random()
+        self._counter = itertools.count(1)
+        self._local = threading.local()
+
+    def sampled(self):
+        """
+        True for 1 in `sample` calls
+        """
+        return self._random.random() * self.sample < 1
+
+    def start(self, gateway, operation):
+        """
+        Starts profiling an `operation` on `gateway` if it's sampled, returns
+        the running Profile or None. Operations nested in a profiled one are never sampled.
+        """
+        if getattr(self._local, 'active', False) or not self.sampled():
+            return None
+        if self.mode == 'tracemalloc' and (tracemalloc.is_tracing() or not _tracemalloc_lock.acquire(False)):
+            return None
+
+        name = '%s.%s.%s.%d-%d.%s' % (gateway, operation, time.strftime('%Y%m%dT%H%M%S'), os.getpid(), next(self._counter),
+                                      'prof' if self.mode == 'cprofile' else 'tracemalloc')
+        profile = Profile(self, os.path.join(self.directory, name))
+        self._local.active = True
+        return profile
@@ -0,0 +1,82 @@
+"""recording.py - records gateway traffic (card data starred out) & replays it through the parsers offline"""
+
+import gzip
+import json
+import time
+import threading
+
+from paython.lib.log import mask_cards
+from paython.lib.transport import Response
+
+# bodies are bytes, latin-1 maps every byte to a code point so they come back exactly as received
+ENCODING = 'latin-1'
+
+class Recorder(object):
+    """
+    Appends every request a gateway sends & the raw response it gets back to `path`
+    as gzipped JSON lines. Card numbers, cvvs & credentials are starred out of the
+    requests, anything that looks like a card number out of the responses.
+
+        api.recorder = Recorder('traffic.jsonl.gz')
+
+    close() it when done, the last records are only written out then.
+    """
+    def __init__(self, path):
+        self._file = gzip.open(path, 'ab')
+        self._lock = threading.Lock()
+
+    def record(self, gateway, prepared, response):
+        """
+        Records `prepared` (a paython.lib.transport.PreparedRequest) sent by `gateway`
+        & the paython.lib.transport.Response it got
+        """
+        line = json.dumps({
+            'gateway': gateway.__class__.__name__,
+            'time': time.time(),
+            'method': prepared.method,
+            'url': prepared.url,
+            'request': gateway.recorded_body(prepared).decode(ENCODING),
+            'status': response.status,
+            'reason': response.reason,
+            'response': mask_cards(response.body).decode(ENCODING),
+            'elapsed': response.elapsed,
+        }, separators=(',', ':'), sort_keys=True)
+        with self._lock:
+            self._file.write(line + '\n')
+
+    def close(self):
+        with self._lock:
+            self._file.close()
+
+def read_records(path):
+    """
+    Yields the records (dicts) of a Recorder file, oldest first
+    """
+    recording = gzip.open(path, 'rb')
+    try:
+        for line in recording:
+            yield json.loads(line)
+    finally:
+        recording.close()
+
+def replay(path, gateway):
+    """
+    Feeds the responses recorded for `gateway`'s class back through its parser, no
+    network involved. Yields (record, parsed response) pairs, the exception parsing
+    raised in place of the response when it did.
+
+        for record, response in replay('traffic.jsonl.gz', AuthorizeNet()):
+            ...
+    """
+    name = gateway.__class__.__name__
+    for record in read_records(path):
+        if record['gateway'] != name:
+            continue
+
+        response = Response(record['status'], record['reason'], {}, record['response'].encode(ENCODING), record['elapsed'])
+        try:
+            with gateway.transaction():
+                parsed = gateway.parse_response(response)
+        except Exception as e:
+            parsed = e
+        yield record, parsed
@@ -0,0 +1,58 @@
+"""retry.py - when & how long to wait before resending a gateway request"""
+
+import random
+
+class RetryPolicy(object):
+    """
+    Decides which answers get the request sent again & how long to wait first.
+
+    - attempts: most sends in total, the first one included (1 never retries)
+    - backoff: seconds before the first retry, times `multiplier` for every retry after it
+    - max_backoff: longest single wait
+    - jitter: share of each wait picked at random (1 = anywhere from 0 to the full wait),
+      so clients that failed together don't come back together
+    - deadline: seconds into the operation after which no retry gets started (None for no limit)
+    - statuses: HTTP statuses worth retrying
+    - bodies: response bodies (whitespace stripped) worth retrying
+
+    Only answers get retried, requests that failed on the network are left alone since
+    the gateway may have processed them.
+    """
+    def __init__(self, attempts=3, backoff=0.1, multiplier=2, max_backoff=2.0, jitter=1.0, deadline=10.0, statuses=(), bodies=()):
+        self.attempts = attempts
+        self.backoff = backoff
+        self.multiplier = multiplier
+        self.max_backoff = max_backoff
+        self.jitter = jitter
+        self.deadline = deadline
+        self.statuses = frozenset(statuses)
+        self.bodies = frozenset(bodies)
+        self._random = random.Random()
+
+    def retryable(self, status, body):
+        """
+        True when an answer with `status` & `body` is worth sending the request again for
+        """
+        return status in self.statuses or (body or '').strip() in self.bodies
+
+    def delay(self, retry):
+        """
+        Seconds to wait before the `retry`th retry (1 for the first one)
+        """
+        wait = min(self.max_backoff, self.backoff * self.multiplier ** (retry - 1))
+        return wait - wait * self.jitter * self._random.random()
+
+    def wait(self, attempt, elapsed, status, body):
+        """
+        Seconds to wait before sending again after send number `attempt` got `status` & `body`,
+        `elapsed` seconds into the operation. None when it shouldn't be sent again.
+        """
+        if attempt >= self.attempts or not self.retryable(status, body):
+            return None
+        wait = self.delay(attempt)
+        if self.deadline is not None and elapsed + wait > self.deadline:
+            return None
+        return wait
+
+# never retries
+NO_RETRY = RetryPolicy(attempts=1)
@@ -0,0 +1,47 @@
+"""timing.py - monotonic per phase timing of gateway calls"""
+
+import sys
+import time
+
+# phases of a gateway call, in the order they happen
+PHASES = ('dns', 'connect', 'tls', 'write', 'ttfb', 'read', 'parse', 'standardize')
+
+def _clock_gettime():
+    """
+    CLOCK_MONOTONIC through ctypes, for pythons without time.monotonic (None when unavailable)
+    """
+    if not sys.platform.startswith('linux'):
+        return None
+    try:
+        import ctypes
+        import ctypes.util
+
+        class timespec(ctypes.Structure):
+            _fields_ = [('tv_sec', ctypes.c_long), ('tv_nsec', ctypes.c_long)]
+
+        libc = ctypes.CDLL(ctypes.util.find_library('rt') or ctypes.util.find_library('c'), use_errno=True)
+        clock_gettime = libc.clock_gettime
+        clock_gettime.argtypes = [ctypes.c_int, ctypes.POINTER(timespec)]
+    except (ImportError, OSError, AttributeError):
+        return None
+
+    CLOCK_MONOTONIC = 1
+
+    def monotonic():
+        ts = timespec()
+        if clock_gettime(CLOCK_MONOTONIC, ctypes.byref(ts)) != 0:
+            raise OSError(ctypes.get_errno(), 'clock_gettime failed')
+        return ts.tv_sec + ts.tv_nsec * 1e-9
+    return monotonic
+
+# seconds on a clock that never goes backwards, only differences between two calls mean anything
+monotonic = getattr(time, 'monotonic', None) or _clock_gettime() or time.time
+
+def timing_fields(phases):
+    """
+    The `timing` field of a gateway response: seconds spent in each of PHASES
+    (None for phases the transport could not measure) and their total
+    """
+    fields = dict((phase, phases.get(phase)) for phase in PHASES)
+    fields['total'] = sum(seconds for seconds in phases.values() if seconds is not None)
+    return fields
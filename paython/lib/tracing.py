@@ -0,0 +1,181 @@
+"""tracing.py - nested spans around building, signing, sending & parsing gateway calls"""
+
+import json
+import time
+import random
+import threading
+import collections
+
+from paython.lib.log import DebugLog
+from paython.lib.timing import monotonic
+
+log = DebugLog(__name__)
+
+class Span(object):
+    """
+    One timed stage of a gateway call. `parent_id` is the span it ran inside of,
+    all spans of one operation share its `trace_id`.
+    """
+    __slots__ = ('name', 'trace_id', 'span_id', 'parent_id', 'attributes', 'timestamp', 'start', 'end')
+
+    def __init__(self, name, trace_id, parent_id, attributes):
+        self.name = name
+        self.trace_id = trace_id
+        self.span_id = '%016x' % random.getrandbits(64)
+        self.parent_id = parent_id
+        self.attributes = attributes
+        self.timestamp = time.time()
+        self.start = monotonic()
+        self.end = None
+
+    def set(self, key, value):
+        self.attributes[key] = value
+
+    @property
+    def duration(self):
+        """
+        seconds the span took (None while still open)
+        """
+        return None if self.end is None else self.end - self.start
+
+    def as_dict(self):
+        return {
+            'name': self.name,
+            'trace_id': self.trace_id,
+            'span_id': self.span_id,
+            'parent_id': self.parent_id,
+            'timestamp': self.timestamp,
+            'duration': self.duration,
+            'attributes': self.attributes,
+        }
+
+    def __repr__(self):
+        return '<Span -- {0.name} {0.duration}s {0.attributes}>'.format(self)
+
+class _NoopSpan(object):
+    """
+    What the no-op tracer hands out, does nothing at all
+    """
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        return False
+
+    def set(self, key, value):
+        pass
+
+NOOP_SPAN = _NoopSpan()
+
+class Tracer(object):
+    """
+    The default tracer: spans cost a method call & record nothing.
+    Subclass it (or use RecordingTracer) to hook up your own tracing.
+    """
+    # False lets gateways skip building span attributes altogether
+    enabled = False
+
+    def span(self, name, **attributes):
+        """
+        Returns a context manager timing the stage `name`, spans opened inside it are its children
+        """
+        return NOOP_SPAN
+
+class _ActiveSpan(object):
+    """
+    Opens a Span on the recording tracer's current thread & exports it once closed
+    """
+    __slots__ = ('tracer', 'name', 'attributes', 'span')
+
+    def __init__(self, tracer, name, attributes):
+        self.tracer = tracer
+        self.name = name
+        self.attributes = attributes
+
+    def __enter__(self):
+        stack = self.tracer._stack()
+        if stack:
+            parent = stack[-1]
+            self.span = Span(self.name, parent.trace_id, parent.span_id, self.attributes)
+        else:
+            self.span = Span(self.name, '%016x' % random.getrandbits(64), None, self.attributes)
+        stack.append(self.span)
+        return self.span
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        span = self.span
+        span.end = monotonic()
+        if exc_type is not None:
+            span.attributes['error'] = exc_type.__name__
+        self.tracer._stack().pop()
+        # spans close after the request went out, an exporter failing only gets logged
+        try:
+            self.tracer.exporter.export(span)
+        except Exception:
+            log.exception('Could not export the %s span', span.name)
+        return False
+
+class RecordingTracer(Tracer):
+    """
+    Records every span & hands it to `exporter` (RingExporter, FileExporter or
+    anything with an export(span) method) as soon as it closes
+    """
+    enabled = True
+
+    def __init__(self, exporter):
+        self.exporter = exporter
+        self._local = threading.local()
+
+    def _stack(self):
+        stack = getattr(self._local, 'stack', None)
+        if stack is None:
+            stack = self._local.stack = []
+        return stack
+
+    def span(self, name, **attributes):
+        return _ActiveSpan(self, name, attributes)
+
+class RingExporter(object):
+    """
+    Keeps the last `size` spans in memory
+    """
+    def __init__(self, size=10000):
+        self._spans = collections.deque(maxlen=size)
+
+    def export(self, span):
+        self._spans.append(span)
+
+    def spans(self):
+        """
+        The spans kept, oldest first
+        """
+        return list(self._spans)
+
+    def dump(self, path):
+        """
+        Writes the spans kept to `path` as JSON lines
+        """
+        with open(path, 'w') as f:
+            for span in self.spans():
+                f.write(json.dumps(span.as_dict(), default=str) + '\n')
+
+class FileExporter(object):
+    """
+    Appends every span to `path` as a line of JSON
+    """
+    def __init__(self, path):
+        self._file = open(path, 'a')
+        self._lock = threading.Lock()
+
+    def export(self, span):
+        line = json.dumps(span.as_dict(), default=str) + '\n'
+        with self._lock:
+            self._file.write(line)
+            self._file.flush()
+
+    def close(self):
+        with self._lock:
+            self._file.close()
+
+# used by every gateway unless they get their own
+noop_tracer = Tracer()
@@ -0,0 +1,97 @@
+"""translate.py - compiled translations of Paython fields into gateway fields"""
+
+from paython.exceptions import DataValidationError, MissingDataError, MissingTranslationError
+from paython.lib.cc import CreditCard
+from paython.lib.utils import is_valid_email
+
+# set_billing_info keys, all optional
+BILLING_FIELDS = ('address', 'address2', 'city', 'state', 'zipcode', 'country', 'phone', 'ip', 'first_name', 'last_name', 'email')
+
+# set_shipping_info keys
+SHIPPING_FIELDS = ('ship_first_name', 'ship_last_name', 'ship_address', 'ship_city', 'ship_state', 'ship_zipcode')
+SHIPPING_OPTIONALS = ('ship_to_co', 'ship_phone', 'ship_email', 'ship_country')
+
+_missing = object()
+
+class Translator(object):
+    """
+    Maps CreditCards, billing & shipping info straight to a gateway's field names.
+    Built once per gateway class from its REQUEST_FIELDS, see Gateway.translator().
+
+    Each method returns a list of (gateway field, value) pairs, fields the gateway
+    translates to None (doesn't use) are left out.
+    """
+    def __init__(self, request_fields):
+        # card attributes the gateway uses
+        self.card_fields = dict((key, request_fields[key]) for key in CreditCard.FIELDS if request_fields.get(key))
+        self.card_keys = tuple(key for key in CreditCard.FIELDS if key in self.card_fields)
+        # (key, gateway field or _missing) pairs, complaining about a missing translation only if the key is given
+        self.billing_fields = tuple((key, request_fields.get(key, _missing)) for key in BILLING_FIELDS)
+        self.shipping_fields = tuple((key, request_fields.get(key, _missing)) for key in SHIPPING_FIELDS)
+        self.shipping_optionals = tuple((key, request_fields.get(key, _missing)) for key in SHIPPING_OPTIONALS)
+
+    def card(self, credit_card):
+        """
+        Translates the fields set on `credit_card`
+        """
+        card_fields = self.card_fields
+        return [(card_fields[key], value) for key, value in credit_card.fields(self.card_keys)]
+
+    def billing(self, info):
+        """
+        Translates a billing info dict, validating the email as well formed
+        """
+        pairs = []
+        for key, field in self.billing_fields:
+            value = info.get(key)
+            if not value:
+                continue
+            if field is _missing:
+                raise MissingTranslationError('Gateway doesn\'t support the \"%s\" field for billing' % key)
+            if key == 'email' and not is_valid_email(value):
+                raise DataValidationError('The email submitted does not pass regex validation')
+            if field is not None:
+                pairs.append((field, value))
+        return pairs
+
+    def shipping(self, info):
+        """
+        Translates a shipping info dict, the SHIPPING_FIELDS are required
+        """
+        pairs = []
+        for key, field in self.shipping_fields:
+            if key not in info:
+                raise MissingDataError('The shipping info is missing the \"%s\" field' % key)
+            if field is _missing:
+                raise MissingTranslationError('Gateway doesn\'t support the \"%s\" field for shipping' % key)
+            if field is not None:
+                pairs.append((field, info[key]))
+
+        for key, field in self.shipping_optionals:
+            value = info.get(key)
+            if not value:
+                continue
+            if field is _missing:
+                raise MissingTranslationError('Gateway doesn\'t support the \"%s\" field for shipping' % key)
+            if field is not None:
+                pairs.append((field, value))
+        return pairs
+
+    def card_many(self, credit_cards):
+        """
+        Translates many CreditCards at once, returning a dict of gateway fields per card
+        """
+        card_fields, card_keys = self.card_fields, self.card_keys
+        return [dict((card_fields[key], value) for key, value in credit_card.fields(card_keys)) for credit_card in credit_cards]
+
+    def billing_many(self, infos):
+        """
+        Translates many billing info dicts at once, returning a dict of gateway fields per record
+        """
+        return [dict(self.billing(info)) for info in infos]
+
+    def shipping_many(self, infos):
+        """
+        Translates many shipping info dicts at once, returning a dict of gateway fields per record
+        """
+        return [dict(self.shipping(info)) for info in infos]
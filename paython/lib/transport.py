@@ -0,0 +1,298 @@
+"""transport.py - pooled keep-alive HTTP(S) connections used by the gateways"""
+
+import ssl
+import time
+import socket
+import httplib
+import threading
+import urlparse
+
+from paython.lib.timing import monotonic
+
+DEFAULT_PORTS = {
+    'http': httplib.HTTP_PORT,
+    'https': httplib.HTTPS_PORT,
+}
+
+_ssl_contexts = {}
+_ssl_lock = threading.Lock()
+
+def ssl_context(key_file, cert_file, verify=True):
+    """
+    Returns a client certificate SSL context, loading the PEM files only once per key/cert pair.
+    With verify=False the server's certificate goes unchecked (test servers only).
+    Returns None on pythons without ssl.SSLContext (the files get handed to httplib instead).
+    """
+    if not hasattr(ssl, 'SSLContext'):
+        return None
+
+    with _ssl_lock:
+        context = _ssl_contexts.get((key_file, cert_file, verify))
+        if context is None:
+            # same defaults httplib.HTTPSConnection uses when handed key_file/cert_file
+            context = ssl._create_default_https_context() if verify else ssl._create_unverified_context()
+            if cert_file:
+                context.load_cert_chain(cert_file, key_file)
+            _ssl_contexts[(key_file, cert_file, verify)] = context
+        return context
+
+def timed_connection(address, timeout, source_address, timing):
+    """
+    socket.create_connection, noting the seconds spent on DNS & the TCP connect in `timing`
+    """
+    host, port = address
+    start = monotonic()
+    addresses = socket.getaddrinfo(host, port, 0, socket.SOCK_STREAM)
+    resolved = monotonic()
+    timing['dns'] = resolved - start
+
+    error = socket.error('getaddrinfo returns an empty list')
+    for family, socktype, proto, canonname, sockaddr in addresses:
+        sock = None
+        try:
+            sock = socket.socket(family, socktype, proto)
+            if timeout is not socket._GLOBAL_DEFAULT_TIMEOUT:
+                sock.settimeout(timeout)
+            if source_address:
+                sock.bind(source_address)
+            sock.connect(sockaddr)
+            timing['connect'] = monotonic() - resolved
+            return sock
+        except socket.error as e:
+            error = e
+            if sock is not None:
+                sock.close()
+    raise error
+
+class TimedHTTPConnection(httplib.HTTPConnection):
+    """
+    HTTPConnection noting how long its last connect() spent on DNS, connect & TLS in `timing`
+    """
+    def __init__(self, *args, **kwargs):
+        httplib.HTTPConnection.__init__(self, *args, **kwargs)
+        self.timing = {}
+        self._create_connection = self._timed_connection
+
+    def _timed_connection(self, address, timeout=socket._GLOBAL_DEFAULT_TIMEOUT, source_address=None):
+        self.timing = {'tls': 0.0}
+        return timed_connection(address, timeout, source_address, self.timing)
+
+class TimedHTTPSConnection(httplib.HTTPSConnection):
+    __doc__ = TimedHTTPConnection.__doc__
+
+    def __init__(self, *args, **kwargs):
+        httplib.HTTPSConnection.__init__(self, *args, **kwargs)
+        self.timing = {}
+        self._create_connection = self._timed_connection
+
+    def _timed_connection(self, address, timeout=socket._GLOBAL_DEFAULT_TIMEOUT, source_address=None):
+        self.timing = {}
+        return timed_connection(address, timeout, source_address, self.timing)
+
+    def connect(self):
+        start = monotonic()
+        httplib.HTTPSConnection.connect(self)
+        self.timing['tls'] = monotonic() - start - self.timing['dns'] - self.timing['connect']
+
+class PreparedRequest(object):
+    """
+    Fully built request, ready to go out over the pooled or the async transport
+    """
+    def __init__(self, method, url, body=None, headers=None, key_file=None, cert_file=None, verify=True, idempotent=False):
+        self.method = method
+        self.url = url
+        self.body = body
+        self.headers = headers or {}
+        self.key_file = key_file
+        self.cert_file = cert_file
+        self.verify = verify
+        self.idempotent = idempotent
+
+    def __repr__(self):
+        return '<PreparedRequest -- {0.method} {0.url}>'.format(self)
+
+class Response(object):
+    """
+    Fully read HTTP response, detached from the connection it came in on.
+    `timing` holds the seconds spent per network phase (see paython.lib.timing.PHASES)
+    """
+    def __init__(self, status, reason, headers, body, elapsed=None, timing=None):
+        self.status = status
+        self.reason = reason
+        self.headers = headers
+        self.body = body
+        self.elapsed = elapsed
+        self.timing = timing or {}
+
+    @property
+    def text(self):
+        """
+        same name the requests library uses, so gateways can parse either
+        """
+        return self.body
+
+    def __repr__(self):
+        return '<Response -- {0.status} {0.reason}, {1} bytes>'.format(self, len(self.body))
+
+class ConnectionPool(object):
+    """
+    Keeps idle keep-alive connections around per (scheme, host, port, key_file, cert_file, verify)
+    so the next request to the same gateway skips the TCP connect & TLS handshake.
+
+    - max_size: most idle connections kept per host, extra ones get closed
+    - idle_timeout: seconds a connection may sit unused before it gets evicted
+    - timeout: socket timeout for new connections
+    """
+    def __init__(self, max_size=10, idle_timeout=30, timeout=20):
+        self.max_size = max_size
+        self.idle_timeout = idle_timeout
+        self.timeout = timeout
+        self._idle = {}
+        self._lock = threading.Lock()
+
+    def connect(self, key):
+        """
+        Opens a brand new (not yet connected) connection for `key`
+        """
+        scheme, host, port, key_file, cert_file, verify = key
+        if scheme != 'https':
+            return TimedHTTPConnection(host, port, timeout=self.timeout)
+
+        if key_file or cert_file or not verify:
+            context = ssl_context(key_file, cert_file, verify)
+            if context:
+                return TimedHTTPSConnection(host, port, timeout=self.timeout, context=context)
+            return TimedHTTPSConnection(host, port, key_file=key_file, cert_file=cert_file, timeout=self.timeout)
+
+        return TimedHTTPSConnection(host, port, timeout=self.timeout)
+
+    def evict(self, now=None):
+        """
+        Closes every idle connection that has been sitting around for too long
+        """
+        now = now or time.time()
+        with self._lock:
+            for key, idle in self._idle.items():
+                while idle and now - idle[0][1] >= self.idle_timeout:
+                    idle.pop(0)[0].close()
+                if not idle:
+                    del self._idle[key]
+
+    def get(self, key):
+        """
+        Returns a (connection, reused) tuple, reusing the most recently used idle connection
+        """
+        self.evict()
+        with self._lock:
+            idle = self._idle.get(key)
+            if idle:
+                return idle.pop()[0], True
+        return self.connect(key), False
+
+    def put(self, key, conn):
+        """
+        Hands a connection back to the pool once its response has been fully read
+        """
+        with self._lock:
+            idle = self._idle.setdefault(key, [])
+            if len(idle) < self.max_size:
+                idle.append((conn, time.time()))
+                return
+        conn.close()
+
+    def clear(self):
+        """
+        Closes all idle connections
+        """
+        with self._lock:
+            idle, self._idle = self._idle, {}
+        for connections in idle.values():
+            for conn, last_used in connections:
+                conn.close()
+
+    def idle_count(self, key=None):
+        """
+        Number of idle connections (for `key` or in total), mostly for debugging
+        """
+        with self._lock:
+            if key:
+                return len(self._idle.get(key, []))
+            return sum(len(idle) for idle in self._idle.values())
+
+    def request(self, method, url, body=None, headers=None, key_file=None, cert_file=None, verify=True, idempotent=False):
+        """
+        Sends the request over a pooled connection and returns a fully read `Response`.
+        Pass key_file/cert_file for gateways that authenticate with a client certificate,
+        verify=False skips checking the server's certificate.
+
+        A reused connection the server already closed is retried on a fresh connection
+        when writing the request fails. Once the request is written the server may have
+        processed it, so a connection closed without an answer raises instead, unless
+        the request is `idempotent` (safe to send twice).
+
+        The response's `timing` splits the (last) attempt into dns, connect, tls
+        (all 0 on a reused connection), write, ttfb & read.
+        """
+        start = time.time()
+        parsed = urlparse.urlparse(url)
+        key = (parsed.scheme, parsed.hostname, parsed.port or DEFAULT_PORTS[parsed.scheme], key_file, cert_file, verify)
+        path = parsed.path or '/'
+        if parsed.query:
+            path = '%s?%s' % (path, parsed.query)
+
+        while True:
+            conn, reused = self.get(key)
+            timing = {'dns': 0.0, 'connect': 0.0, 'tls': 0.0}
+            try:
+                if conn.sock is None:
+                    conn.connect()
+                    timing.update(getattr(conn, 'timing', {}))
+                mark = monotonic()
+                conn.request(method, path, body, headers or {})
+            except socket.error:
+                conn.close()
+                if reused:
+                    continue # stale keep-alive connection, try again with the next one
+                raise
+
+            now = monotonic()
+            timing['write'], mark = now - mark, now
+            try:
+                response = conn.getresponse()
+            except httplib.BadStatusLine:
+                # closed without a single byte of response, which doesn't mean nothing got processed
+                conn.close()
+                if reused and idempotent:
+                    continue
+                raise
+            except:
+                conn.close()
+                raise
+
+            now = monotonic()
+            timing['ttfb'], mark = now - mark, now
+            try:
+                data = response.read()
+            except:
+                conn.close()
+                raise
+            timing['read'] = monotonic() - mark
+            break
+
+        if response.will_close:
+            conn.close()
+        else:
+            self.put(key, conn)
+
+        return Response(response.status, response.reason, dict(response.getheaders()), data, time.time() - start, timing)
+
+    def send(self, prepared):
+        """
+        Sends a `PreparedRequest`
+        """
+        return self.request(prepared.method, prepared.url, prepared.body, prepared.headers,
+                            key_file=prepared.key_file, cert_file=prepared.cert_file, verify=prepared.verify,
+                            idempotent=prepared.idempotent)
+
+# shared by every gateway unless they get their own pool
+default_pool = ConnectionPool()
@@ -1,24 +1,250 @@
 import re
 import calendar
-import xml
+import xml.dom.minidom
+
+from xml.parsers import expat
 
 from datetime import datetime
 from suds.sax.text import Text as sudTypeText # for the 'parse_soap()' string type
 
 from paython.exceptions import GatewayError
 
-CARD_TYPES = {
-    'visa': r'4\d{12}(\d{3})?$',
-    'amex': r'37\d{13}$',
-    'mc': r'5[1-5]\d{14}$',
-    'discover': r'6011\d{12}',
-    'diners': r'(30[0-5]\d{11}|(36|38)\d{12})$'
-}
+# IIN ranges: (card type, first prefix, last prefix, valid lengths), longest matching prefix wins
+CARD_RANGES = (
+    ('visa', '4', '4', (13, 16, 19)),
+    ('amex', '34', '34', (15,)),
+    ('amex', '37', '37', (15,)),
+    ('mc', '51', '55', (16,)),
+    ('mc', '2221', '2720', (16,)),
+    ('discover', '6011', '6011', (16, 17, 18, 19)),
+    ('discover', '644', '649', (16, 17, 18, 19)),
+    ('discover', '65', '65', (16, 17, 18, 19)),
+    ('diners', '300', '305', (14, 15, 16, 17, 18, 19)),
+    ('diners', '3095', '3095', (14, 15, 16, 17, 18, 19)),
+    ('diners', '36', '36', (14, 15, 16, 17, 18, 19)),
+    ('diners', '38', '39', (14, 15, 16, 17, 18, 19)),
+    ('jcb', '3528', '3589', (16, 17, 18, 19)),
+    ('unionpay', '62', '62', (16, 17, 18, 19)),
+    ('maestro', '5018', '5018', (12, 13, 14, 15, 16, 17, 18, 19)),
+    ('maestro', '5020', '5020', (12, 13, 14, 15, 16, 17, 18, 19)),
+    ('maestro', '5038', '5038', (12, 13, 14, 15, 16, 17, 18, 19)),
+    ('maestro', '5893', '5893', (12, 13, 14, 15, 16, 17, 18, 19)),
+    ('maestro', '6304', '6304', (12, 13, 14, 15, 16, 17, 18, 19)),
+    ('maestro', '6759', '6759', (12, 13, 14, 15, 16, 17, 18, 19)),
+    ('maestro', '6761', '6763', (12, 13, 14, 15, 16, 17, 18, 19)),
+)
+
+def build_card_trie(ranges):
+    """
+    Builds a digit by digit prefix trie out of IIN ranges, the None key of a
+    node holds the (card type, valid lengths) of the prefix ending there
+    """
+    trie = {}
+    for card_type, first, last, lengths in ranges:
+        for prefix in xrange(int(first), int(last) + 1):
+            node = trie
+            for digit in str(prefix).zfill(len(first)):
+                node = node.setdefault(digit, {})
+            node[None] = (card_type, frozenset(lengths))
+    return trie
+
+CARD_TRIE = build_card_trie(CARD_RANGES)
+
+class _Node(object):
+    """
+    What parse_xml keeps of an element while it is open: its attributes, the dict its
+    children go into & enough about its first child to tell single text/CDATA content apart
+    """
+    __slots__ = ('attributes', 'root', 'count', 'first', 'first_value', 'text', 'elements', 'loose')
+
+    def __init__(self, attributes=None):
+        self.attributes = attributes
+        self.root = {}
+        self.count = 0 # child nodes, like len(element.childNodes)
+        self.first = None # kind of the first child node ('text', 'cdata', ...)
+        self.first_value = None
+        self.text = [] # text node being read
+        self.elements = 0 # child elements
+        self.loose = False # non whitespace text or CDATA among the children
+
+    def add(self, kind, name, value):
+        """
+        adds a child node, turning repeated names into lists
+        """
+        self.count += 1
+        if self.count == 1:
+            self.first, self.first_value = kind, value
+
+        root = self.root
+        if name in root:
+            if isinstance(root[name], list):
+                root[name].append(value)
+            else:
+                root[name] = [root[name], value]
+        else:
+            root[name] = value
+
+    def flush_text(self):
+        """
+        ends the text node being read, whitespace only text is counted but not kept
+        """
+        if self.text:
+            value = u''.join(self.text)
+            self.text = []
+            if value.strip():
+                self.loose = True
+                self.add('text', '#text', value)
+            else:
+                self.count += 1
+                if self.count == 1:
+                    self.first, self.first_value = 'text', value
+
+    def value(self):
+        """
+        what the element turns into, see parse_xml_dom
+        """
+        if self.count == 1 and self.first == 'text':
+            content = self.first_value.strip()
+        else:
+            content = self.root
+
+        t = {}
+        if self.attributes:
+            t['attribute'] = self.attributes
+        if self.count:
+            if self.attributes:
+                t['meta'] = content
+            elif self.count == 1 and self.first == 'cdata':
+                t = self.first_value
+            else:
+                t = content
+
+        return t or None
+
+def _stream_xml(source, wrapper=None, encoding=None):
+    """
+    Runs expat over `source` (string or file like object) & returns the _Node of the document,
+    or of the `wrapper` element `source` gets wrapped in
+    """
+    document = _Node()
+    stack = [document]
+    cdata = []
+    closed = [] # top level elements
+
+    def start_element(name, attributes):
+        parent = stack[-1]
+        if parent.text:
+            parent.flush_text()
+        stack.append(_Node(attributes))
+
+    def end_element(name):
+        node = stack.pop()
+        if node.text:
+            node.flush_text()
+        parent = stack[-1]
+        if parent is document:
+            closed.append(node)
+        parent.elements += 1
+        parent.add('element', name, node.value())
+
+    def character_data(data):
+        if cdata:
+            if not cdata[-1]: # like minidom, only CDATA sections with data end the text before them
+                stack[-1].flush_text()
+            cdata[-1].append(data)
+        else:
+            stack[-1].text.append(data)
+
+    def start_cdata():
+        cdata.append([])
+
+    def end_cdata():
+        data = cdata.pop()
+        if data: # like minidom, empty CDATA sections leave no node
+            stack[-1].loose = True
+            stack[-1].add('cdata', '#cdata-section', u''.join(data))
+
+    def comment(data):
+        stack[-1].flush_text()
+        stack[-1].add('comment', '#comment', data)
+
+    def processing_instruction(target, data):
+        stack[-1].flush_text()
+        stack[-1].add('pi', target, data)
+
+    def doctype(name, *args):
+        stack[-1].add('doctype', name, None)
+
+    parser = expat.ParserCreate(encoding)
+    parser.buffer_text = True
+    parser.StartElementHandler = start_element
+    parser.EndElementHandler = end_element
+    parser.CharacterDataHandler = character_data
+    parser.StartCdataSectionHandler = start_cdata
+    parser.EndCdataSectionHandler = end_cdata
+    parser.CommentHandler = comment
+    parser.ProcessingInstructionHandler = processing_instruction
+    parser.StartDoctypeDeclHandler = doctype
+
+    try:
+        if hasattr(source, 'read'):
+            parser.ParseFile(source)
+        elif wrapper:
+            parser.Parse('<%s>' % wrapper)
+            parser.Parse(source)
+            parser.Parse('</%s>' % wrapper, True)
+        else:
+            parser.Parse(source, True)
+    except expat.ExpatError as e:
+        raise GatewayError("Error parsing XML: {0}".format(e))
+
+    return closed[0] if wrapper else document
+
+_XML_DECLARATION = re.compile(r'^\s*<\?xml(?:[^>]*?encoding=["\']([\w.:-]+)["\'])?[^>]*\?>')
+
+def parse_xml_response(response, wrapper='response'):
+    """
+    Parses a gateway response that may have more than one root element in a single pass:
+    it gets wrapped in a `wrapper` element, which is only kept when the response has no
+    single root. Gives the same result as trying parse_xml & retrying wrapped on failure.
+    """
+    body, encoding = response, None
+    if isinstance(body, unicode):
+        body, encoding = body.encode('utf-8'), 'utf-8'
+
+    declaration = _XML_DECLARATION.match(body)
+    if declaration:
+        body = body[declaration.end():]
+        encoding = encoding or declaration.group(1)
+
+    try:
+        node = _stream_xml(body, wrapper, encoding)
+    except GatewayError:
+        # things that can't be wrapped, like a doctype
+        return parse_xml(response)
+
+    if node.elements == 1 and not node.loose:
+        return node.root
+    return {unicode(wrapper): node.value()}
 
 def parse_xml(element):
+    """
+    Parse an XML API Response (string, file like object or xml.dom.minidom.Document). Returns the
+    result as dict or string depending on amount of child elements. Returns None in case of empty elements
+
+    Streams the XML through expat without building a DOM
+    """
+    if isinstance(element, xml.dom.minidom.Node):
+        return parse_xml_dom(element)
+
+    return _stream_xml(element).root
+
+def parse_xml_dom(element):
     """
     Parse an XML API Response xml.dom.minidom.Document. Returns the result as dict or string
     depending on amount of child elements. Returns None in case of empty elements
+
+    Builds the whole DOM, parse_xml gives the same result in a single streaming pass
     """
     if not isinstance(element, xml.dom.minidom.Node):
         try:
@@ -48,21 +274,23 @@ def parse_xml(element):
 
         if e.childNodes:
             if t.has_key('attribute'):
-                t['meta'] = parse_xml(e)
+                t['meta'] = parse_xml_dom(e)
             else:
                 if len(e.childNodes) == 1:
                     if e.firstChild.nodeType == xml.dom.Node.CDATA_SECTION_NODE:
                         t = e.firstChild.wholeText
                     else:
-                        t = parse_xml(e)
+                        t = parse_xml_dom(e)
                 else:
-                    t = parse_xml(e)
+                    t = parse_xml_dom(e)
 
         if not t:
             t = e.nodeValue
 
         if root.has_key(e.nodeName):
-            if not isinstance(root[e.nodeName], list):
+            if isinstance(root[e.nodeName], list):
+                tmp = root[e.nodeName]
+            else:
                 tmp = []
                 tmp.append(root[e.nodeName])
             tmp.append(t)
@@ -101,11 +329,17 @@ def is_valid_cvv(cc_cvv):
 
 def get_card_type(cc):
     """
-    Gets card type by using card number
+    Gets card type by using card number, looking up its IIN in CARD_TRIE
     """
-    for k, v in CARD_TYPES.items():
-        if re.match(v, cc):
-            return k
+    node, network = CARD_TRIE, None
+    for digit in cc: # walks the leading digits only, the trie is at most 4 deep
+        node = node.get(digit)
+        if node is None:
+            break
+        network = node.get(None, network)
+
+    if network and len(cc) in network[1] and cc.isdigit():
+        return network[0]
 
 def get_card_exp(month, year):
     """
@@ -0,0 +1,6 @@
+"""
+Local fake gateways speaking each gateway's protocol, to run the real client code
+(transports included) offline in tests, benchmarks & load tests
+"""
+from server import FakeGateway, CERT_FILE
+from fakes import FakeAuthorizeNet, FakePlugnPay, FakeUSAePay, FakeInnovativeGW, FakeFirstDataLegacy, FakeFirstData
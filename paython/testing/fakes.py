@@ -0,0 +1,214 @@
+"""fakes.py - fake gateways answering in each gateway's own format"""
+
+import hmac
+import json
+import time
+import base64
+import urllib
+import urlparse
+import xml.dom.minidom
+from hashlib import sha1
+
+from server import FakeGateway, CERT_FILE
+
+def form_fields(body):
+    return dict(urlparse.parse_qsl(body, keep_blank_values=True))
+
+def last4(number):
+    return number[-4:] if number else ''
+
+def auth_code(trans_id):
+    return 'A%05d' % (trans_id % 100000)
+
+class FormPostFake(FakeGateway):
+    """
+    Base of the gateways taking url-encoded POSTs, pointed at by swapping the gateway's API_URI
+    """
+    def attach(self, gateway):
+        if isinstance(gateway.API_URI, dict):
+            gateway.API_URI = dict.fromkeys(gateway.API_URI, self.url)
+        else:
+            gateway.API_URI = self.url
+
+class FakeAuthorizeNet(FormPostFake):
+    """
+    Authorize.net AIM: answers with the delimited response list (x_delim_char separated)
+    """
+    def respond(self, path, headers, body, declined):
+        fields = form_fields(body)
+        delimiter = fields.get('x_delim_char', ',')
+        trans_id = self.next_id()
+        if not fields.get('x_login') or not fields.get('x_tran_key'):
+            code, reason, text, auth, avs = '3', '13', 'The merchant login ID or password is invalid or the account is inactive.', '', 'P'
+        elif declined:
+            code, reason, text, auth, avs = '2', '2', 'This transaction has been declined.', '', 'N'
+        else:
+            code, reason, text, auth, avs = '1', '1', 'This transaction has been approved.', auth_code(trans_id), 'Y'
+
+        response = [''] * 55
+        response[:13] = [code, '1', reason, text, auth, avs, str(trans_id), fields.get('x_invoice_num', ''),
+                         fields.get('x_description', ''), fields.get('x_amount', ''), 'CC',
+                         fields.get('x_type', 'AUTH_CAPTURE').lower(), '']
+        response[13:24] = [fields.get(key, '') for key in ('x_first_name', 'x_last_name', 'x_company', 'x_address', 'x_city',
+                                                          'x_state', 'x_zip', 'x_country', 'x_phone', 'x_fax', 'x_email')]
+        response[38] = 'M' if fields.get('x_card_code') else ''
+        response[50] = 'XXXX' + last4(fields.get('x_card_num'))
+        return 200, 'text/plain', delimiter.join(response)
+
+class FakePlugnPay(FormPostFake):
+    """
+    PlugnPay remote client: answers with & separated, url-quoted key=value pairs
+    """
+    def respond(self, path, headers, body, declined):
+        fields = form_fields(body)
+        trans_id = self.next_id()
+        response = [('orderID', fields.get('orderID') or str(trans_id)), ('card-amount', fields.get('card-amount', '')),
+                    ('authtype', fields.get('authtype', 'authpostauth')), ('mode', fields.get('mode', ''))]
+        if not fields.get('publisher-name'):
+            response += [('FinalStatus', 'problem'), ('sresp', 'E'), ('resp-code', 'P98'), ('MErrMsg', 'Missing merchant/publisher name')]
+        elif declined:
+            response += [('FinalStatus', 'badcard'), ('sresp', 'D'), ('resp-code', '05'), ('avs-code', 'N'), ('MErrMsg', 'Declined')]
+        else:
+            response += [('FinalStatus', 'success'), ('sresp', 'A'), ('resp-code', '00'), ('auth-code', auth_code(trans_id)),
+                         ('avs-code', 'Y'), ('MErrMsg', '')]
+        return 200, 'text/html', '&'.join('%s=%s' % (urllib.quote(key), urllib.quote(value)) for key, value in response)
+
+class FakeUSAePay(FormPostFake):
+    """
+    USAePay gateway API: answers with an url-encoded UM* query string
+    """
+    def respond(self, path, headers, body, declined):
+        fields = form_fields(body)
+        trans_id = self.next_id()
+        response = [('UMversion', '2.9'), ('UMrefNum', str(trans_id)), ('UMauthAmount', fields.get('UMamount', ''))]
+        if not fields.get('UMkey'):
+            response += [('UMstatus', 'Error'), ('UMresult', 'E'), ('UMerror', 'Specified source key not found.'), ('UMerrorcode', '10001')]
+        elif declined:
+            response += [('UMstatus', 'Declined'), ('UMresult', 'D'), ('UMerror', 'Card Declined'), ('UMavsResult', 'No Match'),
+                         ('UMcvv2ResultCode', 'N')]
+        else:
+            response += [('UMstatus', 'Approved'), ('UMresult', 'A'), ('UMerror', 'Approved'), ('UMauthCode', auth_code(trans_id)),
+                         ('UMavsResult', 'Address: Match & 5 Digit Zip: Match'), ('UMcvv2ResultCode', 'M')]
+        return 200, 'text/html', urllib.urlencode(response)
+
+class FakeInnovativeGW(FormPostFake):
+    """
+    Innovative Gateway (Intuit): answers with an url-encoded query string, `approval` only when approved
+    """
+    def respond(self, path, headers, body, declined):
+        fields = form_fields(body)
+        trans_id = self.next_id()
+        response = [('anatransid', str(trans_id)), ('ordernumber', str(trans_id)), ('fulltotal', fields.get('fulltotal', '')),
+                    ('trantype', fields.get('trantype', ''))]
+        if not fields.get('username') or not fields.get('pw'):
+            response.append(('error', 'Invalid username or password'))
+        elif declined:
+            response += [('error', 'DECLINED:1000590001:DECLINED'), ('avs', 'N')]
+        else:
+            response += [('approval', auth_code(trans_id)), ('messageid', str(trans_id)), ('avs', 'Y')]
+        return 200, 'text/html', urllib.urlencode(response)
+
+class FakeFirstDataLegacy(FakeGateway):
+    """
+    First Data legacy (LinkPoint): XML orders POSTed over HTTPS with a client certificate,
+    answered with the root-less r_* elements
+    """
+    client_certificate = True
+
+    def __init__(self, **options):
+        options.setdefault('tls', True)
+        FakeGateway.__init__(self, **options)
+
+    def respond(self, path, headers, body, declined):
+        trans_id = self.next_id()
+        try:
+            order = xml.dom.minidom.parseString(body)
+        except Exception:
+            return 200, 'text/xml', self.answer('FAILURE', 'SGS-002000: The server encountered an error.', '', trans_id)
+
+        oid = self.text(order, 'oid') or 'A-%d' % trans_id
+        if not self.text(order, 'configfile'):
+            return 200, 'text/xml', self.answer('FAILURE', 'SGS-020005: Error (Merchant config file is missing, empty or cannot be read).', oid, trans_id)
+        if declined:
+            return 200, 'text/xml', self.answer('DECLINED', 'SGS-005005: Duplicate transaction.', oid, trans_id)
+        return 200, 'text/xml', self.answer('APPROVED', '', oid, trans_id)
+
+    @staticmethod
+    def text(document, tag):
+        elements = document.getElementsByTagName(tag)
+        if elements and elements[0].firstChild is not None:
+            return elements[0].firstChild.data
+        return ''
+
+    def answer(self, approved, error, oid, trans_id):
+        fields = [('r_csp', 'CSI'), ('r_time', time.strftime('%a %b %d %H:%M:%S %Y')), ('r_ref', '%010d' % trans_id),
+                  ('r_error', error), ('r_ordernum', oid), ('r_message', approved), ('r_code', '%s|%d' % (auth_code(trans_id), trans_id)),
+                  ('r_tdate', str(int(time.time()))), ('r_score', ''), ('r_authresponse', ''), ('r_approved', approved),
+                  ('r_avs', 'YYYM' if approved == 'APPROVED' else '')]
+        return ''.join('<%s>%s</%s>' % (tag, value, tag) for tag, value in fields)
+
+    def attach(self, gateway):
+        gateway.api_host = '127.0.0.1'
+        gateway.special_ssl = dict(gateway.special_ssl, port=self.port, key_file=CERT_FILE, cert_file=CERT_FILE, verify=False)
+
+class FakeFirstData(FakeGateway):
+    """
+    First Data Global Gateway e4 JSON API (v14), checking the X-GGe4-Content-SHA1 digest
+    & the HMAC Authorization header against `key_id` & `hmac_key` like the real one does
+    """
+    PATH = '/transaction/v14'
+    UNAUTHORIZED = 'Unauthorized Request. Bad or missing credentials.'
+
+    def __init__(self, key_id, hmac_key, **options):
+        options.setdefault('tls', True)
+        FakeGateway.__init__(self, **options)
+        self.key_id = key_id
+        self.hmac_key = hmac_key
+
+    def signed(self, headers, body):
+        """
+        True when the request carries the right content digest & signature
+        """
+        digest = sha1(body).hexdigest()
+        date = headers.getheader('x-gge4-date', '')
+        if headers.getheader('x-gge4-content-sha1') != digest or not date:
+            return False
+        message = 'POST\n%s\n%s\n%s\n%s' % (headers.getheader('content-type', ''), digest, date, self.PATH)
+        signature = base64.b64encode(hmac.new(self.hmac_key, message, sha1).digest())
+        return headers.getheader('authorization') == 'GGE4_API %s:%s' % (self.key_id, signature)
+
+    def respond(self, path, headers, body, declined):
+        if path != self.PATH:
+            return 404, 'text/plain', 'Not Found'
+        if not self.signed(headers, body):
+            return 401, 'text/plain', self.UNAUTHORIZED
+        try:
+            fields = json.loads(body)
+        except ValueError:
+            return 400, 'text/plain', 'Malformed JSON'
+
+        trans_id = self.next_id()
+        approved = not declined
+        response = {
+            'transaction_approved': 1 if approved else 0,
+            'transaction_error': 0,
+            'transaction_type': fields.get('transaction_type'),
+            'transaction_tag': trans_id,
+            'authorization_num': auth_code(trans_id) if approved else '',
+            'amount': fields.get('amount'),
+            'gateway_id': fields.get('gateway_id'),
+            'cardholder_name': fields.get('cardholder_name'),
+            'cc_number': '############' + last4(fields.get('cc_number')),
+            'cc_expiry': fields.get('cc_expiry'),
+            'bank_resp_code': '100' if approved else '605',
+            'bank_message': 'Approved' if approved else 'Invalid Expiration Date',
+            'exact_resp_code': '00',
+            'exact_message': 'Transaction Normal',
+            'sequence_no': '%06d' % trans_id,
+        }
+        return 201, 'application/json', json.dumps(response)
+
+    def attach(self, gateway):
+        # the demo endpoint, which doesn't check the server certificate
+        gateway.debug = True
+        gateway.url = '127.0.0.1:%d' % self.port
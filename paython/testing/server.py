@@ -0,0 +1,195 @@
+"""server.py - threaded local HTTP(S) server the fake gateways are built on"""
+
+import os
+import ssl
+import time
+import random
+import threading
+import BaseHTTPServer
+import SocketServer
+
+# self signed certificate & key for localhost/127.0.0.1, served by the fake gateways over
+# HTTPS & handed to gateways that authenticate with a client certificate (FirstDataLegacy)
+CERT_FILE = os.path.join(os.path.dirname(__file__), 'localhost.pem')
+
+class Handler(BaseHTTPServer.BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    # headers go out one write at a time, Nagle would hold each answer back for the client's delayed ACK
+    disable_nagle_algorithm = True
+
+    def do_POST(self):
+        length = int(self.headers.getheader('content-length', 0))
+        self.server.exchange(self, self.rfile.read(length))
+
+    def log_message(self, *args):
+        pass
+
+class FakeGateway(SocketServer.ThreadingMixIn, BaseHTTPServer.HTTPServer):
+    """
+    Local stand-in for a payment gateway: answers on a free port of 127.0.0.1 the way the
+    real gateway would, so the client code runs for real without a sandbox account.
+
+    - latency: seconds every answer is held back, or a (low, high) range picked from at random
+    - decline_rate: share of the transactions that get declined (0 to 1)
+    - error_rate: share of the requests answered with an HTTP 500
+    - drop_rate: share of the requests whose connection gets closed without an answer
+    - tls: serve HTTPS with CERT_FILE
+    - seed: seeds the random picks, so a run plays out the same every time
+
+        with FakeAuthorizeNet(latency=(0.05, 0.2), decline_rate=0.1) as server:
+            server.attach(api)
+            api.auth(...)
+
+    Subclasses answer in their gateway's format via respond() & point gateways at themselves in attach().
+    """
+    daemon_threads = True
+    request_queue_size = 128
+
+    # whether clients have to present a certificate (signed by CERT_FILE)
+    client_certificate = False
+
+    def __init__(self, latency=0, decline_rate=0, error_rate=0, drop_rate=0, tls=False, seed=None):
+        BaseHTTPServer.HTTPServer.__init__(self, ('127.0.0.1', 0), Handler)
+        self.latency = latency
+        self.decline_rate = decline_rate
+        self.error_rate = error_rate
+        self.drop_rate = drop_rate
+        self.tls = tls
+        self.context = self.ssl_context() if tls else None
+
+        self.random = random.Random(seed)
+        self._lock = threading.Lock()
+        self._ids = 0
+        # what got answered so far
+        self.requests = 0
+        self.declined = 0
+        self.errors = 0
+        self.dropped = 0
+        # connections accepted, keep-alive clients sending several requests down each
+        self.connections = 0
+        # requests being answered right now & the most there ever were at once
+        self.in_flight = 0
+        self.peak = 0
+
+    def ssl_context(self):
+        context = ssl.SSLContext(ssl.PROTOCOL_SSLv23)
+        context.load_cert_chain(CERT_FILE)
+        if self.client_certificate:
+            context.verify_mode = ssl.CERT_REQUIRED
+            context.load_verify_locations(CERT_FILE)
+        return context
+
+    @property
+    def port(self):
+        return self.server_address[1]
+
+    @property
+    def url(self):
+        return '%s://127.0.0.1:%d/' % ('https' if self.tls else 'http', self.port)
+
+    def start(self):
+        """
+        Serves from a daemon thread, returns the server
+        """
+        thread = threading.Thread(target=self.serve_forever, args=(0.05,)) # quick to stop
+        thread.daemon = True
+        thread.start()
+        return self
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.stop()
+        return False
+
+    def finish_request(self, request, client_address):
+        with self._lock:
+            self.connections += 1
+        # the TLS handshake runs on the request's own thread, not the accepting one
+        if self.context is not None:
+            try:
+                request = self.context.wrap_socket(request, server_side=True)
+            except (ssl.SSLError, IOError):
+                return
+        BaseHTTPServer.HTTPServer.finish_request(self, request, client_address)
+
+    def handle_error(self, request, client_address):
+        pass # clients hanging up (or dropped on purpose) are business as usual here
+
+    def next_id(self):
+        """
+        A new transaction id, counting up from 1
+        """
+        with self._lock:
+            self._ids += 1
+            return self._ids
+
+    def delay(self):
+        latency = self.latency
+        if isinstance(latency, (tuple, list)):
+            with self._lock:
+                return self.random.uniform(*latency)
+        return latency
+
+    def exchange(self, handler, body):
+        """
+        Answers one request, injecting the configured latency, drops, errors & declines
+        """
+        with self._lock:
+            self.in_flight += 1
+            self.peak = max(self.peak, self.in_flight)
+        try:
+            self._exchange(handler, body)
+        finally:
+            with self._lock:
+                self.in_flight -= 1
+
+    def _exchange(self, handler, body):
+        with self._lock:
+            self.requests += 1
+            dropped = self.random.random() < self.drop_rate
+            error = not dropped and self.random.random() < self.error_rate
+            declined = self.random.random() < self.decline_rate
+            if dropped:
+                self.dropped += 1
+            elif error:
+                self.errors += 1
+
+        delay = self.delay()
+        if delay:
+            time.sleep(delay)
+
+        if dropped:
+            handler.close_connection = 1
+            return
+        if error:
+            status, content_type, response = 500, 'text/html', '<html><body>Internal Server Error</body></html>'
+        else:
+            status, content_type, response = self.respond(handler.path, handler.headers, body, declined)
+            if declined and status < 300:
+                with self._lock:
+                    self.declined += 1
+
+        handler.send_response(status)
+        handler.send_header('Content-Type', content_type)
+        handler.send_header('Content-Length', str(len(response)))
+        handler.end_headers()
+        handler.wfile.write(response)
+
+    def respond(self, path, headers, body, declined):
+        """
+        Returns the (status, content type, body) the gateway answers the request `body`
+        posted to `path` with, declining the transaction if `declined`
+        """
+        raise NotImplementedError
+
+    def attach(self, gateway):
+        """
+        Points a gateway instance at this server
+        """
+        raise NotImplementedError
@@ -27,6 +27,7 @@ setup(
         # If any package contains *.txt or *.rst files, include them:
         '': ['*.txt', '*.rst'],
         'paython.keys': ['*.pem-file'],
+        'paython.testing': ['*.pem'],
     },
     long_description=read('README.rst'),
     classifiers=[
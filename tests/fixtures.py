@@ -0,0 +1,30 @@
+"""fixtures.py - the canned answers, card & billing info the gateway tests share"""
+
+from paython.lib.cc import CreditCard
+from paython.lib.transport import Response
+
+# LinkPoint (FirstDataLegacy) approving a transaction
+LINKPOINT_APPROVED = '<r_approved>APPROVED</r_approved><r_message>APPROVED</r_message><r_ordernum>A-1</r_ordernum>'
+
+# Authorize.net AIM approving a transaction
+AUTHORIZE_NET_APPROVED = '1;1;1;This transaction has been approved.;AUTH01;Y;2155779779;;;1.00;;;;;;;;;;;;;;;;;;;;;;;;;;;;;;;XXXX1111'
+
+BILLING_INFO = {'address': '123 Main St', 'city': 'Austin', 'state': 'TX', 'zipcode': '78701'}
+
+class CannedPool(object):
+    """answers every request with `body` (LinkPoint approving it by default), keeping the last body sent"""
+    def __init__(self, body=LINKPOINT_APPROVED):
+        self.body = body
+        self.sent = None
+
+    def send(self, prepared):
+        self.sent = prepared.body
+        return Response(200, 'OK', {}, self.body, 0.05)
+
+def credit_card(cvv='123'):
+    """a test visa"""
+    return CreditCard(number='4111111111111111', exp_mo='12', exp_yr='2030', full_name='John Doe', cvv=cvv)
+
+def billing_info():
+    """a fresh copy of BILLING_INFO"""
+    return dict(BILLING_INFO)
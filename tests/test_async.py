@@ -0,0 +1,97 @@
+"""test_async.py: testing the non-blocking gateway calls"""
+import time
+import threading
+
+from paython.lib.cc import CreditCard
+from paython.lib.aio import AsyncTransport, ThreadTransports
+from paython.exceptions import GatewayError
+from paython.gateways.authorize_net import AuthorizeNet
+
+from nose.tools import assert_equals, assert_true, raises, with_setup
+
+from paython.testing import FakeAuthorizeNet
+
+SERVER = None
+
+def setup():
+    """starting a local Authorize.net, answering after a bit of network latency"""
+    global SERVER
+    SERVER = FakeAuthorizeNet(latency=0.2).start()
+
+def teardown():
+    """stopping the local server"""
+    SERVER.stop()
+
+def gateway():
+    """an AuthorizeNet gateway talking to the local server"""
+    api = AuthorizeNet()
+    SERVER.attach(api)
+    api.async_transport = AsyncTransport()
+    return api
+
+@with_setup(setup, teardown)
+def test_auth_async():
+    """testing that many auth calls run concurrently on one thread"""
+    api = gateway()
+    credit_card = CreditCard(number='4111111111111111', exp_mo='12', exp_yr='2030', full_name='John Doe')
+
+    start = time.time()
+    futures = [api.auth_async('%s.00' % i, credit_card) for i in range(20)]
+    assert_equals(api.async_transport.pending(), 20)
+
+    api.async_transport.run()
+    assert_true(time.time() - start < 2) # 20 x 0.2s if they ran one by one
+
+    responses = [future.result() for future in futures]
+    assert_true(all(response['approved'] for response in responses))
+    assert_equals(len(set(response['trans_id'] for response in responses)), 20)
+
+    assert_equals(SERVER.requests, 20)
+
+@with_setup(setup, teardown)
+def test_settle_async():
+    """testing a single async call resolved through result()"""
+    response = gateway().settle_async('1.00', '2155779779').result()
+    assert_equals(response['response_text'], 'This transaction has been approved.')
+    assert_true(0.15 < response['timing']['ttfb'] < response['timing']['total'])
+
+@raises(GatewayError)
+def test_connection_refused():
+    """testing that network errors surface from result()"""
+    api = AuthorizeNet()
+    api.API_URI = {'live': 'http://127.0.0.1:1/', 'test': 'http://127.0.0.1:1/'}
+    api.async_transport = AsyncTransport()
+    api.void_async('2155779779').result()
+
+@with_setup(setup, teardown)
+def test_shared_transport():
+    """testing that threads can wait on the calls of one shared transport side by side"""
+    api = gateway()
+    credit_card = CreditCard(number='4111111111111111', exp_mo='12', exp_yr='2030', full_name='John Doe')
+    futures = [api.auth_async('%s.00' % i, credit_card) for i in range(1, 21)]
+    responses = []
+
+    def wait(futures):
+        responses.extend(future.result() for future in futures)
+
+    threads = [threading.Thread(target=wait, args=(futures[i::4],)) for i in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert_equals(len(responses), 20)
+    assert_true(all(response['approved'] for response in responses))
+    assert_equals(api.async_transport.pending(), 0)
+
+def test_thread_transports():
+    """testing that every thread gets its own transport"""
+    transports = ThreadTransports()
+    mine = transports.transport()
+    theirs = []
+    thread = threading.Thread(target=lambda: theirs.append(transports.transport()))
+    thread.start()
+    thread.join()
+
+    assert_true(mine is transports.transport())
+    assert_true(theirs[0] is not mine)
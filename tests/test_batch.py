@@ -0,0 +1,67 @@
+"""test_batch.py: testing the concurrent batch executor"""
+from paython.batch import run_batch
+from paython.exceptions import MissingDataError
+from paython.testing import FakeAuthorizeNet
+from paython.gateways.authorize_net import AuthorizeNet
+
+from nose.tools import assert_equals, assert_true, assert_false
+
+from tests.fixtures import credit_card
+
+def gateway(server):
+    """an AuthorizeNet gateway talking to `server`"""
+    api = AuthorizeNet(username='login', password='key')
+    server.attach(api)
+    return api
+
+def operations(api, count):
+    """auth operations for `count` different amounts on `api`"""
+    card = credit_card()
+    for i in range(count):
+        yield api, 'auth', ('%s.00' % i, card)
+
+def test_ordered():
+    """testing that results come back in submission order with the right responses, run side by side"""
+    with FakeAuthorizeNet(latency=0.05) as server:
+        results = list(run_batch(operations(gateway(server), 40), workers=10, per_gateway=10))
+        assert_true(server.peak > 1)
+
+    assert_equals([result.index for result in results], range(40))
+    for i, result in enumerate(results):
+        assert_true(result.ok and result.response['approved'])
+        assert_equals(result.args[0], '%s.00' % i)
+    assert_equals(len(set(result.response['trans_id'] for result in results)), 40)
+
+def test_as_completed():
+    """testing that every operation comes back exactly once when unordered"""
+    with FakeAuthorizeNet() as server:
+        results = list(run_batch(operations(gateway(server), 20), workers=5, ordered=False))
+    assert_equals(sorted(result.index for result in results), range(20))
+
+def test_per_gateway_cap():
+    """testing that the per gateway cap limits concurrency"""
+    with FakeAuthorizeNet(latency=0.02) as server:
+        results = list(run_batch(operations(gateway(server), 6), workers=6, per_gateway=1))
+        assert_equals(server.peak, 1)
+    assert_true(all(result.ok for result in results))
+
+def test_capped_gateway_does_not_block():
+    """testing that operations waiting on a capped gateway don't hold up other gateways"""
+    with FakeAuthorizeNet(latency=0.3) as slow_server:
+        with FakeAuthorizeNet() as fast_server:
+            slow, fast = gateway(slow_server), gateway(fast_server)
+            batch = list(operations(slow, 2)) + list(operations(fast, 1))
+            results = list(run_batch(batch, workers=2, per_gateway=1, ordered=False))
+
+    # the second slow one gets set aside instead of tying up the other worker
+    assert_true(results[0].gateway is fast)
+    assert_equals(sorted(result.index for result in results), [0, 1, 2])
+
+def test_errors():
+    """testing that a failing operation does not stop the batch"""
+    with FakeAuthorizeNet() as server:
+        results = list(run_batch([(AuthorizeNet(), 'auth', ('1.00',))] + list(operations(gateway(server), 2))))
+
+    assert_false(results[0].ok)
+    assert_true(isinstance(results[0].error, MissingDataError))
+    assert_true(results[1].ok and results[2].ok)
@@ -0,0 +1,48 @@
+"""test_bulk.py: testing the NumPy bulk card validation"""
+import random
+from datetime import datetime
+
+from paython.lib.utils import is_valid_cc, is_valid_exp, get_card_type
+
+from nose.plugins.skip import SkipTest
+from nose.tools import assert_equals
+
+try:
+    from paython.lib.bulk import validate_cards
+except Exception:
+    validate_cards = None
+
+TEST_CARDS = ['4111111111111111', '378282246310005', '5555555555554444', '6011111111111117', '30569309025904',
+              '4222222222222', '4111111111111112', '411111111111111a', '1234', '',
+              '2223000048400011', '371449635398431', '3566002020360505', '6200000000000005', '6759649826438453',
+              '4111111111111111110', '5018000000000009', '3095000000000000']
+
+def setup():
+    if validate_cards is None:
+        raise SkipTest('numpy is not available')
+
+def test_matches_single_card_checks():
+    """testing that the bulk checks agree with the one card at a time ones"""
+    rand = random.Random(1129)
+    numbers = TEST_CARDS + [''.join(rand.choice('0123456789') for i in range(rand.choice((12, 13, 14, 15, 16, 19))))
+                            for n in range(2000)]
+    numbers = [number for number in numbers if number] # is_valid_cc('') says True
+    months = [rand.randint(1, 12) for number in numbers]
+    years = [rand.randint(2000, 2040) for number in numbers]
+
+    result = validate_cards(numbers, months, years)
+
+    assert_equals(list(result.luhn), [bool(is_valid_cc(number)) for number in numbers])
+    assert_equals(list(result.expiry), [is_valid_exp(month, year) for month, year in zip(months, years)])
+    assert_equals(list(result.types), [get_card_type(number) for number in numbers])
+    assert_equals(list(result.valid), [bool(a and b) for a, b in zip(result.luhn, result.expiry)])
+
+def test_cvv_and_strings():
+    """testing cvvs & string months/years"""
+    now = datetime(2020, 6, 15)
+    result = validate_cards(['4111111111111111'] * 4, ['06', '05', '13', '12'], ['2020', '2020', '2030', '2019'],
+                            cvvs=['123', '1234', '12', None], now=now)
+
+    assert_equals(list(result.expiry), [True, False, False, False])
+    assert_equals(list(result.cvv), [True, True, False, False])
+    assert_equals(list(result.valid), [True, False, False, False])
@@ -0,0 +1,165 @@
+"""test_core.py: testing per transaction request state"""
+import urlparse
+import threading
+
+from paython.lib.cc import CreditCard
+from paython.lib.timing import PHASES
+from paython.exceptions import RequestError
+from paython.gateways.authorize_net import AuthorizeNet
+from paython.gateways.firstdata_legacy import FirstDataLegacy
+
+from nose.tools import assert_equals, assert_true, assert_false, raises, with_setup
+
+from paython.testing import FakeAuthorizeNet
+
+SERVER = None
+
+class Recording(FakeAuthorizeNet):
+    """keeps the fields of every request it answers"""
+    def __init__(self, **options):
+        FakeAuthorizeNet.__init__(self, **options)
+        self.sent = []
+
+    def respond(self, path, headers, body, declined):
+        self.sent.append(dict(urlparse.parse_qsl(body)))
+        return FakeAuthorizeNet.respond(self, path, headers, body, declined)
+
+def setup():
+    """starting a local Authorize.net, answering after a bit of latency"""
+    global SERVER
+    SERVER = Recording(latency=0.05).start()
+
+def teardown():
+    """stopping the local server"""
+    SERVER.stop()
+
+def gateway(**kwargs):
+    """an AuthorizeNet gateway talking to the local server"""
+    api = AuthorizeNet(**kwargs)
+    SERVER.attach(api)
+    return api
+
+def sent():
+    """the fields of every request the local server got"""
+    return SERVER.sent
+
+@with_setup(setup, teardown)
+def test_no_leaks_between_transactions():
+    """testing that fields of one transaction do not end up in the next"""
+    api = gateway()
+    credit_card = CreditCard(number='4111111111111111', exp_mo='12', exp_yr='2030', full_name='John Doe')
+    api.auth('1.00', credit_card, is_partial=True, split_id='123456')
+    api.settle('1.00', '2155779779')
+
+    auth, settle = sent()
+    assert_equals(auth['x_split_tender_id'], '123456')
+    assert_false('x_split_tender_id' in settle)
+    assert_false('x_card_num' in settle)
+    assert_equals(settle['x_login'], 'test')
+
+@with_setup(setup, teardown)
+def test_no_leaks_between_instances():
+    """testing that config of one gateway instance does not end up in another"""
+    gateway(username='first', test='live_test').void('2155779779')
+    gateway(username='second').void('2155779779')
+
+    first, second = sent()
+    assert_equals((first['x_login'], first['x_test_request']), ('first', 'TRUE'))
+    assert_equals(second['x_login'], 'second')
+    assert_false('x_test_request' in second)
+
+@with_setup(setup, teardown)
+def test_timing():
+    """testing that every response carries its numeric per phase timing"""
+    api = gateway()
+    credit_card = CreditCard(number='4111111111111111', exp_mo='12', exp_yr='2030', full_name='John Doe')
+    timing = api.auth('1.00', credit_card)['timing']
+
+    assert_equals(sorted(timing), sorted(PHASES + ('total',)))
+    assert_true(all(isinstance(seconds, float) for seconds in timing.values()))
+    assert_true(timing['ttfb'] >= 0.04) # the server answers after 0.05s
+    assert_true(timing['standardize'] > 0 and timing['parse'] >= 0)
+    assert_true(abs(timing['total'] - sum(timing[phase] for phase in PHASES)) < 1e-9)
+
+    assert_true(api.void('2155779779')['timing'] is not timing)
+
+@with_setup(setup, teardown)
+def test_shared_instance():
+    """testing that threads sharing one gateway instance get their own responses"""
+    api = gateway()
+    credit_card = CreditCard(number='4111111111111111', exp_mo='12', exp_yr='2030', full_name='John Doe')
+    responses = {}
+
+    def auth(i):
+        responses[i] = api.auth('%s.00' % i, credit_card, invoice_num=str(i))
+
+    threads = [threading.Thread(target=auth, args=(i,)) for i in range(20)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    for i in range(20):
+        assert_equals(responses[i]['invoice_number'], str(i))
+    assert_equals(sorted(request['x_amount'] for request in sent()), sorted('%s.00' % i for i in range(20)))
+
+def test_xml_transactions():
+    """testing that every XML transaction starts from its own document"""
+    api = FirstDataLegacy(username='12345')
+    with api.transaction():
+        api.set('order/payment/chargetotal', '1.00')
+        first = api.request_xml()
+    with api.transaction():
+        second = api.request_xml()
+
+    assert_true('<configfile>12345</configfile>' in first and '<configfile>12345</configfile>' in second)
+    assert_true('chargetotal' in first)
+    assert_false('chargetotal' in second)
+
+@raises(RequestError)
+def test_set_outside_transaction():
+    """testing that fields can only be set while building a transaction"""
+    AuthorizeNet().set('x_amount', '1.00')
+
+def test_static_body():
+    """testing that static fields are encoded once & put in front of the transaction's fields"""
+    api = AuthorizeNet(username='login', password='key')
+    static_body = api.static_body()
+    with api.transaction():
+        api.set('x_amount', '1.00')
+        body = api.current_request().encode()
+
+    assert_true(api.static_body() is static_body)
+    assert_equals(body, '%s&x_amount=1.00' % static_body)
+    assert_equals(dict(urlparse.parse_qsl(body))['x_delim_char'], ';')
+
+    api.set_static('x_test_request', 'TRUE')
+    assert_true('x_test_request=TRUE' in api.static_body())
+
+def test_static_override():
+    """testing that a transaction can still override or unset a static field"""
+    api = AuthorizeNet(username='login', password='key')
+    with api.transaction():
+        api.set('x_version', '3.0')
+        api.unset('x_delim_data')
+        fields = dict(urlparse.parse_qsl(api.current_request().encode()))
+    with api.transaction():
+        untouched = dict(urlparse.parse_qsl(api.current_request().encode()))
+
+    assert_equals(fields['x_version'], '3.0')
+    assert_false('x_delim_data' in fields)
+    assert_equals((untouched['x_version'], untouched['x_delim_data']), ('3.1', 'TRUE'))
+
+def test_redacted_params():
+    """testing that logged params star out the card & credentials unless raw logging is asked for"""
+    api = AuthorizeNet(username='login', password='key')
+    credit_card = CreditCard(number='4111111111111111', exp_mo='12', exp_yr='2030', full_name='John Doe', cvv='123')
+    with api.transaction():
+        api.use_credit_card(credit_card)
+        redacted = dict(urlparse.parse_qsl(api.params()))
+        api.raw_logging = True
+        raw = dict(urlparse.parse_qsl(api.params()))
+
+    assert_equals((redacted['x_card_num'], redacted['x_card_code'], redacted['x_tran_key']), ('************1111', '***', '***'))
+    assert_equals(redacted['x_login'], 'login')
+    assert_equals((raw['x_card_num'], raw['x_card_code'], raw['x_tran_key']), ('4111111111111111', '123', 'key'))
@@ -2,7 +2,7 @@ from datetime import datetime
 from dateutil.relativedelta import relativedelta
 
 from paython.lib.cc import CreditCard
-from paython.exceptions import DataValidationError
+from paython.exceptions import DataValidationError, MissingDataError
 
 from nose.tools import assert_equals, assert_false, assert_true, with_setup, raises
 
@@ -177,3 +177,56 @@ def test_exp_styled():
     # checking if our str() method (or repr()) is ok
     final_str = '<CreditCard -- John Doe, visa, ************1111, expires: %s/%s --extra: %s>' % (NEXT_YEAR.strftime('%m'), NEXT_YEAR.strftime('%Y'), NEXT_YEAR.strftime('%y'))
     assert_equals(str(credit_card), final_str)
+
+@with_setup(setup, teardown)
+def test_lazy_fields():
+    """testing that derived fields are cached & follow changes to the number, exp_date keeping the year the card was created with"""
+    credit_card = CreditCard(
+            number = '4111111111111111',
+            exp_mo = '12',
+            exp_yr = '2030',
+            first_name = 'John',
+            last_name = 'Doe',
+    )
+
+    assert_false(hasattr(credit_card, '__dict__'))
+    assert_equals(credit_card.full_name, 'John Doe')
+    assert_equals(credit_card.exp_date, '12/2030')
+
+    CreditCard.FINGERPRINT_KEY = 'test secret'
+    try:
+        assert_true(credit_card.fingerprint is credit_card.fingerprint)
+
+        fingerprint = credit_card.fingerprint
+        credit_card.number = '5555555555554444'
+        credit_card.exp_year = '30'
+        assert_equals((credit_card.card_type, credit_card.safe_num, credit_card.exp_date), ('mc', '************4444', '12/2030'))
+        assert_true(fingerprint != credit_card.fingerprint)
+    finally:
+        CreditCard.FINGERPRINT_KEY = None
+
+def test_two_digit_year_style():
+    """testing that a gateway cutting exp_year down to 2 digits leaves exp_date alone"""
+    credit_card = CreditCard(number='4111111111111111', exp_mo='12', exp_yr='2030', full_name='John Doe')
+    credit_card._exp_yr_style = True
+    credit_card.exp_year = credit_card.exp_year[-2:] # what Gateway.use_credit_card does
+    assert_equals((credit_card.exp_year, credit_card.exp_date), ('30', '12/2030'))
+
+@raises(MissingDataError)
+def test_fingerprint_key():
+    """testing that fingerprints need a key of your own"""
+    CreditCard(number='4111111111111111', exp_mo='12', exp_yr='2030', full_name='John Doe').fingerprint
+
+@with_setup(setup, teardown)
+def test_fields():
+    """testing the field iteration gateways use"""
+    credit_card = CreditCard(
+            number = '4111111111111111',
+            exp_mo = '12',
+            exp_yr = '2030',
+            full_name = 'John Doe',
+    )
+
+    assert_equals(dict(credit_card.fields()), {'full_name': 'John Doe', 'number': '4111111111111111', 'exp_month': '12',
+                                               'exp_year': '2030', 'exp_date': '12/2030', 'card_type': 'visa'})
+    assert_equals(list(credit_card.fields(('number', 'verification_value'))), [('number', '4111111111111111')])
@@ -0,0 +1,69 @@
+"""test_fakes.py: testing the real gateways against the fake gateway servers"""
+import time
+
+from paython.lib.aio import AsyncTransport
+from paython.lib.transport import ConnectionPool
+from paython.exceptions import RequestError
+from paython.testing import FakeAuthorizeNet, FakePlugnPay, FakeUSAePay, FakeInnovativeGW, FakeFirstDataLegacy, FakeFirstData
+from paython.gateways.authorize_net import AuthorizeNet
+from paython.gateways.plugnpay import PlugnPay
+from paython.gateways.usaepay import USAePay
+from paython.gateways.innovative_gw import InnovativeGW
+from paython.gateways.firstdata_legacy import FirstDataLegacy
+from paython.gateways.firstdata import FirstData, FirstDataUnauthorizedRequest
+
+from nose.tools import assert_equals, assert_true, raises
+
+from tests.fixtures import BILLING_INFO as BILLING, credit_card
+
+def test_form_post_gateways():
+    """testing that the form post gateways parse the fakes' approvals & declines"""
+    for fake, api in ((FakeAuthorizeNet, AuthorizeNet(username='login', password='key')), (FakePlugnPay, PlugnPay()),
+                      (FakeUSAePay, USAePay()), (FakeInnovativeGW, InnovativeGW())):
+        for decline_rate in (0, 1):
+            with fake(decline_rate=decline_rate) as server:
+                server.attach(api)
+                response = api.auth('1.00', credit_card(), BILLING)
+                assert_equals(response['approved'], not decline_rate, fake.__name__)
+                assert_equals((server.requests, server.declined), (1, decline_rate))
+
+def test_dropped_not_resent():
+    """testing that a transaction dropped on a reused connection reaches the gateway only once"""
+    api = AuthorizeNet(username='login', password='key')
+    api.pool = ConnectionPool()
+    with FakeAuthorizeNet() as server:
+        server.attach(api)
+        api.capture('1.00', credit_card(), BILLING) # leaves a kept-alive connection in the pool
+        server.drop_rate = 1.0
+        raises(Exception)(api.capture)('1.00', credit_card(), BILLING)
+        assert_equals(server.requests, 2)
+
+def test_firstdata_legacy():
+    """testing FirstDataLegacy over HTTPS with its client certificate, blocking & async"""
+    api = FirstDataLegacy(username='12345')
+    api.async_transport = AsyncTransport()
+    with FakeFirstDataLegacy() as server:
+        server.attach(api)
+        assert_true(api.auth('1.00', credit_card(), BILLING)['approved'])
+        assert_true(api.auth_async('1.00', credit_card(), BILLING).result()['approved'])
+
+def test_firstdata_signature():
+    """testing that the fake First Data v14 checks the HMAC signature"""
+    api = FirstData('gateway', 'password', 'key', 'hmac secret')
+    with FakeFirstData('key', 'hmac secret') as server:
+        server.attach(api)
+        response = api.purchase('1.00', credit_card())
+        assert_equals((response['transaction_approved'], response['cc_number']), (1, '############1111'))
+
+        api.secret = 'wrong secret'
+        raises(FirstDataUnauthorizedRequest)(api.purchase)('1.00', credit_card())
+
+def test_injection():
+    """testing the injected latency & server errors"""
+    api = FirstDataLegacy(username='12345')
+    with FakeFirstDataLegacy(latency=0.1, error_rate=1) as server:
+        server.attach(api)
+        start = time.time()
+        raises(RequestError)(api.auth)('1.00', credit_card(), BILLING)
+        assert_true(time.time() - start >= 0.1)
+        assert_equals(server.errors, 1)
@@ -0,0 +1,74 @@
+"""test_firstdata.py: testing the First Data v14 transport & signing"""
+import os
+import hmac
+import json
+import timeit
+import decimal
+from hashlib import sha1
+
+from paython.lib.transport import ConnectionPool, Response
+from paython.testing import FakeFirstData
+from paython.gateways import firstdata
+from paython.gateways.firstdata import FirstData
+
+from nose.tools import assert_equals, assert_true
+from nose.plugins.skip import SkipTest
+
+from tests.fixtures import credit_card
+
+# one answer of each shape First Data sends back
+ANSWERS = {
+    'json': Response(201, 'Created', {'content-type': 'application/json'}, '{"transaction_approved": 1, "bank_message": "Approved"}'),
+    'form': Response(200, 'OK', {'content-type': 'application/x-www-form-urlencoded'}, 'transaction_approved=0&bank_message=Declined'),
+    'text': Response(400, 'Bad Request', {'content-type': 'text/plain'}, 'Invalid signature received.'),
+}
+
+def test_keep_alive():
+    """testing that transactions reuse one pooled connection"""
+    api = FirstData('gateway', 'password', 'key', 'hmac secret')
+    api.pool = ConnectionPool()
+    with FakeFirstData('key', 'hmac secret') as server:
+        server.attach(api)
+        for i in range(3):
+            assert_equals(api.purchase('1.00', credit_card())['transaction_approved'], 1)
+        assert_equals(api.pool.idle_count(), 1)
+    api.pool.clear()
+
+def test_signer():
+    """testing that the copied HMAC signs like a fresh one & follows secret changes"""
+    api = FirstData('gateway', 'password', 'key', 'hmac secret')
+    for secret in ('hmac secret', 'hmac secret', 'rotated secret'):
+        api.secret = secret
+        signature = api.signer()
+        signature.update('message')
+        assert_equals(signature.digest(), hmac.new(secret, 'message', sha1).digest())
+
+def test_fast_json():
+    """testing that the ujson encoder encodes like the standard one"""
+    if firstdata.ujson is None:
+        raise SkipTest('ujson not installed')
+    fields = {'amount': decimal.Decimal('10.50'), 'cc_number': '4111111111111111', 'transaction_type': '00'}
+    assert_equals(json.loads(firstdata.encode_json_fast(fields)), json.loads(firstdata.encode_json(fields)))
+    assert_true(FirstData('gateway', 'password', 'key', 'hmac secret', fast_json=True).encode_json is firstdata.encode_json_fast)
+
+def test_parse_formats():
+    """testing that JSON, url-encoded & string error answers parse into the right shape"""
+    api = FirstData('gateway', 'password', 'key', 'hmac secret')
+    with api.transaction():
+        api.set('amount', '1.00')
+        assert_equals(api.parse(ANSWERS['json'])['bank_message'], 'Approved')
+        assert_equals(api.parse(ANSWERS['form'])['bank_message'], 'Declined')
+        error = api.parse(ANSWERS['text'])
+        assert_equals((error['exact_message'], error['amount'], error['transaction_approved']), ('Invalid signature received.', '1.00', 0))
+        assert_equals(api.parse(Response(200, 'OK', {}, ' {"mislabelled": 1')).get('exact_message'), ' {"mislabelled": 1')
+
+def test_parse_benchmark():
+    """timing the JSON, url-encoded & string error parses, set PAYTHON_BENCHMARK=1 to run it"""
+    if not os.environ.get('PAYTHON_BENCHMARK'):
+        raise SkipTest('set PAYTHON_BENCHMARK=1 to run the benchmarks')
+    api = FirstData('gateway', 'password', 'key', 'hmac secret')
+    with api.transaction():
+        api.set('amount', '1.00')
+        for name in ('json', 'form', 'text'):
+            seconds = timeit.timeit(lambda: api.parse(ANSWERS[name]), number=2000)
+            print '%s: %0.1fus per parse' % (name, seconds / 2000 * 1e6)
@@ -0,0 +1,100 @@
+"""test_log.py: testing the lazy debug logging"""
+import logging
+
+from paython.lib import log
+from paython.gateways.authorize_net import AuthorizeNet
+from paython.gateways.firstdata_legacy import FirstDataLegacy
+
+from nose.tools import assert_equals, assert_true, assert_false
+
+from tests.fixtures import AUTHORIZE_NET_APPROVED, CannedPool, billing_info, credit_card
+
+PAYTHON_LOGGER = logging.getLogger('paython')
+
+class Collector(logging.Handler):
+    """keeps every formatted message"""
+    def __init__(self):
+        logging.Handler.__init__(self)
+        self.messages = []
+
+    def emit(self, record):
+        self.messages.append(record.getMessage())
+
+def gateways():
+    """an AuthorizeNet & a FirstDataLegacy gateway answering from canned responses"""
+    authorize_net = AuthorizeNet()
+    authorize_net.pool = CannedPool(AUTHORIZE_NET_APPROVED)
+    firstdata = FirstDataLegacy(username='12345')
+    firstdata.pool = CannedPool()
+    return authorize_net, firstdata
+
+def charge(authorize_net, firstdata):
+    """one auth on each gateway"""
+    card = credit_card()
+    authorize_net.auth('1.00', card, billing_info())
+    firstdata.auth('1.00', card, billing_info())
+
+def with_level(level, func, *args, **kwargs):
+    """runs func with paython's loggers at `level`"""
+    previous = PAYTHON_LOGGER.level
+    PAYTHON_LOGGER.setLevel(level)
+    try:
+        return func(*args, **kwargs)
+    finally:
+        PAYTHON_LOGGER.setLevel(previous)
+
+def test_disabled_does_no_formatting():
+    """testing that nothing gets formatted when debug logging is off"""
+    formatted = []
+    def counting(func):
+        def wrapper(*args, **kwargs):
+            formatted.append(func.__name__)
+            return func(*args, **kwargs)
+        wrapper.__name__ = func.__name__
+        return wrapper
+
+    authorize_net, firstdata = gateways()
+    authorize_net.params = counting(authorize_net.params)
+    authorize_net.logged_fields = counting(authorize_net.logged_fields)
+    firstdata.request_xml = counting(firstdata.request_xml)
+    originals = log.banner_text, log.mask_cards
+    log.banner_text, log.mask_cards = counting(log.banner_text), counting(log.mask_cards)
+    handler = Collector()
+    PAYTHON_LOGGER.addHandler(handler)
+    try:
+        with_level(logging.INFO, charge, authorize_net, firstdata)
+        assert_equals(formatted, [])
+
+        with_level(logging.DEBUG, charge, authorize_net, firstdata)
+        for name in ('params', 'logged_fields', 'request_xml', 'banner_text', 'mask_cards'):
+            assert_true(name in formatted, name)
+    finally:
+        PAYTHON_LOGGER.removeHandler(handler)
+        log.banner_text, log.mask_cards = originals
+
+def test_enabled_masks_cards():
+    """testing that debug logging stars out card numbers & cvvs unless raw logging is on"""
+    authorize_net, firstdata = gateways()
+    handler = Collector()
+    PAYTHON_LOGGER.addHandler(handler)
+    try:
+        with_level(logging.DEBUG, charge, authorize_net, firstdata)
+        masked = '\n'.join(handler.messages)
+        del handler.messages[:]
+
+        authorize_net.raw_logging = firstdata.raw_logging = True
+        with_level(logging.DEBUG, charge, authorize_net, firstdata)
+        raw = '\n'.join(handler.messages)
+    finally:
+        PAYTHON_LOGGER.removeHandler(handler)
+
+    assert_false('4111111111111111' in masked)
+    assert_true('x_card_num=************1111' in masked)
+    assert_true('x_card_code=***' in masked)
+    assert_true('<cardnumber>************1111</cardnumber>' in masked)
+    assert_true('<cvmvalue>***</cvmvalue>' in masked)
+    assert_true('4111111111111111' in raw and '<cvmvalue>123</cvmvalue>' in raw)
+
+def test_mask_cards():
+    """testing that only luhn passing digit runs get starred out"""
+    assert_equals(log.mask_cards('card 4111111111111111, order 1234567890123'), 'card ************1111, order 1234567890123')
@@ -0,0 +1,35 @@
+"""test_memory.py: testing that long lived gateways don't grow"""
+import gc
+import xml.dom.minidom
+
+from paython.gateways.firstdata_legacy import FirstDataLegacy
+
+from nose.tools import assert_equals, assert_true
+
+from tests.fixtures import CannedPool, billing_info, credit_card
+
+def live_nodes():
+    """number of minidom nodes still around"""
+    return sum(1 for obj in gc.get_objects() if isinstance(obj, xml.dom.minidom.Node))
+
+def test_10k_transactions():
+    """testing that 10k transactions on one FirstDataLegacy instance leave no XML behind"""
+    api = FirstDataLegacy(username='12345', test=True)
+    api.pool = CannedPool()
+    card = credit_card()
+
+    gc.collect()
+    enabled = gc.isenabled()
+    gc.disable() # so only freeing documents right away keeps memory flat
+    try:
+        before = live_nodes()
+        for i in range(10000):
+            response = api.auth('%s.00' % i, card, billing_info())
+            assert_true(response['approved'])
+        after = live_nodes()
+    finally:
+        if enabled:
+            gc.enable()
+
+    assert_equals(after, before)
+    assert_equals(api.pool.sent.count('<chargetotal>'), 1) # nothing carried over
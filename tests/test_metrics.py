@@ -0,0 +1,92 @@
+"""test_metrics.py: testing the operation metrics registry"""
+import threading
+
+from paython.lib.cc import CreditCard
+from paython.lib.aio import AsyncTransport
+from paython.lib.metrics import Registry, prometheus_text
+from paython.exceptions import MissingDataError
+from paython.gateways.authorize_net import AuthorizeNet
+
+from nose.tools import assert_equals, assert_true, raises, with_setup
+
+from paython.testing import FakeAuthorizeNet
+
+SERVER = None
+
+class DeclinesPennies(FakeAuthorizeNet):
+    """approves everything but 0.01 charges"""
+    def respond(self, path, headers, body, declined):
+        return FakeAuthorizeNet.respond(self, path, headers, body, 'x_amount=0.01' in body)
+
+def setup():
+    """starting a local server"""
+    global SERVER
+    SERVER = DeclinesPennies().start()
+
+def teardown():
+    """stopping the local server"""
+    SERVER.stop()
+
+def gateway():
+    """an AuthorizeNet gateway talking to the local server, with its own registry"""
+    api = AuthorizeNet()
+    SERVER.attach(api)
+    api.async_transport = AsyncTransport()
+    api.metrics = Registry()
+    return api
+
+def test_threads():
+    """testing that records from every thread end up in the snapshot"""
+    registry = Registry(buckets=(0.1, 1.0))
+
+    def work():
+        for i in range(100):
+            registry.record('Gateway', 'auth', 0.5, 'approved')
+
+    threads = [threading.Thread(target=work) for i in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    registry.record('Gateway', 'auth', 5, 'error')
+
+    series = registry.snapshot()[('Gateway', 'auth')]
+    assert_equals(series.count, 801)
+    assert_equals((series.outcomes['approved'], series.outcomes['error']), (800, 1))
+    assert_equals(series.buckets, [0, 800, 1])
+    assert_equals(registry.snapshot()[('Gateway', 'auth')].count, 801) # dead threads' shards are kept
+
+def test_prometheus_text():
+    """testing the Prometheus exposition format"""
+    registry = Registry(buckets=(0.1, 1.0))
+    registry.record('AuthorizeNet', 'auth', 0.05, 'approved')
+    registry.record('AuthorizeNet', 'auth', 0.5, 'declined')
+    lines = prometheus_text(registry).splitlines()
+
+    assert_true('# TYPE paython_operations_total counter' in lines)
+    assert_true('paython_operations_total{gateway="AuthorizeNet",operation="auth",outcome="approved"} 1' in lines)
+    assert_true('paython_operations_total{gateway="AuthorizeNet",operation="auth",outcome="error"} 0' in lines)
+    assert_true('paython_retries_total{gateway="AuthorizeNet",operation="auth"} 0' in lines)
+    assert_true('# TYPE paython_operation_duration_seconds histogram' in lines)
+    assert_true('paython_operation_duration_seconds_bucket{gateway="AuthorizeNet",le="0.1",operation="auth"} 1' in lines)
+    assert_true('paython_operation_duration_seconds_bucket{gateway="AuthorizeNet",le="1.0",operation="auth"} 2' in lines)
+    assert_true('paython_operation_duration_seconds_bucket{gateway="AuthorizeNet",le="+Inf",operation="auth"} 2' in lines)
+    assert_true('paython_operation_duration_seconds_count{gateway="AuthorizeNet",operation="auth"} 2' in lines)
+
+@with_setup(setup, teardown)
+def test_gateway_operations():
+    """testing that approvals, declines, errors & async calls get recorded per operation"""
+    api = gateway()
+    credit_card = CreditCard(number='4111111111111111', exp_mo='12', exp_yr='2030', full_name='John Doe')
+    api.auth('1.00', credit_card)
+    api.auth('0.01', credit_card)
+    api.settle('1.00', '2155779779')
+    api.settle_async('1.00', '2155779779').result()
+    raises(MissingDataError)(api.auth)('1.00', None)
+
+    snapshot = api.metrics.snapshot()
+    auth, settle = snapshot[('AuthorizeNet', 'auth')], snapshot[('AuthorizeNet', 'settle')]
+    assert_equals(sorted(snapshot), [('AuthorizeNet', 'auth'), ('AuthorizeNet', 'settle')])
+    assert_equals((auth.outcomes['approved'], auth.outcomes['declined'], auth.outcomes['error']), (1, 1, 1))
+    assert_equals((settle.count, settle.outcomes['approved']), (2, 2))
+    assert_true(auth.sum > 0)
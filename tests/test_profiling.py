@@ -0,0 +1,93 @@
+"""test_profiling.py: testing the sampled operation profiles"""
+import os
+import pstats
+import shutil
+import tempfile
+
+from paython.lib import profiling
+from paython.lib.profiling import Profiler
+from paython.gateways.firstdata_legacy import FirstDataLegacy
+
+from nose.tools import assert_equals, assert_true, raises
+from nose.plugins.skip import SkipTest
+
+from tests.fixtures import CannedPool, billing_info, credit_card
+
+def profiled_auths(profiler, count=1):
+    """`count` FirstDataLegacy auths sampled by `profiler`"""
+    api = FirstDataLegacy(username='12345')
+    api.pool = CannedPool()
+    api.profiler = profiler
+    for i in range(count):
+        response = api.auth('1.00', credit_card(), billing_info())
+        assert_true(response['approved'])
+
+def test_cprofile():
+    """testing that a sampled operation dumps a tagged profile pstats can read"""
+    directory = tempfile.mkdtemp()
+    try:
+        profiled_auths(Profiler(directory, sample=1), count=2)
+        names = sorted(os.listdir(directory))
+        assert_equals(len(names), 2)
+        assert_true(all(name.startswith('FirstDataLegacy.auth.') and name.endswith('.prof') for name in names))
+        stats = pstats.Stats(os.path.join(directory, names[0]))
+        assert_true(any(func[2] == 'parse' for func in stats.stats))
+    finally:
+        shutil.rmtree(directory)
+
+def test_unsampled():
+    """testing that operations outside the sample are left alone"""
+    directory = tempfile.mkdtemp()
+    try:
+        profiled_auths(Profiler(directory, sample=10 ** 9), count=5)
+        assert_equals(os.listdir(directory), [])
+    finally:
+        shutil.rmtree(directory)
+
+def test_tracemalloc():
+    """testing that tracemalloc mode dumps an allocation snapshot"""
+    if profiling.tracemalloc is None:
+        raise SkipTest('tracemalloc not available')
+    directory = tempfile.mkdtemp()
+    try:
+        profiled_auths(Profiler(directory, sample=1, mode='tracemalloc'))
+        names = os.listdir(directory)
+        assert_equals(len(names), 1)
+        snapshot = profiling.tracemalloc.Snapshot.load(os.path.join(directory, names[0]))
+        assert_true(snapshot.traces)
+    finally:
+        shutil.rmtree(directory)
+
+def test_failed_dump():
+    """testing that a profile that can't be dumped doesn't fail the operation"""
+    profiler = Profiler(os.path.join(tempfile.gettempdir(), 'paython-missing', 'profiles'), sample=1)
+    profiled_auths(profiler, count=2)
+    assert_true(not profiler._local.active)
+
+class BadFrames(object):
+    """stand-in for the tracemalloc module refusing the frame count"""
+    @staticmethod
+    def is_tracing():
+        return False
+
+    @staticmethod
+    def start(frames):
+        raise ValueError('the number of frames must be in range [1; 65535]')
+
+def test_tracemalloc_start_fails():
+    """testing that tracemalloc failing to start gives the lock back"""
+    original = profiling.tracemalloc
+    profiling.tracemalloc = BadFrames
+    try:
+        profiler = Profiler(tempfile.gettempdir(), sample=1, mode='tracemalloc', frames=0)
+        raises(ValueError)(profiler.start)('FirstDataLegacy', 'auth')
+        assert_true(profiling._tracemalloc_lock.acquire(False))
+        profiling._tracemalloc_lock.release()
+        assert_true(not profiler._local.active)
+    finally:
+        profiling.tracemalloc = original
+
+@raises(ValueError)
+def test_mode():
+    """testing that unknown modes get refused"""
+    Profiler(tempfile.gettempdir(), mode='perf')
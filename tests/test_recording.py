@@ -0,0 +1,70 @@
+"""test_recording.py: testing recording gateway traffic & replaying it"""
+import os
+import shutil
+import tempfile
+
+from paython.lib.transport import PreparedRequest
+from paython.lib.recording import Recorder, read_records, replay
+from paython.gateways.authorize_net import AuthorizeNet
+from paython.gateways.firstdata import FirstData
+from paython.gateways.firstdata_legacy import FirstDataLegacy
+
+from nose.tools import assert_equals, assert_true
+
+from tests.fixtures import AUTHORIZE_NET_APPROVED, CannedPool, billing_info, credit_card
+
+def comparable(response):
+    """a parsed response without what changes from one run to the next"""
+    return dict((key, value) for key, value in response.items() if key not in ('timing', 'response_time'))
+
+def test_record_replay():
+    """testing that recorded responses parse offline exactly like they did live, card data starred out"""
+    directory = tempfile.mkdtemp()
+    try:
+        path = os.path.join(directory, 'traffic.jsonl.gz')
+        recorder = Recorder(path)
+
+        authorize_net = AuthorizeNet(username='login', password='key')
+        authorize_net.pool = CannedPool(AUTHORIZE_NET_APPROVED)
+        legacy = FirstDataLegacy(username='12345')
+        legacy.pool = CannedPool()
+        live = []
+        for api in (authorize_net, legacy):
+            api.recorder = recorder
+            live.append(api.auth('1.00', credit_card(cvv='987'), billing_info()))
+        recorder.close()
+
+        records = list(read_records(path))
+        assert_equals([record['gateway'] for record in records], ['AuthorizeNet', 'FirstDataLegacy'])
+        for record in records:
+            assert_true('4111111111111111' not in record['request'])
+            assert_true('987' not in record['request'])
+            assert_true('1111' in record['request']) # last 4 digits kept
+        assert_true('x_tran_key=***' in records[0]['request'])
+
+        for api, response in zip((authorize_net, legacy), live):
+            replayed = list(replay(path, api))
+            assert_equals(len(replayed), 1)
+            assert_equals(comparable(replayed[0][1]), comparable(response))
+    finally:
+        shutil.rmtree(directory)
+
+def test_firstdata_body():
+    """testing that FirstData's JSON gets its card data & password starred out, its field order kept"""
+    api = FirstData('gateway', 'secret password', 'key', 'hmac secret', debug=True)
+    body = '{"gateway_id": "gateway", "password": "secret password", "cc_number": "4111111111111111", "cc_verification_str2": "987"}'
+    recorded = api.recorded_body(PreparedRequest('POST', api.request_uri(), body, {}))
+    assert_equals(recorded, '{"gateway_id": "gateway", "password": "***************", "cc_number": "************1111", "cc_verification_str2": "***"}')
+
+def test_failed_recording():
+    """testing that a recorder failing doesn't fail the transaction it records"""
+    directory = tempfile.mkdtemp()
+    try:
+        recorder = Recorder(os.path.join(directory, 'traffic.jsonl.gz'))
+        recorder.close()
+        api = FirstDataLegacy(username='12345')
+        api.pool = CannedPool()
+        api.recorder = recorder
+        assert_true(api.auth('1.00', credit_card(), billing_info())['approved'])
+    finally:
+        shutil.rmtree(directory)
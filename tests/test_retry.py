@@ -0,0 +1,86 @@
+"""test_retry.py: testing the retry policy & First Data's retries"""
+from paython.lib.metrics import Registry
+from paython.lib.retry import RetryPolicy
+from paython.lib.transport import ConnectionPool
+from paython.testing import FakeFirstData
+from paython.gateways.firstdata import FirstData, FirstDataUnauthorizedRequest
+
+from nose.tools import assert_equals, assert_true, raises
+
+from tests.fixtures import credit_card
+
+class FlakyFirstData(FakeFirstData):
+    """answers the first `failures` requests with First Data's spurious unauthorized body (+ `trailer`)"""
+    def __init__(self, failures, trailer='', **options):
+        FakeFirstData.__init__(self, 'key', 'hmac secret', **options)
+        self.failures = failures
+        self.trailer = trailer
+
+    def respond(self, path, headers, body, declined):
+        if self.requests <= self.failures:
+            return 401, 'text/plain', self.UNAUTHORIZED + self.trailer
+        return FakeFirstData.respond(self, path, headers, body, declined)
+
+def gateway(server, policy):
+    api = FirstData('gateway', 'password', 'key', 'hmac secret')
+    api.pool = ConnectionPool()
+    api.metrics = Registry()
+    api.retry_policy = policy
+    server.attach(api)
+    return api
+
+def test_policy():
+    """testing the backoff, its cap, the deadline & what counts as retryable"""
+    policy = RetryPolicy(attempts=5, backoff=0.1, multiplier=2, max_backoff=0.3, jitter=0, deadline=1.0, statuses=[503], bodies=['busy'])
+    assert_equals([policy.delay(retry) for retry in (1, 2, 3, 4)], [0.1, 0.2, 0.3, 0.3])
+    assert_equals(policy.wait(1, 0, 503, ''), 0.1)
+    assert_equals(policy.wait(2, 0, 200, ' busy\n'), 0.2)
+    assert_equals(policy.wait(1, 0, 200, 'ok'), None)
+    assert_equals(policy.wait(5, 0, 503, ''), None) # out of attempts
+    assert_equals(policy.wait(3, 0.8, 503, ''), None) # past the deadline
+
+    jittered = RetryPolicy(backoff=1, jitter=0.5)
+    assert_true(all(0.5 <= jittered.delay(1) <= 1 for i in range(100)))
+
+def test_retried():
+    """testing that spurious unauthorized answers get re-signed, retried over the pooled connection & counted"""
+    with FlakyFirstData(failures=2) as server:
+        api = gateway(server, RetryPolicy(attempts=3, backoff=0.01, bodies=[FakeFirstData.UNAUTHORIZED]))
+        signed = []
+        prepare_request = api.prepare_request
+        api.prepare_request = lambda uri: signed.append(uri) or prepare_request(uri)
+        assert_equals(api.purchase('1.00', credit_card())['transaction_approved'], 1)
+        assert_equals(server.requests, 3)
+        assert_equals(len(signed), 3) # freshly dated & signed for every attempt
+        assert_equals(api.pool.idle_count(), 1)
+
+        series = api.metrics.snapshot()[('FirstData', 'purchase')]
+        assert_equals((series.retries, series.count, series.outcomes['unknown']), (2, 1, 1))
+    api.pool.clear()
+
+def test_gives_up():
+    """testing that the unauthorized error is raised once the attempts run out"""
+    with FlakyFirstData(failures=5) as server:
+        api = gateway(server, RetryPolicy(attempts=2, backoff=0.01, bodies=[FakeFirstData.UNAUTHORIZED]))
+        raises(FirstDataUnauthorizedRequest)(api.purchase)('1.00', credit_card())
+        assert_equals(server.requests, 2)
+        assert_equals(api.metrics.snapshot()[('FirstData', 'purchase')].retries, 1)
+    api.pool.clear()
+
+def test_gives_up_trailing_newline():
+    """testing that an unauthorized answer with a trailing newline is retried & raised alike"""
+    with FlakyFirstData(failures=5, trailer='\n') as server:
+        api = gateway(server, RetryPolicy(attempts=2, backoff=0.01, bodies=[FakeFirstData.UNAUTHORIZED]))
+        raises(FirstDataUnauthorizedRequest)(api.purchase)('1.00', credit_card())
+        assert_equals(server.requests, 2)
+    api.pool.clear()
+
+def test_retry_on_bmc_off():
+    """testing that retry_on_bmc=0 neither retries nor raises"""
+    with FlakyFirstData(failures=5) as server:
+        api = gateway(server, RetryPolicy(attempts=3, backoff=0.01, bodies=[FakeFirstData.UNAUTHORIZED]))
+        api._retry_on_bmc = 0
+        response = api.purchase('1.00', credit_card())
+        assert_equals(response['bank_message'], FakeFirstData.UNAUTHORIZED)
+        assert_equals(server.requests, 1)
+    api.pool.clear()
@@ -0,0 +1,88 @@
+"""test_stripe.py: testing the Stripe gateway against a stand-in for the stripe library"""
+import threading
+
+from paython.lib.cc import CreditCard
+from paython.gateways.stripe_com import Stripe, cents
+
+from nose.tools import assert_equals, assert_true
+
+class Charge(dict):
+    """stand-in for stripe.Charge, remembering the api key of every call"""
+    calls = []
+
+    @classmethod
+    def create(cls, api_key=None, **params):
+        cls.calls.append(('create', api_key))
+        return {'id': 'ch_%s' % api_key, 'amount': params['amount'], 'failure_message': None, 'amount_refunded': 0}
+
+    @classmethod
+    def construct_from(cls, values, key):
+        charge = cls(values)
+        charge.api_key = key
+        return charge
+
+    def refund(self, amount=None):
+        Charge.calls.append(('refund', self.api_key))
+        return dict(self, amount=1000, amount_refunded=amount, failure_message=None)
+
+class StripeAPI(object):
+    Charge = Charge
+
+def gateway(key):
+    api = Stripe(api_key=key)
+    api.stripe_api = StripeAPI
+    return api
+
+def credit_card():
+    return CreditCard(number='4242424242424242', exp_mo='12', exp_yr='2030', full_name='John Doe', cvv='123')
+
+def test_own_keys():
+    """testing that each instance sends its own key, even when used side by side from threads"""
+    Charge.calls = []
+    gateways = [gateway('sk_test_%d' % i) for i in range(4)]
+    responses = {}
+
+    def work(api):
+        for i in range(25):
+            responses.setdefault(api.api_key, []).append(api.capture('10.00', credit_card(), {}))
+
+    threads = [threading.Thread(target=work, args=(api,)) for api in gateways]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    for api in gateways:
+        assert_equals(set(response['trans_id'] for response in responses[api.api_key]), set(['ch_%s' % api.api_key]))
+    assert_equals(len(Charge.calls), 100)
+
+def test_credit_key():
+    """testing that refunds go out in a single call, with the instance's key"""
+    Charge.calls = []
+    response = gateway('sk_test_a').credit('5.00', 'ch_1')
+    assert_true(response['approved'])
+    assert_equals(response['trans_type'], 'credit')
+    assert_equals(Charge.calls, [('refund', 'sk_test_a')])
+
+def test_cents():
+    """testing that amounts convert to the exact cent"""
+    assert_equals([cents(amount) for amount in ('0.29', '1.15', '4.35', '10', '19.995')], [29, 115, 435, 1000, 2000])
+    assert_equals([cents(amount) for amount in (0.29, 1.15, 4.35, 10)], [29, 115, 435, 1000])
+
+def test_credit_many():
+    """testing that bulk refunds all go out & come back in order"""
+    Charge.calls = []
+    refunds = [('%d.29' % i, 'ch_%d' % i) for i in range(50)]
+    results = list(gateway('sk_test_b').credit_many(refunds, workers=8))
+    assert_equals([result.args for result in results], refunds)
+    assert_true(all(result.ok and result.response['approved'] for result in results))
+    assert_equals(len(Charge.calls), 50)
+
+def test_capture_async():
+    """testing that captures run on the worker threads & resolve like the other gateways' futures"""
+    Charge.calls = []
+    api = gateway('sk_test_c')
+    futures = [api.capture_async('%d.00' % i, credit_card(), {}) for i in range(1, 21)]
+    responses = [future.result(timeout=5) for future in futures]
+    assert_equals([response['amount'] for response in responses], ['%d.00' % i for i in range(1, 21)])
+    assert_equals(len(Charge.calls), 20)
@@ -0,0 +1,97 @@
+"""test_tracing.py: testing the tracing spans"""
+import os
+import json
+import shutil
+import tempfile
+
+from paython.exceptions import DataValidationError
+from paython.lib.tracing import Tracer, RecordingTracer, RingExporter, FileExporter
+from paython.gateways.firstdata import FirstData
+from paython.gateways.firstdata_legacy import FirstDataLegacy
+
+from nose.tools import assert_equals, assert_true, raises
+
+from tests.fixtures import CannedPool, billing_info, credit_card
+
+def traced_auth(exporter):
+    """one FirstDataLegacy auth traced into `exporter`"""
+    api = FirstDataLegacy(username='12345')
+    api.pool = CannedPool()
+    api.tracer = RecordingTracer(exporter)
+    return api.auth('1.00', credit_card(), billing_info())
+
+def test_noop():
+    """testing that the default tracer hands out the same do nothing span"""
+    tracer = Tracer()
+    with tracer.span('auth', gateway='AuthorizeNet') as span:
+        span.set('status', 'approved')
+    assert_true(tracer.span('parse') is span)
+
+def test_operation_spans():
+    """testing that an operation traces its build, encode, network & parse stages nested under it"""
+    exporter = RingExporter()
+    traced_auth(exporter)
+    spans = exporter.spans()
+    by_name = dict((span.name, span) for span in spans)
+
+    root = by_name['auth']
+    assert_equals(spans[-1], root) # children close first
+    assert_equals(root.parent_id, None)
+    assert_equals(root.attributes, {'gateway': 'FirstDataLegacy', 'operation': 'auth', 'status': 'approved'})
+    assert_true(all(span.trace_id == root.trace_id for span in spans))
+
+    for name in ('build.card', 'build.billing', 'encode', 'network', 'parse.xml', 'parse'):
+        assert_equals(by_name[name].parent_id, root.span_id)
+    builders = set(by_name[name].span_id for name in ('auth', 'build.card', 'build.billing'))
+    assert_true(all(span.parent_id in builders for span in spans if span.name == 'build.set'))
+    assert_equals(by_name['standardize'].parent_id, by_name['parse'].span_id)
+
+    network = by_name['network']
+    assert_equals(network.attributes['status'], 200)
+    assert_equals(network.attributes['bytes_sent'], by_name['encode'].attributes['bytes_sent'])
+    assert_true(network.attributes['bytes_received'] > 0)
+    assert_true(root.duration >= sum(span.duration for span in spans if span.parent_id == root.span_id))
+
+def test_firstdata_card_span():
+    """testing that First Data v14 traces building the card like the other gateways"""
+    exporter = RingExporter()
+    api = FirstData('gateway', 'password', 'key', 'hmac secret', debug=False)
+    api.pool = CannedPool('{"transaction_approved": 1, "bank_message": "Approved"}')
+    api.tracer = RecordingTracer(exporter)
+    api.purchase('1.00', credit_card())
+
+    by_name = dict((span.name, span) for span in exporter.spans())
+    assert_equals(by_name['build.card'].parent_id, by_name['purchase'].span_id)
+
+def test_failed_export():
+    """testing that an exporter failing doesn't fail the traced transaction"""
+    directory = tempfile.mkdtemp()
+    try:
+        exporter = FileExporter(os.path.join(directory, 'spans.jsonl'))
+        exporter.close()
+        assert_true(traced_auth(exporter)['approved'])
+    finally:
+        shutil.rmtree(directory)
+
+def test_error_span():
+    """testing that a failing operation's span notes the error"""
+    exporter = RingExporter()
+    api = FirstDataLegacy(username='12345')
+    api.tracer = RecordingTracer(exporter)
+    raises(DataValidationError)(api.auth)('1.00', credit_card(), {'address': 'Main St'})
+    assert_equals(exporter.spans()[-1].attributes['error'], 'DataValidationError')
+
+def test_file_exporter():
+    """testing that the file exporter writes a JSON line per span"""
+    directory = tempfile.mkdtemp()
+    try:
+        path = os.path.join(directory, 'spans.jsonl')
+        exporter = FileExporter(path)
+        traced_auth(exporter)
+        exporter.close()
+
+        spans = [json.loads(line) for line in open(path)]
+        assert_equals(spans[-1]['name'], 'auth')
+        assert_true(all(span['duration'] >= 0 for span in spans))
+    finally:
+        shutil.rmtree(directory)
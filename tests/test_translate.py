@@ -0,0 +1,58 @@
+"""test_translate.py: testing the compiled field translators"""
+from paython.lib.cc import CreditCard
+from paython.lib.translate import Translator
+from paython.exceptions import DataValidationError, MissingDataError, MissingTranslationError
+from paython.gateways.authorize_net import AuthorizeNet
+
+from nose.tools import assert_equals, assert_true, raises
+
+def test_translator_cached():
+    """testing that a gateway class compiles its translator once"""
+    assert_true(AuthorizeNet.translator() is AuthorizeNet().translator())
+
+def test_card():
+    """testing that only the card fields the gateway uses are translated"""
+    credit_card = CreditCard(number='4111111111111111', exp_mo='12', exp_yr='2030', full_name='John Doe', cvv='123')
+    fields = dict(AuthorizeNet.translator().card(credit_card))
+
+    assert_equals(fields, {'x_card_num': '4111111111111111', 'x_exp_date': credit_card.exp_date, 'x_card_code': '123'})
+
+def test_card_many():
+    """testing the bulk card translation"""
+    credit_cards = [CreditCard(number='4111111111111111', exp_mo='12', exp_yr='20%s' % i, first_name='John', last_name='Doe') for i in range(30, 33)]
+    translated = AuthorizeNet.translator().card_many(credit_cards)
+
+    assert_equals([fields['x_exp_date'] for fields in translated], [credit_card.exp_date for credit_card in credit_cards])
+    assert_equals(translated[0]['x_first_name'], 'John')
+
+def test_billing():
+    """testing that empty & untranslated billing fields are left out"""
+    fields = dict(AuthorizeNet.translator().billing({'address': '1 Main St', 'address2': 'Apt 1', 'city': None, 'email': 'john@doe.com'}))
+    assert_equals(fields, {'x_address': '1 Main St', 'x_email': 'john@doe.com'})
+
+@raises(DataValidationError)
+def test_billing_email():
+    """testing that billing emails get validated"""
+    AuthorizeNet.translator().billing({'email': 'not an email'})
+
+def test_shipping():
+    """testing the shipping translation with optional fields"""
+    info = {'ship_first_name': 'John', 'ship_last_name': 'Doe', 'ship_address': '1 Main St', 'ship_city': 'Austin',
+            'ship_state': 'TX', 'ship_zipcode': '78701', 'ship_to_co': 'Acme', 'ship_country': 'US'}
+    fields = dict(AuthorizeNet.translator().shipping(info))
+
+    assert_equals(fields['x_ship_to_company'], 'Acme')
+    assert_equals(fields['x_ship_to_country'], 'US')
+    assert_equals(len(fields), 8)
+
+@raises(MissingTranslationError)
+def test_shipping_untranslated():
+    """testing that optional shipping fields the gateway lacks are refused"""
+    info = {'ship_first_name': 'John', 'ship_last_name': 'Doe', 'ship_address': '1 Main St', 'ship_city': 'Austin',
+            'ship_state': 'TX', 'ship_zipcode': '78701', 'ship_phone': '5555555555'}
+    AuthorizeNet.translator().shipping(info)
+
+@raises(MissingDataError)
+def test_shipping_many_required():
+    """testing that bulk shipping records need the required fields"""
+    Translator(AuthorizeNet.REQUEST_FIELDS).shipping_many([{'ship_first_name': 'John'}])
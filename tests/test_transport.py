@@ -0,0 +1,134 @@
+"""test_transport.py: testing the pooled keep-alive transport"""
+import os
+import shutil
+import tempfile
+import subprocess
+
+from paython.lib.transport import ConnectionPool, Response, ssl_context
+from paython.gateways.authorize_net import AuthorizeNet
+from paython.gateways.firstdata_legacy import FirstDataLegacy
+
+from nose.plugins.skip import SkipTest
+from nose.tools import assert_equals, assert_true, with_setup
+
+from paython.testing import FakeGateway, FakeAuthorizeNet
+
+SERVER = None
+
+class Echo(FakeGateway):
+    """answers every request with the body it got"""
+    def respond(self, path, headers, body, declined):
+        return 200, 'text/plain', 'echo:%s' % body
+
+def setup():
+    """starting a local server"""
+    global SERVER
+    SERVER = Echo().start()
+
+def teardown():
+    """stopping the local server"""
+    SERVER.stop()
+
+@with_setup(setup, teardown)
+def test_keep_alive_reuse():
+    """testing that sequential requests share one connection"""
+    pool = ConnectionPool()
+    for i in range(5):
+        response = pool.request('POST', SERVER.url, 'n=%s' % i)
+        assert_equals(response.status, 200)
+        assert_equals(response.body, 'echo:n=%s' % i)
+
+    assert_equals(SERVER.connections, 1)
+    assert_equals(pool.idle_count(), 1)
+
+@with_setup(setup, teardown)
+def test_timing():
+    """testing that responses come with per phase timing, a reused connection skipping dns, connect & tls"""
+    pool = ConnectionPool()
+    first = pool.request('POST', SERVER.url, 'a=1')
+    second = pool.request('POST', SERVER.url, 'a=2')
+
+    assert_equals(sorted(first.timing), ['connect', 'dns', 'read', 'tls', 'ttfb', 'write'])
+    assert_true(all(seconds >= 0 for seconds in first.timing.values()))
+    assert_true(first.timing['connect'] > 0)
+    assert_equals((second.timing['dns'], second.timing['connect'], second.timing['tls']), (0.0, 0.0, 0.0))
+
+@with_setup(setup, teardown)
+def test_idle_eviction():
+    """testing that connections idle for too long are not reused"""
+    pool = ConnectionPool(idle_timeout=0)
+    pool.request('POST', SERVER.url, 'a=1')
+    pool.request('POST', SERVER.url, 'a=2')
+
+    assert_equals(SERVER.connections, 2)
+
+@with_setup(setup, teardown)
+def test_max_size():
+    """testing that the pool never keeps more than max_size idle connections"""
+    pool = ConnectionPool(max_size=1)
+    key = ('http', '127.0.0.1', SERVER.port, None, None, True)
+    first, second = pool.connect(key), pool.connect(key)
+    pool.put(key, first)
+    pool.put(key, second)
+
+    assert_equals(pool.idle_count(key), 1)
+
+@with_setup(setup, teardown)
+def test_stale_connection_retry():
+    """testing that a connection closed by the server gets replaced"""
+    pool = ConnectionPool()
+    pool.request('POST', SERVER.url, 'a=1')
+    for conn, last_used in pool._idle.values()[0]:
+        conn.sock.close()
+
+    response = pool.request('POST', SERVER.url, 'a=2')
+    assert_equals(response.body, 'echo:a=2')
+
+def test_post_gateway_uses_pool():
+    """testing that PostGateway subclasses go through the pool"""
+    api = AuthorizeNet()
+    api.pool = ConnectionPool()
+    with FakeAuthorizeNet() as server:
+        for i in range(2):
+            with api.transaction():
+                api.make_request(server.url)
+
+    assert_equals((server.requests, server.connections), (2, 1))
+
+def test_ssl_context_cache():
+    """testing that client certificates are only loaded once per key/cert pair"""
+    directory = tempfile.mkdtemp()
+    pem = os.path.join(directory, 'client.pem')
+    try:
+        subprocess.check_call(['openssl', 'req', '-x509', '-newkey', 'rsa:2048', '-nodes', '-days', '1',
+                               '-subj', '/CN=paython', '-keyout', pem, '-out', pem],
+                              stdout=open(os.devnull, 'w'), stderr=subprocess.STDOUT)
+    except OSError:
+        raise SkipTest('openssl is not available')
+
+    try:
+        context = ssl_context(pem, pem)
+        assert_true(context is ssl_context(pem, pem))
+
+        pool = ConnectionPool()
+        conn = pool.connect(('https', 'localhost', 1129, pem, pem, True))
+        assert_true(conn._context is context)
+    finally:
+        shutil.rmtree(directory)
+
+def test_xml_gateway_uses_pool():
+    """testing that XMLGateway requests carry the host and client certificate pair"""
+    class RecordingPool(object):
+        def send(self, prepared):
+            self.prepared = prepared
+            return Response(200, 'OK', {}, '<r_approved>APPROVED</r_approved><r_code>1</r_code>')
+
+    api = FirstDataLegacy(key_file='key.pem', cert_file='cert.pem')
+    api.pool = RecordingPool()
+    with api.transaction():
+        response = api.make_request('/LSGSXML')
+
+    assert_equals(response, {u'response': {u'r_approved': u'APPROVED', u'r_code': u'1'}})
+    prepared = api.pool.prepared
+    assert_equals((prepared.method, prepared.url), ('POST', 'https://secure.linkpt.net:1129/LSGSXML'))
+    assert_equals((prepared.key_file, prepared.cert_file), ('key.pem', 'cert.pem'))
@@ -1,5 +1,5 @@
 from paython.exceptions import GatewayError
-from paython.lib.utils import parse_xml, is_valid_email
+from paython.lib.utils import parse_xml, is_valid_email, get_card_type
 
 from nose.tools import assert_equals, raises
 
@@ -39,3 +39,29 @@ def test_append_to_root():
 def test_valid_email():
     """testing our email validation"""
     assert_equals(is_valid_email("lol@lol.com") is None, False)
+
+def test_card_types():
+    """testing card network detection by IIN & length"""
+    cards = {
+        '4111111111111111': 'visa',
+        '4222222222222': 'visa',
+        '4111111111111111110': 'visa',
+        '378282246310005': 'amex',
+        '341111111111111': 'amex',
+        '5555555555554444': 'mc',
+        '2223000048400011': 'mc',
+        '2720990000000007': 'mc',
+        '6011111111111117': 'discover',
+        '6500000000000002': 'discover',
+        '30569309025904': 'diners',
+        '3566002020360505': 'jcb',
+        '6200000000000005': 'unionpay',
+        '6759649826438453': 'maestro',
+        '501800000000': 'maestro',
+    }
+    for number, card_type in cards.items():
+        assert_equals(get_card_type(number), card_type)
+
+    # wrong length, unknown IIN, not a number
+    for number in ('41111111111111', '2721000000000004', '9111111111111111', '411111111111111a', ''):
+        assert_equals(get_card_type(number), None)
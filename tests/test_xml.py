@@ -0,0 +1,145 @@
+"""test_xml.py: testing the streaming XML parser against the minidom one"""
+import random
+from StringIO import StringIO
+
+from paython.exceptions import GatewayError
+from paython.lib.utils import parse_xml, parse_xml_dom, parse_xml_response
+
+from nose.tools import assert_equals, raises
+
+DOCUMENTS = [
+    '<lol test="woot">waaa<inside>heh</inside></lol>',
+    '<lol><inside><![CDATA[???]]></inside></lol>',
+    '<lol><first>text 1</first><second>text 2</second></lol>',
+    '<r><item>1</item><item>2</item><other/><item>3</item><other>x</other></r>',
+    '<r>\n  <a b="1" c="">  </a>\n  <d e="2"/>\n  <f g="3">text</f>\n</r>\n',
+    '<r><!-- comment --><?target data?>before<![CDATA[ raw ]]>after<![CDATA[]]><e/></r>',
+    '<?xml version="1.0" encoding="UTF-8"?><r><a>caf\xc3\xa9</a><b>&lt;&amp;&gt;</b></r>',
+    '<r><a><b><c>deep</c></b></a><a/></r>',
+    '<r:order xmlns:r="urn:x"><r:amount>1.00</r:amount></r:order>',
+    # what FirstData legacy (LinkPoint) answers
+    '<r_csp>CSI</r_csp><r_time>Wed Oct 18 10:00:00 2026</r_time><r_ref>0097820000</r_ref><r_error></r_error>'
+    '<r_ordernum>A-1234</r_ordernum><r_message>APPROVED</r_message><r_code>0097820000:NNNM:100018312899:</r_code>'
+    '<r_tdate>1192032000</r_tdate><r_score></r_score><r_authresponse></r_authresponse><r_approved>APPROVED</r_approved><r_avs>NNNM</r_avs>',
+]
+
+def random_document(rand, depth=0):
+    """a random element tree with attributes, text, CDATA, comments & repeated names"""
+    name = rand.choice('abc')
+    attributes = ''.join(' %s="%s"' % (key, rand.choice(['', 'v'])) for key in rand.sample('xyz', rand.randint(0, 2)))
+    children = []
+    for i in range(rand.randint(0, 4) if depth < 4 else 0):
+        kind = rand.choice(['element', 'element', 'text', 'space', 'cdata', 'comment'])
+        if kind == 'element':
+            children.append(random_document(rand, depth + 1))
+        elif kind == 'text':
+            children.append(rand.choice(['t', ' t ', '1']))
+        elif kind == 'space':
+            children.append(rand.choice([' ', '\n  ']))
+        elif kind == 'cdata':
+            children.append('<![CDATA[%s]]>' % rand.choice(['', 'c', ' ']))
+        else:
+            children.append('<!--%s-->' % rand.choice(['', 'c']))
+    return '<%s%s>%s</%s>' % (name, attributes, ''.join(children), name)
+
+def test_parity():
+    """testing that both parsers give the same dicts"""
+    for document in DOCUMENTS:
+        if not document.startswith('<r_csp>'):
+            assert_equals(parse_xml(document), parse_xml_dom(document))
+
+def test_random_parity():
+    """testing that both parsers give the same dicts for random documents"""
+    rand = random.Random(1129)
+    for i in range(500):
+        document = random_document(rand)
+        assert_equals(parse_xml(document), parse_xml_dom(document))
+
+def test_response_parity():
+    """testing that one wrapped pass equals parsing & retrying wrapped"""
+    def two_pass(document):
+        try:
+            return parse_xml_dom(document)
+        except GatewayError:
+            return parse_xml_dom('<?xml version="1.0"?><response>%s</response>' % document)
+
+    rand = random.Random(1129)
+    documents = DOCUMENTS + ['', 'text', '<a/>\n', '<a/><b/>', '<a/>trailing', '<!-- c --><a/>'] + \
+                [random_document(rand) * rand.randint(1, 2) for i in range(200)]
+    for document in documents:
+        if not document.startswith('<?xml'): # the retry could never handle declarations
+            assert_equals(parse_xml_response(document), two_pass(document))
+
+def test_file():
+    """testing that file like objects get streamed"""
+    assert_equals(parse_xml(StringIO(DOCUMENTS[3])), parse_xml_dom(DOCUMENTS[3]))
+
+def test_declarations():
+    """testing that wrapped responses keep their declared encoding"""
+    response = '<?xml version="1.0" encoding="ISO-8859-1"?><a>caf\xe9</a>'
+    assert_equals(parse_xml_response(response), {u'a': u'caf\xe9'})
+    assert_equals(parse_xml_response(u'<a>caf\xe9</a><b/>'), {u'response': {u'a': u'caf\xe9', u'b': None}})
+
+@raises(GatewayError)
+def test_invalid():
+    """testing that broken XML raises a GatewayError"""
+    parse_xml('<lol>testing invalid xml<lol>')
+
+def reference_build(calls):
+    """builds a request with the element lookup XMLGateway.set did before the path index"""
+    import xml.dom.minidom
+    doc = xml.dom.minidom.Document()
+    for path, child, attribute in calls:
+        if path is None:
+            continue
+        xml_path = path.split('/')
+        xml_doc = doc
+        for element_name in xml_path:
+            element = doc.getElementsByTagName(element_name)
+            if element: element = element[0]
+            if not element or element_name == xml_path[-1:][0]:
+                element = doc.createElement(element_name)
+                xml_doc.appendChild(element)
+            xml_doc = element
+        if isinstance(child, tuple):
+            for obj in child:
+                node = doc.createElement(obj[0])
+                node.appendChild(doc.createTextNode(str(obj[1])))
+                if len(obj) == 3:
+                    node.setAttribute(*obj[2].split(':'))
+                xml_doc.appendChild(node)
+        elif child:
+            xml_doc.appendChild(doc.createTextNode(str(child)))
+        if attribute:
+            for attribute in attribute.split('|'):
+                attribute = attribute.split(':')
+                xml_doc.setAttribute(attribute[0], attribute[1])
+    return doc.toxml('utf-8')
+
+def test_request_builder():
+    """testing that a FirstDataLegacy order comes out byte for byte like before"""
+    from paython.lib.api import XMLRequest
+    from paython.lib.cc import CreditCard
+    from paython.gateways.firstdata_legacy import FirstDataLegacy
+
+    calls = []
+    class RecordingRequest(XMLRequest):
+        def set(self, path, child=False, attribute=False):
+            calls.append((path, child, attribute))
+            XMLRequest.set(self, path, child, attribute)
+
+    api = FirstDataLegacy(username='12345', test=True)
+    api.new_request = lambda: RecordingRequest(api.static_fields)
+    credit_card = CreditCard(number='4111111111111111', exp_mo='12', exp_yr='2030', full_name='John <Doe>', cvv='123')
+    billing_info = {'address': '123 Main St', 'city': 'Austin', 'state': 'TX', 'zipcode': '78701', 'email': 'john@doe.com'}
+    shipping_info = {'ship_first_name': 'John', 'ship_last_name': 'Doe', 'ship_address': '1 Side St', 'ship_city': 'Austin',
+                     'ship_state': 'TX', 'ship_zipcode': '78701', 'ship_country': 'US'}
+    prepared = api.prepare(api.auth, '1.00', credit_card, billing_info, shipping_info)
+    assert_equals(prepared.body, reference_build(calls))
+
+    del calls[:]
+    with api.transaction() as request:
+        api.set('order/items/item', (('id', '1'), ('description', 'a & b', 'lang:en')), 'type:physical|qty:1')
+        api.set('order/items/item/option', 'gift')
+        api.set('order/billing/phone', '5555555555')
+        assert_equals(request.doc.toxml('utf-8'), reference_build(calls))